@@ -0,0 +1,273 @@
+"""
+Riepilogo per tutto il personale su più PDF dei turni.
+
+Per ogni persona: turni e ore lavorate, ore notturne, turni nel fine
+settimana e nei festivi, giorni di riposo, ferie, malattia e permessi.
+Le celle delle colonne dei giorni di tutti i PDF vengono scomposte una
+sola volta in occorrenze (persona, data, riga della struttura, orario
+scritto nella cella); tipo e orario vengono presi dalla struttura
+compilata per indice con numpy, e ogni metrica è una somma per persona
+(np.bincount) invece di un'estrazione separata per ogni nome.
+
+Uso:
+    python analytics.py /percorso/pdf -o riepilogo.csv
+    python analytics.py /percorso/pdf --from 2025-01-01 --to 2025-01-31
+"""
+import argparse
+import csv
+import datetime
+import sys
+import time
+
+import numpy as np
+
+import logs
+from batch import expand_inputs
+from diff import cell_map, cell_people
+from ics import roster_period
+from shifts import DAY_BY_NAME, MINUTES_PER_DAY, NO_TIME, range_minutes
+from structure import TIMED_KINDS, ShiftKind, compile_structure
+
+# Fascia notturna: dalle 22:00 alle 06:00 del giorno dopo
+NIGHT_START = 22 * 60
+NIGHT_END = 6 * 60
+
+REST_KINDS = (ShiftKind.REST, ShiftKind.SECOND_REST, ShiftKind.CLOSED)
+
+COLUMNS = (
+    "Persona", "Turni", "Ore lavorate", "Ore notturne", "Turni weekend", "Turni festivi",
+    "Giorni lavorati", "Riposi", "Ferie", "Malattia", "Permessi", "Scarto ore (%)",
+)
+
+
+def easter(year):
+    """Domenica di Pasqua (calendario gregoriano)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return datetime.date(year, month, day)
+
+
+def italian_holidays(year):
+    """Festività nazionali italiane dell'anno, compreso il lunedì dell'Angelo."""
+    fixed = [(1, 1), (1, 6), (4, 25), (5, 1), (6, 2), (8, 15), (11, 1), (12, 8), (12, 25), (12, 26)]
+    days = {datetime.date(year, m, d) for m, d in fixed}
+    days.add(easter(year) + datetime.timedelta(1))
+    return days
+
+
+def _day_dates(header_days, period):
+    """{(giorno, numero del giorno): ordinale della data} per le colonne dell'header, come ics.shift_dates."""
+    start, end = period
+    days = [start + datetime.timedelta(n) for n in range((end - start).days + 1)]
+    by_number = {str(d.day): d for d in days}
+    by_weekday = {d.weekday(): d for d in days}
+    dates = {}
+    for day_name, number in header_days:
+        day = DAY_BY_NAME[day_name]
+        date = by_number.get(str(number).strip().lstrip("0")) or by_weekday.get(int(day))
+        if date:
+            dates[int(day), number] = date.toordinal()
+    return dates
+
+
+class Occurrences:
+    """Una riga per persona in una cella: colonne numpy allineate."""
+
+    def __init__(self, rosters):
+        """rosters: iterabile di (tabelle, struttura, periodo o None)."""
+        names = {}
+        person, date, weekday, kind, start, end, row, roster = [], [], [], [], [], [], [], []
+        self.header_days = []  # giorni dell'header di ogni PDF, come da cell_map
+        for roster_idx, (tables, structure, period) in enumerate(rosters):
+            compiled = compile_structure(structure)
+            cells, header_days = cell_map(tables)
+            self.header_days.append(header_days)
+            dates = _day_dates(header_days, period) if period else {}
+            rows, cell_start, cell_end = [], [], []
+            for (_, structure_idx, day), (day_number, text) in cells.items():
+                row_pos = compiled.row(structure_idx)
+                # senza periodo i giorni di PDF diversi restano distinti: numeri negativi
+                day_key = dates.get((day, day_number), -(roster_idx * 7 + int(day) + 1))
+                for key, (name, time_groups) in cell_people(text).items():
+                    person.append(names.setdefault(key, (len(names), name))[0])
+                    date.append(day_key)
+                    weekday.append(int(day))
+                    rows.append(row_pos)
+                    s, e = range_minutes(*(int(g) for g in time_groups)) if time_groups else (NO_TIME, NO_TIME)
+                    cell_start.append(s)
+                    cell_end.append(e)
+
+            # tipo e orario predefinito per indice di riga, l'orario scritto nella cella vince
+            rows = np.asarray(rows, dtype=np.int64)
+            row_kind = np.asarray(compiled.kind, dtype=np.int8)[rows]
+            timed = np.isin(row_kind, list(TIMED_KINDS))
+            cell_start = np.asarray(cell_start, dtype=np.int64)
+            cell_end = np.asarray(cell_end, dtype=np.int64)
+            written = cell_start != NO_TIME
+            kind.append(row_kind)
+            row.append(rows)
+            roster.append(np.full(len(rows), roster_idx, dtype=np.int64))
+            start.append(np.where(timed, np.where(written, cell_start, np.asarray(compiled.start)[rows]), NO_TIME))
+            end.append(np.where(timed, np.where(written, cell_end, np.asarray(compiled.end)[rows]), NO_TIME))
+
+        self.names = [name for _, name in sorted(names.values())]
+        self.person = np.asarray(person, dtype=np.int64)
+        self.date = np.asarray(date, dtype=np.int64)
+        self.weekday = np.asarray(weekday, dtype=np.int8)
+        self.kind = np.concatenate(kind) if kind else np.zeros(0, dtype=np.int8)
+        self.start = np.concatenate(start) if start else np.zeros(0, dtype=np.int64)
+        self.end = np.concatenate(end) if end else np.zeros(0, dtype=np.int64)
+        self.row = np.concatenate(row) if row else np.zeros(0, dtype=np.int64)        # posizione nella struttura compilata
+        self.roster = np.concatenate(roster) if roster else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.person)
+
+    def between(self, date_from=None, date_to=None):
+        """Maschera delle occorrenze nelle date indicate; con un filtro quelle senza data sono escluse."""
+        mask = np.ones(len(self), dtype=bool)
+        if date_from:
+            mask &= self.date >= date_from.toordinal()
+        if date_to:
+            mask &= (self.date > 0) & (self.date <= date_to.toordinal())
+        return mask
+
+
+def night_minutes(start, end):
+    """Minuti di ogni intervallo [inizio, fine) che cadono nella fascia notturna."""
+    total = np.zeros(len(start), dtype=np.int64)
+    # la fine di un turno notturno arriva fino a 2880: bastano le fasce di tre giorni
+    for base in (-MINUTES_PER_DAY, 0, MINUTES_PER_DAY):
+        window_start = base + NIGHT_START
+        window_end = base + MINUTES_PER_DAY + NIGHT_END
+        total += np.clip(np.minimum(end, window_end) - np.maximum(start, window_start), 0, None)
+    return total
+
+
+def _distinct_days(person, date, n_people):
+    """Giorni distinti per persona."""
+    if not len(person):
+        return np.zeros(n_people, dtype=np.int64)
+    pairs = np.unique(np.stack([person, date]), axis=1)
+    return np.bincount(pairs[0], minlength=n_people)
+
+
+def staff_summary(occurrences, date_from=None, date_to=None, holidays=()):
+    """Righe del riepilogo (dict con le chiavi di COLUMNS), una per persona, in ordine alfabetico."""
+    occ = occurrences
+    n = len(occ.names)
+    mask = occ.between(date_from, date_to)
+    person, date, kind = occ.person[mask], occ.date[mask], occ.kind[mask]
+
+    work = kind == ShiftKind.WORK
+    timed_work = work & (occ.start[mask] != NO_TIME)
+    start, end = occ.start[mask][timed_work], occ.end[mask][timed_work]
+
+    years = {datetime.date.fromordinal(int(d)).year for d in np.unique(date[date > 0])}
+    holiday_days = {d.toordinal() for y in years for d in italian_holidays(y)}
+    holiday_days |= {d.toordinal() for d in holidays}
+    holiday = np.isin(date, list(holiday_days))
+
+    def count(selected):
+        return np.bincount(person[selected], minlength=n)
+
+    hours = np.bincount(person[timed_work], weights=end - start, minlength=n) / 60
+    night = np.bincount(person[timed_work], weights=night_minutes(start, end), minlength=n) / 60
+    shifts = count(work)
+    worked = hours[shifts > 0]
+    mean_hours = worked.mean() if len(worked) else 0.0
+    deviation = (hours - mean_hours) / mean_hours * 100 if mean_hours else np.zeros(n)
+
+    columns = {
+        "Turni": shifts,
+        "Ore lavorate": np.round(hours, 2),
+        "Ore notturne": np.round(night, 2),
+        "Turni weekend": count(work & (occ.weekday[mask] >= 5)),
+        "Turni festivi": count(work & holiday),
+        "Giorni lavorati": _distinct_days(person[work], date[work], n),
+        "Riposi": _distinct_days(person[np.isin(kind, REST_KINDS)], date[np.isin(kind, REST_KINDS)], n),
+        "Ferie": _distinct_days(person[kind == ShiftKind.LEAVE], date[kind == ShiftKind.LEAVE], n),
+        "Malattia": _distinct_days(person[kind == ShiftKind.SICK], date[kind == ShiftKind.SICK], n),
+        "Permessi": count(kind == ShiftKind.PERMIT),
+        "Scarto ore (%)": np.round(np.where(shifts > 0, deviation, 0.0), 1),
+    }
+    present = np.bincount(person, minlength=n) > 0
+    rows = [
+        {"Persona": occ.names[i], **{k: v[i].item() for k, v in columns.items()}}
+        for i in np.flatnonzero(present)
+    ]
+    return sorted(rows, key=lambda r: r["Persona"].lower())
+
+
+def load_rosters(paths, structure_path=None):
+    """(tabelle, struttura, periodo) per ogni PDF leggibile; gli altri vengono segnalati e saltati."""
+    from main import get_hardcoded_structure, read_pdf_tables, resolve_structure
+
+    rosters = []
+    for path in paths:
+        tables = read_pdf_tables(path)
+        if not tables:
+            print(f"Impossibile leggere le tabelle da {path}", file=sys.stderr)
+            continue
+        structure = get_hardcoded_structure(structure_path) if structure_path else resolve_structure(tables)[0]
+        rosters.append((tables, structure, roster_period(path, header_days=cell_map(tables)[1])))
+    return rosters
+
+
+def write_summary_csv(rows, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_summary(rows):
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in COLUMNS}
+    print("  ".join(c.ljust(widths[c]) for c in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in COLUMNS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ore, notti, festivi, riposi e ferie di tutto il personale.")
+    parser.add_argument("inputs", nargs="+", help="PDF dei turni, cartelle o pattern glob")
+    parser.add_argument("-o", "--output", help="file CSV del riepilogo (default: stampa a video)")
+    parser.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat, help="prima data (AAAA-MM-GG)")
+    parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat, help="ultima data (AAAA-MM-GG)")
+    parser.add_argument("--holiday", action="append", default=[], type=datetime.date.fromisoformat,
+                        help="festività aggiuntiva, es. il santo patrono (ripetibile)")
+    parser.add_argument("--structure", help="file structure.json da usare al posto del registro/predefinito")
+    args = parser.parse_args(argv)
+    logs.configure()
+
+    paths = expand_inputs(args.inputs)
+    rosters = load_rosters(paths, args.structure)
+    if not rosters:
+        print("Nessun PDF dei turni leggibile.", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    rows = staff_summary(Occurrences(rosters), args.date_from, args.date_to, args.holiday)
+    elapsed = time.perf_counter() - started
+    if not rows:
+        print("Nessun turno nel periodo indicato.", file=sys.stderr)
+        return 1
+    if args.output:
+        write_summary_csv(rows, args.output)
+        print(f"Riepilogo di {len(rows)} persone da {len(rosters)} PDF scritto in {args.output}")
+    else:
+        print_summary(rows)
+    print(f"Calcolo in {elapsed * 1000:.0f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
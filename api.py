@@ -0,0 +1,338 @@
+"""
+Servizio HTTP locale per consultare i turni da altri strumenti (intranet, bot).
+
+Legge i "servizio custodia*.pdf" di una cartella e risponde in JSON. Le
+tabelle di ogni PDF vengono lette una sola volta e tenute per hash del
+contenuto in resources.RESOURCES, che è in memoria: ogni processo (questo
+servizio, l'app) ha la sua. Con l'app si condivide solo la cache per
+pagina su disco (pagecache, se TURNIZIO_PAGE_CACHE indica la stessa
+cartella); la struttura è quella del registro dei layout o --structure. Le richieste sono servite da un pool
+di thread di dimensione fissa.
+
+Endpoint:
+    GET /health
+    GET /rosters                                   PDF disponibili con periodo
+    GET /rosters/<id>/people                       persone presenti nel PDF
+    GET /rosters/<id>/shifts?person=Rossi          turni (con le date se c'è il periodo)
+    GET /rosters/<id>/pdf?person=Rossi             PDF personale
+
+<id> è il prefisso dell'hash del PDF, "current" (il periodo che contiene
+oggi, altrimenti il più recente) oppure "latest".
+
+Uso:
+    python api.py /percorso/condiviso --port 8502 --workers 8
+"""
+import argparse
+import datetime
+import fnmatch
+import json
+import logging
+import os
+import sys
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import logs
+from batch import ROSTER_GLOB, list_people
+from ics import roster_period, shift_dates
+from main import (
+    extract_days_from_header,
+    extract_shifts_for_person_hardcoded,
+    get_hardcoded_structure,
+    get_output_filename,
+    read_pdf_tables,
+    render_shifts_pdf,
+    resolve_structure,
+    sort_days,
+)
+from resources import RESOURCES, SHARED, content_hash, tables_key
+
+log = logs.get_logger("api")
+
+DEFAULT_PORT = 8502
+
+
+class NotFound(Exception):
+    pass
+
+
+@dataclass
+class Roster:
+    roster_id: str
+    path: str
+    period: tuple
+    digest: str
+
+
+class RosterStore:
+    """
+    PDF della cartella, indicizzati per hash del contenuto; tabelle nella cache condivisa.
+    Le cache per PDF seguono il contenuto della cartella: un PDF tolto o sostituito
+    viene dimenticato al primo elenco successivo.
+    """
+
+    def __init__(self, directory, structure_path=None):
+        self.directory = directory
+        self.structure_path = structure_path
+        self._lock = threading.Lock()
+        self._digests = {}        # percorso -> ((mtime, size), hash)
+        self._loading = {}        # hash -> Lock, per non leggere due volte lo stesso PDF
+        self._structures = {}     # hash -> struttura
+        self._people = {}         # hash -> persone presenti
+        self._periods = {}        # percorso -> (hash, periodo)
+
+    def _digest(self, path):
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = self._digests.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(path, "rb") as f:
+            digest = content_hash(f.read())
+        self._digests[path] = (signature, digest)
+        return digest
+
+    def rosters(self):
+        """PDF disponibili, dal periodo più recente."""
+        names = [n for n in os.listdir(self.directory) if fnmatch.fnmatch(n.lower(), ROSTER_GLOB)]
+        found = {}
+        with self._lock:
+            for name in names:
+                path = os.path.join(self.directory, name)
+                try:
+                    found[path] = self._digest(path)
+                except OSError:
+                    continue  # file sparito nel frattempo
+            self._prune(found)
+        rosters = [Roster(digest[:12], path, self._period(path, digest), digest) for path, digest in found.items()]
+        return sorted(rosters, key=lambda r: (r.period or (datetime.date.min,), r.path), reverse=True)
+
+    def _prune(self, found):
+        """Dimentica i PDF che non sono più nella cartella ({percorso: hash} attuale)."""
+        digests = set(found.values())
+        for path in [p for p in self._digests if p not in found]:
+            del self._digests[path]
+        for path in [p for p, (digest, _) in self._periods.items() if found.get(p) != digest]:
+            del self._periods[path]
+        for cache in (self._loading, self._structures, self._people):
+            for digest in [d for d in cache if d not in digests]:
+                del cache[digest]
+
+    def _period(self, path, digest):
+        """Periodo dal nome, con l'anno scelto dai giorni dell'header come in batch."""
+        cached = self._periods.get(path)
+        if cached and cached[0] == digest:
+            return cached[1]
+        period = roster_period(path)
+        if period is not None:
+            try:
+                period = roster_period(path, header_days=extract_days_from_header(self._tables(path, digest)))
+            except NotFound:
+                pass  # PDF illeggibile: resta il periodo del nome, le richieste risponderanno 404
+        self._periods[path] = (digest, period)
+        return period
+
+    def find(self, roster_id):
+        rosters = self.rosters()
+        if not rosters:
+            raise NotFound("nessun PDF dei turni nella cartella")
+        if roster_id == "latest":
+            return rosters[0]
+        if roster_id == "current":
+            today = datetime.date.today()
+            return next((r for r in rosters if r.period and r.period[0] <= today <= r.period[1]), rosters[0])
+        for roster in rosters:
+            if roster.digest.startswith(roster_id) or os.path.basename(roster.path) == roster_id:
+                return roster
+        raise NotFound(f"PDF non trovato: {roster_id}")
+
+    def _tables(self, path, digest):
+        """Tabelle del PDF, lette una sola volta anche con richieste concorrenti."""
+        key = tables_key(digest)
+        tables = RESOURCES.get(SHARED, key)
+        if tables is None:
+            with self._lock:
+                lock = self._loading.setdefault(digest, threading.Lock())
+            with lock:
+                tables = RESOURCES.get_or_create(SHARED, key, lambda: read_pdf_tables(path))
+            if not tables:
+                raise NotFound(f"impossibile leggere le tabelle da {os.path.basename(path)}")
+        return tables
+
+    def tables(self, roster):
+        """Tabelle e struttura del PDF."""
+        tables = self._tables(roster.path, roster.digest)
+        structure = self._structures.get(roster.digest)
+        if structure is None:
+            if self.structure_path:
+                structure = get_hardcoded_structure(self.structure_path)
+            else:
+                structure = resolve_structure(tables)[0]
+            self._structures[roster.digest] = structure
+        return tables, structure
+
+    def people(self, roster):
+        people = self._people.get(roster.digest)
+        if people is None:
+            people = self._people[roster.digest] = list_people(self.tables(roster)[0])
+        return people
+
+    def shifts(self, roster, person):
+        if not any(person.lower() in p.lower() for p in self.people(roster)):
+            raise NotFound(f"persona non trovata: {person}")
+        tables, structure = self.tables(roster)
+        return sort_days(extract_shifts_for_person_hardcoded(tables, person, structure=structure))
+
+
+def roster_summary(roster):
+    return {
+        "id": roster.roster_id,
+        "file": os.path.basename(roster.path),
+        "periodo": [d.isoformat() for d in roster.period] if roster.period else None,
+    }
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # connessioni persistenti
+    server_version = "Turnizio"
+    timeout = 30  # una connessione inattiva libera il suo thread dopo 30 s
+    disable_nagle_algorithm = True  # header e corpo sono scritti separatamente: evita ~40 ms di attesa
+    store = None  # RosterStore, assegnato da make_server()
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        parts = [urllib.parse.unquote(p) for p in url.path.strip("/").split("/") if p]
+        try:
+            if parts == ["health"]:
+                self.send_json({"stato": "ok"})
+            elif parts == ["rosters"]:
+                self.send_json([roster_summary(r) for r in self.store.rosters()])
+            elif len(parts) == 3 and parts[0] == "rosters":
+                self.roster_endpoint(self.store.find(parts[1]), parts[2], query)
+            else:
+                raise NotFound("endpoint inesistente")
+        except NotFound as e:
+            self.send_json({"errore": str(e)}, status=404)
+        except ValueError as e:
+            self.send_json({"errore": str(e)}, status=400)
+        except Exception as e:
+            logs.event(log, logging.ERROR, "errore richiesta", path=self.path, error=str(e))
+            self.send_json({"errore": "errore interno"}, status=500)
+
+    def roster_endpoint(self, roster, resource, query):
+        if resource == "people":
+            if not self.not_modified(roster.digest):
+                self.send_json({**roster_summary(roster), "persone": self.store.people(roster)}, etag=roster.digest)
+            return
+        person = (query.get("person") or [""])[0].strip()
+        if not person:
+            raise ValueError("parametro person mancante")
+        etag = f"{roster.digest}-{person.lower()}"
+        if self.not_modified(etag):
+            return
+        shifts = self.store.shifts(roster, person)
+        if resource == "shifts":
+            records = shifts.to_records()
+            if roster.period:
+                for record, date in zip(records, shift_dates(shifts, roster.period)):
+                    record["data_iso"] = date.isoformat() if date else None
+            self.send_json({**roster_summary(roster), "persona": person, "turni": records}, etag=etag)
+        elif resource == "pdf":
+            filename = get_output_filename(os.path.basename(roster.path), person)
+            self.send_bytes(render_shifts_pdf(shifts, person), "application/pdf", etag,
+                            {"Content-Disposition": f"inline; filename*=UTF-8''{urllib.parse.quote(filename)}"})
+        else:
+            raise NotFound("endpoint inesistente")
+
+    def not_modified(self, etag):
+        if self.headers.get("If-None-Match") == f'"{etag}"':
+            self.send_response(304)
+            self.send_header("ETag", f'"{etag}"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return True
+        return False
+
+    def send_json(self, payload, status=200, etag=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_bytes(body, "application/json; charset=utf-8", etag, status=status)
+
+    def send_bytes(self, body, content_type, etag=None, headers=None, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", f'"{etag}"')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logs.event(log, logging.DEBUG, "richiesta", client=self.address_string(), line=format % args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer che serve ogni connessione in un pool di thread di dimensione fissa:
+    con connessioni persistenti, workers è anche il numero di client serviti insieme.
+    """
+
+    def __init__(self, address, handler, workers):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._serve, request, client_address)
+
+    def _serve(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_server(directory, host="127.0.0.1", port=DEFAULT_PORT, workers=8, structure_path=None):
+    handler = type("Handler", (ApiHandler,), {"store": RosterStore(directory, structure_path)})
+    return PooledHTTPServer((host, port), handler, workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP locale per i turni.")
+    parser.add_argument("directory", help="cartella con i PDF dei turni")
+    parser.add_argument("--host", default="127.0.0.1", help="indirizzo di ascolto (default: solo locale)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=8, help="thread per le richieste (default: 8)")
+    parser.add_argument("--structure", help="file structure.json da usare al posto del registro/predefinito")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"cartella inesistente: {args.directory}")
+    if args.workers < 1:
+        parser.error("--workers deve essere almeno 1")
+    logs.configure(debug=args.debug, spec=os.environ.get("TURNIZIO_LOG") or "INFO")
+
+    server = make_server(args.directory, args.host, args.port, args.workers, args.structure)
+    logs.event(log, logging.INFO, "in ascolto", url=f"http://{args.host}:{args.port}", workers=args.workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,42 @@
+from __future__ import annotations
+
 import streamlit as st
-import requests
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from main import (
     parse_pdf,
     extract_shifts_for_person_hardcoded,
-    write_shifts_to_pdf,
+    render_shifts_html,
+    render_shifts_pdf,
     sort_days,
-    has_giardini_castello,
-    format_day_for_display,
-    normalize_day_name,
     get_hardcoded_structure,
     structure_to_json_bytes,
     structure_from_json_bytes,
     get_raw_pdf_rows,
+    get_output_filename,
+)
+from background import BACKGROUND, Job
+from structure import compile_structure
+from diff import diff_rosters
+from layout import StructureRegistry, layout_fingerprint, propose_structure
+from preview import rasterize_pdf, svg_viewer_html, vectorize_pdf
+from profiling import PROFILER
+from resources import RESOURCES, SHARED, content_hash, tables_key
+from sandbox import SANDBOX, SandboxError
+from timetable_image import image_filename, render_shifts_image
+import logs
+from shifts import (
+    ShiftTable, Cleaning, DAY_BY_NAME, DAY_DISPLAY_NAMES, CLEANING_LABELS, CLEANING_BY_LABEL,
+    NO_TIME, MINUTES_PER_DAY, parse_time_range,
 )
-import tempfile
 import os
 import re
-import pandas as pd
-import base64
-from pdf2image import convert_from_bytes
-from PIL import Image, ImageDraw
-import io
-import fitz  # PyMuPDF
+import time
+
+# pandas, PyMuPDF, Pillow e requests vengono importati al primo uso: la pagina
+# iniziale e i rerun che non li usano non pagano il loro tempo di import.
+
+logs.configure()
 
 # ── Page Config ──────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -171,6 +186,8 @@ import json
 import urllib.parse
 
 def download_adobe_pdf(adobe_url):
+    import requests
+
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     }
@@ -214,93 +231,74 @@ def download_adobe_pdf(adobe_url):
         
     return None, None
 
-def get_output_filename(input_filename, surname):
-    match = re.search(r"DAL.*\.pdf", input_filename, re.IGNORECASE)
-    return f"Turni {surname} " + match.group(0).lower() if match else f"Turni {surname}.pdf"
-
-
-def display_pdf(pdf_bytes, title=None, filename=None, show_download=False, highlight_text=None, use_zoom=False):
-    if show_download and filename:
-        c1, c2, c3 = st.columns([1, 1, 1])
-        with c2:
-            st.download_button(
-                label="⬇️ SCARICA PDF GENERATO",
-                data=pdf_bytes,
-                file_name=filename,
-                mime="application/pdf",
-                type="primary",
-                use_container_width=True
-            )
-        st.markdown("---")
+def wait_for(job, label):
+    """Attende un lavoro in background mostrando l'avanzamento per pagina; ritorna il risultato."""
+    if not job.done():
+        bar = st.progress(0.0, text=label)
+        while not job.done():
+            text = f"{label} ({job.done_steps}/{job.total})" if job.total else label
+            bar.progress(job.fraction, text=text)
+            time.sleep(0.1)
+        bar.empty()
+    return job.result()
 
+
+def pdf_preview_area(title=None, zoom_key=None):
+    """
+    Spazio per l'anteprima nella posizione corrente della pagina, riempito più
+    avanti con fill_pdf_preview() quando le immagini sono pronte. Con zoom_key
+    mostra anche il cursore dello zoom. Ritorna (contenitore, zoom in %).
+    """
     # Create a container for the PDF images so we can place the slider below it
     pdf_container = st.container()
 
-    # Zoom Controller - placed BELOW the PDF container in terms of variable usage, 
+    # Zoom Controller - placed BELOW the PDF container in terms of variable usage,
     # but we'll use the value inside the container above it.
     zoom_val = 100
-    if use_zoom:
-        zoom_val = st.slider("Livello Zoom (%)", 100, 400, 100, step=10, key=f"zoom_{hash(pdf_bytes)}")
+    if zoom_key:
+        zoom_val = st.slider("Livello Zoom (%)", 100, 400, 100, step=10, key=zoom_key)
 
     if title:
         st.caption(f"**{title}**")
+    return pdf_container, zoom_val
 
-    try:
-        def normalize_token(s):
-            s = s.strip()
-            s = re.sub(r"[^\wÀ-ÖØ-öø-ÿ]+", "", s, flags=re.UNICODE)
-            return s.lower()
-
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        dpi = 150 if use_zoom else 200 
-        mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
-        
-        target_tokens = []
-        if highlight_text:
-            target_tokens = [normalize_token(t) for t in highlight_text.strip().split() if normalize_token(t)]
-
-        html_images = []
-        for i in range(doc.page_count):
-            page = doc.load_page(i)
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-            mode = "RGB" if pix.n < 4 else "RGBA"
-            img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-            
-            if target_tokens:
-                overlay = Image.new("RGBA", img.size, (255, 255, 255, 0))
-                draw = ImageDraw.Draw(overlay)
-                words = page.get_text("words")
-                found_any = False
-                
-                first_token = target_tokens[0]
-                n, m = len(words), len(target_tokens)
-                for idx in range(n - m + 1):
-                    if all(normalize_token(words[idx + k][4]) == target_tokens[k] for k in range(m)):
-                        found_any = True
-                        x0 = min(words[idx + k][0] for k in range(m))
-                        y0 = min(words[idx + k][1] for k in range(m))
-                        x1 = max(words[idx + k][2] for k in range(m))
-                        y1 = max(words[idx + k][3] for k in range(m))
-                        rect = fitz.Rect(x0, y0, x1, y1) * mat
-                        draw.rectangle([rect.x0, rect.y0, rect.x1, rect.y1], fill=(255, 230, 0, 150))
-
-                if not found_any:
-                    for w in words:
-                        if normalize_token(w[4]) == first_token:
-                            rect = fitz.Rect(w[0], w[1], w[2], w[3]) * mat
-                            draw.rectangle([rect.x0, rect.y0, rect.x1, rect.y1], fill=(255, 230, 0, 150))
-                
-                img = Image.alpha_composite(img.convert("RGBA"), overlay)
-
-            buffered = io.BytesIO()
-            img.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            html_images.append(f'<img src="data:image/png;base64,{img_str}" style="width:100%; margin-bottom:10px; border-radius:4px; display:block;">')
-        
-        doc.close()
-        
+
+def submit_preview(name, pdf_path, digest, dpi, highlight_text=None):
+    """
+    Immagini dell'anteprima già pronte (lista) oppure il Job che le sta
+    calcolando; con dpi None pagine SVG invece di immagini. Il risultato viene
+    salvato come artefatto della sessione dal worker stesso, così i rerun
+    successivi non lo richiedono di nuovo. Al worker va solo il percorso, e
+    sempre allo stesso per lo stesso file: il documento aperto per la lettura
+    resta nella sua cache (documents.DOCUMENTS).
+    """
+    key = (digest, dpi, highlight_text)
+    cached = RESOURCES.get(SESSION_ID, name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    session_id = SESSION_ID
+
+    def render(progress):
+        if dpi is None:
+            images = SANDBOX.run(vectorize_pdf, pdf_path, highlight_text, progress=progress, affinity=digest)
+        else:
+            images = SANDBOX.run(rasterize_pdf, pdf_path, dpi, highlight_text, progress=progress, affinity=digest)
+        if is_active_session(session_id):  # la sessione può essere scaduta mentre il lavoro girava
+            RESOURCES.put_if_open(session_id, name, (key, images))
+        return images
+
+    return BACKGROUND.submit((session_id, name, key), render)
+
+
+def fill_pdf_preview(container, preview, zoom_val, label):
+    with container:
+        try:
+            html_images = wait_for(preview, label) if isinstance(preview, Job) else preview
+        except Exception as e:
+            st.error(f"Errore visualizzazione PDF: {str(e)}")
+            return
         # Displaying the PDF inside the container (which is above the slider and title in the UI)
-        pdf_container.markdown(f"""
+        st.markdown(f"""
             <div class="zoom-container">
                 <div style="width: {zoom_val}%; min-width: 100%; margin: 0 auto;">
                     {''.join(html_images)}
@@ -308,85 +306,643 @@ def display_pdf(pdf_bytes, title=None, filename=None, show_download=False, highl
             </div>
         """, unsafe_allow_html=True)
 
-    except Exception as e:
-        st.error(f"Errore visualizzazione PDF: {str(e)}")
+
+def fill_svg_preview(container, preview, label, height=900):
+    """Pagine SVG in un visualizzatore con zoom e spostamento nel browser: nessun rerun per lo zoom."""
+    with container:
+        try:
+            pages = wait_for(preview, label) if isinstance(preview, Job) else preview
+        except Exception as e:
+            st.error(f"Errore visualizzazione PDF: {str(e)}")
+            return
+        st.iframe(svg_viewer_html(pages, height), height=height)
 
 
+def submit_input_preview():
+    """Anteprima del PDF originale nella modalità scelta (immagini o SVG)."""
+    path, digest = input_pdf_path(), st.session_state.pdf_hash
+    if st.session_state.vector_preview:
+        return submit_preview("preview:input:svg", path, digest, None, st.session_state.surname)
+    return submit_preview("preview:input", path, digest, 150, st.session_state.surname)
+
 
 def init_session_state():
     defaults = {
         'shifts': None,
         'pdf_processed': False,
         'output_filename': None,
-        'input_pdf_bytes': None,
+        'temp_pdf_path': None,
         'surname': None,
-        'generated_pdf_bytes': None,
+        'show_raw_pdf_rows': False,
         'need_regenerate': True,
+        'pdf_revision': 0,
         'structure': None,
         'last_processed_key': None,
+        'layout_fingerprint': None,
+        'structure_version': None,
+        'proposed_structure': None,
+        'structure_edited': False,
+        'pdf_hash': None,
+        'previous_pdf_name': None,
+        'pdf_name': None,
+        'vector_preview': False,
     }
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
 
 
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "locale"
+
+
+def is_active_session(session_id):
+    return not runtime.exists() or runtime.get_instance().is_active_session(session_id)
+
+
+def parse_pdf_cached(path, digest):
+    """
+    Tabelle del PDF, condivise tra le sessioni che caricano lo stesso file.
+    La lettura gira in un processo di lavoro con limiti di tempo e memoria
+    (una sola per file anche con più sessioni) e intanto si mostrano le pagine lette.
+    Il lavoro va al processo dell'hash: anteprime e debug dello stesso file ne riusano il documento aperto.
+    """
+    tables = RESOURCES.get(SHARED, tables_key(digest))
+    if tables is None:
+        job = BACKGROUND.submit(("parse", digest), lambda progress: RESOURCES.get_or_create(
+            SHARED, tables_key(digest), lambda: SANDBOX.run(parse_pdf, path, progress=progress, affinity=digest)
+        ))
+        tables = wait_for(job, "Lettura pagine del PDF")
+    return tables
+
+
+def remember_previous_version(digest):
+    """
+    Quando arriva un PDF diverso, conserva le tabelle già lette del precedente
+    per mostrare cosa è cambiato senza rileggere nessuno dei due file.
+    """
+    previous_hash = st.session_state.pdf_hash
+    if not previous_hash or previous_hash == digest:
+        return
+    previous_tables = RESOURCES.get(SHARED, tables_key(previous_hash))
+    if previous_tables is None:
+        RESOURCES.drop(SESSION_ID, "previous_tables")
+    else:
+        RESOURCES.put(SESSION_ID, "previous_tables", previous_tables)
+    st.session_state.previous_pdf_name = st.session_state.pdf_name
+
+
+def input_pdf_path():
+    """File temporaneo del PDF caricato, None se la sessione è scaduta e il file è stato rimosso."""
+    path = st.session_state.temp_pdf_path
+    return path if path and os.path.exists(path) else None
+
+
+def roster_tables():
+    """
+    Tabelle del PDF caricato, oppure None senza PDF. Se il budget di memoria
+    le ha scartate vengono rilette dal file temporaneo (nel worker del file,
+    con le pagine dalla sua cache).
+    """
+    digest, path = st.session_state.pdf_hash, input_pdf_path()
+    if not digest:
+        return None
+    if path is None:
+        return RESOURCES.get(SHARED, tables_key(digest))
+    try:
+        return parse_pdf_cached(path, digest)
+    except SandboxError:
+        return None
+
+
+def roster_check():
+    """Controllo del PDF caricato con la struttura attuale, oppure None se le tabelle non sono in memoria."""
+    from checks import check_roster  # numpy al primo controllo, non all'avvio
+
+    tables = roster_tables()
+    return check_roster(tables, get_structure()) if tables else None
+
+
+def roster_index():
+    """Indici di occupazione del PDF caricato con la struttura attuale, oppure None."""
+    from checks import OccupancyIndex
+
+    tables = roster_tables()
+    return OccupancyIndex(tables, get_structure()) if tables else None
+
+
 def get_structure():
     if st.session_state.structure is None:
         st.session_state.structure = get_hardcoded_structure()
     return st.session_state.structure
 
 
+def apply_layout_registry(tables):
+    """
+    Se il layout del PDF è registrato usa la sua struttura, altrimenti prepara
+    una proposta di allineamento. Solo quando arriva un layout diverso: con lo
+    stesso layout la struttura attuale, anche modificata a mano, resta com'è.
+    """
+    fingerprint = layout_fingerprint(tables)
+    if fingerprint == st.session_state.layout_fingerprint:
+        return
+    st.session_state.layout_fingerprint = fingerprint
+    st.session_state.structure_edited = False
+    matched = StructureRegistry().match(fingerprint)
+    if matched:
+        name, structure = matched
+        st.session_state.structure = structure
+        st.session_state.structure_version = name
+        st.session_state.proposed_structure = None
+        st.toast(f"Struttura riconosciuta: {name}", icon="🧬")
+    else:
+        st.session_state.structure_version = None
+        st.session_state.proposed_structure = propose_structure(tables)
+
+
+def structure_comparison_df(current: dict, proposed: dict) -> pd.DataFrame:
+    import pandas as pd
+
+    keys = sorted(set(current) | set(proposed))
+    empty = ("", "", "")
+    cur = [current.get(k, empty) for k in keys]
+    prop = [proposed.get(k, empty) for k in keys]
+    df = pd.DataFrame({
+        "Indice": keys,
+        "Luogo attuale": [v[0] for v in cur],
+        "Orario attuale": [v[1] for v in cur],
+        "Luogo proposto": [v[0] for v in prop],
+        "Orario proposto": [v[1] for v in prop],
+    })
+    df["Diverso"] = (df["Luogo attuale"].str.lower() != df["Luogo proposto"].str.lower()) | (df["Orario attuale"] != df["Orario proposto"])
+    return df
+
+
 def structure_to_df(structure: dict) -> pd.DataFrame:
-    rows = sorted(structure.items())
-    return pd.DataFrame(
-        [{"Indice": k, "Luogo": v[0], "Orario": v[1]} for k, v in rows],
-        columns=["Indice", "Luogo", "Orario"]
-    )
+    import pandas as pd
+
+    keys = sorted(structure)
+    values = [structure[k] for k in keys]
+    return pd.DataFrame({
+        "Indice": keys,
+        "Luogo": [v[0] for v in values],
+        "Orario": [v[1] for v in values],
+    }, columns=["Indice", "Luogo", "Orario"])
 
 
 def df_to_structure(df: pd.DataFrame) -> dict:
-    result = {}
-    for _, row in df.iterrows():
-        try:
-            idx = int(row["Indice"])
-            result[idx] = (str(row["Luogo"]), str(row["Orario"]), "")
-        except: pass
-    return result
-
-
-def shifts_to_df(shifts):
-    data = []
-    for s in shifts:
-        data.append({
-            "Giorno": format_day_for_display(s[0]),
-            "Data": s[1],
-            "Luogo": s[2],
-            "Orario": s[3],
-            "Pulizia Bagni": s[4] if len(s) > 4 else ""
-        })
-    return pd.DataFrame(data)
-
-
-def df_to_shifts(df):
-    shifts = []
-    for _, row in df.iterrows():
-        day_norm = normalize_day_name(row["Giorno"])
-        shifts.append((day_norm, str(row["Data"]), row["Luogo"], row["Orario"], row["Pulizia Bagni"]))
-    return shifts
-
-
-def generate_pdf_bytes(shifts, output_filename, surname):
-    output_name = write_shifts_to_pdf(shifts, output_filename, surname)
-    with open(output_name, "rb") as f:
-        pdf_bytes = f.read()
-    if os.path.exists(output_name):
-        os.remove(output_name)
+    import pandas as pd
+
+    idx = pd.to_numeric(df["Indice"], errors="coerce")
+    valid = idx.notna()
+    luoghi = _text_column(df["Luogo"])[valid]
+    orari = _text_column(df["Orario"])[valid]
+    return {int(k): (l, o, "") for k, l, o in zip(idx[valid], luoghi, orari)}
+
+
+def _text_column(col: pd.Series) -> pd.Series:
+    """Colonna di testo dall'editor: celle vuote/None diventano stringa vuota."""
+    return col.astype(object).where(col.notna(), "").astype(str)
+
+
+def _format_minutes(minutes: pd.Series) -> pd.Series:
+    return (minutes // 60).astype(str).str.zfill(2) + ":" + (minutes % 60).astype(str).str.zfill(2)
+
+
+def shifts_to_df(shifts: ShiftTable) -> pd.DataFrame:
+    import pandas as pd
+
+    start = pd.Series(shifts.start, dtype="int64")
+    end = pd.Series(shifts.end, dtype="int64")
+    end = end.where(end <= MINUTES_PER_DAY, end - MINUTES_PER_DAY)
+    orario = (_format_minutes(start) + "-" + _format_minutes(end)).where(start != NO_TIME, "")
+    return pd.DataFrame({
+        "Giorno": pd.Categorical.from_codes([int(d) for d in shifts.day], categories=DAY_DISPLAY_NAMES),
+        "Data": pd.Series(shifts.day_number, dtype=object),
+        "Luogo": pd.Series(shifts.location, dtype=object),
+        "Orario": orario,
+        "Pulizia Bagni": pd.Categorical.from_codes([int(c) for c in shifts.cleaning], categories=CLEANING_LABELS),
+    })
+
+
+def _time_range_or_none(text):
+    try:
+        return parse_time_range(text)
+    except ValueError:
+        return None
+
+
+def df_to_shifts(df: pd.DataFrame) -> ShiftTable:
+    """Riconverte la tabella dell'editor in ShiftTable; solleva ValueError indicando le righe non valide."""
+    giorni = _text_column(df["Giorno"]).map(DAY_BY_NAME)
+    # stessa validazione dell'estrazione dal PDF (ore fino a 24, minuti fino a 59)
+    orari = _text_column(df["Orario"]).map(_time_range_or_none)
+
+    invalid = giorni.isna() | orari.isna()
+    if invalid.any():
+        righe = ", ".join(str(i + 1) for i in invalid.to_numpy().nonzero()[0])
+        raise ValueError(f"Giorno o orario non valido nelle righe: {righe}")
+
+    start = [start for start, _ in orari]
+    end = [end for _, end in orari]
+    pulizia = _text_column(df["Pulizia Bagni"]).map(CLEANING_BY_LABEL).fillna(Cleaning.NONE).astype(int)
+
+    return ShiftTable(
+        day=list(giorni.astype(int)),
+        day_number=list(_text_column(df["Data"])),
+        location=list(_text_column(df["Luogo"])),
+        start=start,
+        end=end,
+        cleaning=list(pulizia),
+    )
+
+
+def generated_pdf_bytes(session_id, shifts, surname, revision):
+    """
+    PDF personale (bytes) della revisione indicata. Viene prodotto in memoria
+    solo quando serve (al clic su scarica) e tenuto come artefatto della
+    sessione finché i turni non cambiano; revision distingue le versioni.
+    """
+    cached = RESOURCES.get(session_id, "generated_pdf")
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+    pdf_bytes = render_shifts_pdf(shifts, surname)
+    RESOURCES.put(session_id, "generated_pdf", (revision, pdf_bytes))
     return pdf_bytes
 
 
+def current_pdf_revision():
+    """Revisione dei turni attuali della sessione, incrementata se sono cambiati."""
+    if st.session_state.need_regenerate:
+        st.session_state.pdf_revision += 1
+        st.session_state.need_regenerate = False
+    return st.session_state.pdf_revision
+
+
+def rerun_fragment():
+    """
+    Riesegue solo il fragment in corso. Streamlit lo consente solo quando a
+    girare è il fragment stesso: durante un'esecuzione dell'intera pagina
+    (ad esempio subito dopo un cambio di scheda) si riesegue la pagina.
+    """
+    ctx = get_script_run_ctx()
+    st.rerun(scope="fragment" if ctx and ctx.fragment_ids_this_run else "app")
+
+
+# ── Schede ───────────────────────────────────────────────────────────────────
+# Ogni scheda è un fragment: un'interazione al suo interno riesegue solo la
+# scheda, non la barra laterale, le altre schede o l'anteprima in fondo.
+
+TABS = ["📄 PDF GENERATO", "✏️ MODIFICA TURNI", "⚙️ CONFIGURAZIONE"]
+
+
+@st.fragment(key="generated")
+def generated_tab():
+    previous_tables = RESOURCES.get(SESSION_ID, "previous_tables")
+    current_tables = roster_tables() if previous_tables is not None else None
+    roster_diff = diff_rosters(previous_tables, current_tables, get_structure()) if current_tables else None
+    if roster_diff is not None and roster_diff.comparable:
+        with st.expander(f"🔁 Cosa è cambiato rispetto a {st.session_state.previous_pdf_name}", expanded=True):
+            change = roster_diff.for_person(st.session_state.surname)
+            if change.rows():
+                st.dataframe(
+                    [dict(zip(("Modifica", "Prima", "Dopo"), row)) for row in change.rows()],
+                    use_container_width=True, hide_index=True,
+                )
+            else:
+                st.success("Nessuna modifica ai tuoi turni.")
+            others = [p for p in roster_diff.people if st.session_state.surname.lower() not in p.lower()]
+            if others:
+                st.caption(f"Turni cambiati anche per: {', '.join(others)}")
+
+    check = roster_check()
+    for issue in check.errors if check else []:
+        if st.session_state.surname.lower() in issue.person.lower():
+            st.warning(f"{issue.kind} {issue.day}: {issue.detail}", icon="⚠️")
+
+    st.markdown("#### 🗓️ I tuoi turni")
+    # Il PDF viene generato solo al clic (in un thread, senza rerun); l'anteprima
+    # è la stessa tabella in HTML, costruita direttamente dai turni.
+    shifts, surname, revision = st.session_state.shifts, st.session_state.surname, current_pdf_revision()
+    session_id = SESSION_ID
+    c1, c2, c3 = st.columns([1, 1, 1])
+    with c2:
+        st.download_button(
+            label="⬇️ SCARICA PDF GENERATO",
+            data=lambda: generated_pdf_bytes(session_id, shifts, surname, revision),
+            file_name=st.session_state.output_filename,
+            mime="application/pdf",
+            type="primary",
+            on_click="ignore",
+            use_container_width=True
+        )
+    with c3:
+        st.download_button(
+            label="📱 SCARICA IMMAGINE",
+            data=lambda: render_shifts_image(shifts, surname),
+            file_name=image_filename(st.session_state.output_filename, "png"),
+            mime="image/png",
+            on_click="ignore",
+            help="La tabella come immagine PNG da inoltrare in chat.",
+            use_container_width=True
+        )
+    st.markdown("---")
+    st.html(render_shifts_html(shifts, surname))
+
+
+@st.fragment(key="editor")
+def editor_tab():
+    st.subheader("📋 Gestione Turni Estratti")
+    
+    # Add new shift form (Compact)
+    with st.expander("➕ Aggiungi un nuovo turno manualmente", expanded=False):
+        with st.form("new_shift_form", clear_on_submit=True):
+            c1, c2, c3 = st.columns([1, 1, 1])
+            with c1:
+                d_day = st.selectbox("Giorno", DAY_DISPLAY_NAMES)
+                d_num = st.text_input("Data (Giorno)", placeholder="Es: 15")
+            with c2:
+                d_loc = st.text_input("Luogo", placeholder="Es: Giardini del Castello")
+                d_time = st.text_input("Orario", placeholder="Es: 08:00-14:00")
+            with c3:
+                st.write("") # Spacer
+                st.write("")
+                d_pul = st.checkbox("Pulizia Bagni")
+                add_btn = st.form_submit_button("AGGIUNGI ORA", use_container_width=True)
+            
+            if add_btn:
+                if d_loc:
+                    try:
+                        d_start, d_end = parse_time_range(d_time)
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        st.session_state.shifts.append(
+                            DAY_BY_NAME[d_day], d_num, d_loc, d_start, d_end,
+                            Cleaning.YES if d_pul else Cleaning.NO
+                        )
+                        st.session_state.shifts = sort_days(st.session_state.shifts)
+                        st.session_state.need_regenerate = True
+                        rerun_fragment()
+    
+    st.markdown("#### Tabella Modifica Rapida")
+    st.caption("Puoi modificare i testi direttamente nella tabella qui sotto. Ricordati di cliccare Salva.")
+    
+    # Shift data editor (Compact & Modern)
+    edited_shifts_df = st.data_editor(
+        shifts_to_df(st.session_state.shifts),
+        num_rows="dynamic",
+        use_container_width=True,
+        column_config={
+            "Giorno": st.column_config.SelectboxColumn("Giorno", options=list(DAY_DISPLAY_NAMES), required=True),
+            "Data": st.column_config.TextColumn("Data", width="small"),
+            "Luogo": st.column_config.TextColumn("Luogo", width="large"),
+            "Orario": st.column_config.TextColumn("Orario", width="medium"),
+            "Pulizia Bagni": st.column_config.SelectboxColumn("Pulizia", options=list(CLEANING_LABELS), width="small"),
+        }
+    )
+    
+    c_save, c_empty = st.columns([1, 2])
+    with c_save:
+        if st.button("💾 SALVA MODIFICHE E RIGENERA PDF", use_container_width=True, type="primary"):
+            try:
+                st.session_state.shifts = df_to_shifts(edited_shifts_df)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.session_state.need_regenerate = True
+                st.toast("Modifiche salvate con successo!", icon="💾")
+                rerun_fragment()
+
+
+@st.fragment(key="configuration")
+def configuration_tab():
+    st.subheader("⚙️ Configurazione Tecnica")
+    
+    with st.expander("🔍 Strumenti Debug PDF", expanded=False):
+        st.write("Visualizza esattamente come il programma legge le righe del PDF per correggere la struttura.")
+        temp_pdf_path = input_pdf_path()
+        if temp_pdf_path:
+            if st.button("Analizza Righe PDF"):
+                st.session_state.show_raw_pdf_rows = True
+            
+            if st.session_state.show_raw_pdf_rows:
+                # nel processo che ha già aperto il documento: pagine dalla sua cache, nessuna nuova estrazione
+                try:
+                    rows = RESOURCES.get_or_create(SESSION_ID, "raw_pdf_rows", lambda: SANDBOX.run(
+                        get_raw_pdf_rows, temp_pdf_path, affinity=st.session_state.pdf_hash
+                    ))
+                except SandboxError as e:
+                    st.error(str(e))
+                else:
+                    st.dataframe(rows, use_container_width=True, height=300)
+        else:
+            st.warning("Carica un PDF per attivare il debug.")
+
+    check = roster_check()
+    with st.expander("🩺 Controllo del PDF", expanded=bool(check and check.errors)):
+        if check is None:
+            st.warning("Carica un PDF per controllarlo.")
+        else:
+            st.caption("Doppie assegnazioni e giornate troppo lunghe (errori), righe della struttura "
+                       "senza nessuno (avvisi), su fasce di 15 minuti.")
+            if check.errors:
+                st.error(f"Il PDF contiene {check.summary()}.")
+            else:
+                st.success(f"Nessuna doppia assegnazione né giornata troppo lunga ({len(check.warnings)} avvisi).")
+            if check.issues:
+                st.dataframe(check.rows(), use_container_width=True, hide_index=True)
+
+    with st.expander("🔄 Chi può sostituire", expanded=False):
+        from replacements import find_replacements, shift_rows  # numpy al primo uso, non all'avvio
+
+        index = roster_index()
+        rows = shift_rows(index.compiled) if index else []
+        if not rows:
+            st.warning("Carica un PDF per cercare i sostituti.")
+        else:
+            st.caption("Persone senza turni sovrapposti né ferie, malattia o permessi nel giorno: "
+                       "prima chi rispetta ore massime e riposo, poi chi non è di riposo, poi chi ha meno ore.")
+            col_day, col_row = st.columns([1, 2])
+            day = col_day.selectbox("Giorno del turno", sorted(d for d in index.labels if d < 7),
+                                    format_func=index.labels.get, key="replace_day")
+            row_labels = dict(rows)
+            row = col_row.selectbox("Turno da coprire", list(row_labels),
+                                    format_func=lambda r: f"{r} · {row_labels[r]}", key="replace_row")
+            candidates = find_replacements(index, day, row)
+            if candidates:
+                st.dataframe(candidates, use_container_width=True, hide_index=True)
+            else:
+                st.info("Nessuna persona disponibile per questo turno.")
+
+    with st.expander("⏱️ Prestazioni", expanded=False):
+        st.caption("Tempi cumulati per fase della pipeline da quando il server è attivo.")
+        perf_rows = PROFILER.summary()
+        if perf_rows:
+            st.dataframe(perf_rows, use_container_width=True, hide_index=True)
+        else:
+            st.info("Nessuna misura ancora registrata.")
+        if st.button("Azzera misure"):
+            PROFILER.reset()
+            st.rerun()
+
+    with st.expander("🧠 Memoria e File Temporanei", expanded=False):
+        used_mb = RESOURCES.used_bytes / 2**20
+        budget_mb = RESOURCES.budget_bytes / 2**20
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Memoria usata", f"{used_mb:.1f} MB", help=f"Budget globale: {budget_mb:.0f} MB")
+        m2.metric("Sessioni", sum(1 for row in RESOURCES.usage() if row["Sessione"] != "condivisa"))
+        m3.metric("Artefatti scartati", RESOURCES.evictions)
+        st.progress(min(used_mb / budget_mb, 1.0) if budget_mb else 1.0)
+        st.dataframe(RESOURCES.usage(), use_container_width=True, hide_index=True)
+        st.caption(f"File temporanei in `{RESOURCES.temp_dir}`; le sessioni inattive da più di "
+                   f"{RESOURCES.session_ttl / 60:.0f} minuti vengono chiuse.")
+
+    with st.expander("🧬 Versioni Struttura per Layout PDF", expanded=st.session_state.proposed_structure is not None):
+        fp = st.session_state.layout_fingerprint
+        if not fp:
+            st.warning("Carica un PDF per riconoscere il layout.")
+        else:
+            st.caption(f"Impronta layout: `{fp[:12]}`")
+            if st.session_state.structure_version and st.session_state.structure_edited:
+                st.warning(f"Layout riconosciuto: {st.session_state.structure_version}, ma la struttura è stata "
+                           "modificata: registrala qui sotto per usarla anche per i prossimi PDF con questo layout.")
+            elif st.session_state.structure_version:
+                st.success(f"Layout riconosciuto: {st.session_state.structure_version}")
+            elif st.session_state.proposed_structure:
+                st.info("Layout non registrato. Allineamento proposto dalle etichette Luogo/Orario del PDF:")
+                comparison = structure_comparison_df(get_structure(), st.session_state.proposed_structure)
+                only_diff = st.checkbox("Mostra solo le righe diverse", value=True)
+                st.dataframe(comparison[comparison["Diverso"]] if only_diff else comparison,
+                             use_container_width=True, height=300, hide_index=True)
+                if st.button("✅ Usa struttura proposta", use_container_width=True):
+                    st.session_state.structure = st.session_state.proposed_structure
+                    st.session_state.structure_edited = True
+                    st.session_state.pdf_processed = False
+                    st.rerun()
+            version_name = st.text_input("Nome versione", value=st.session_state.structure_version or "")
+            if st.button("📌 Registra struttura attuale per questo layout", use_container_width=True, disabled=not version_name.strip()):
+                try:
+                    StructureRegistry().register(fp, version_name.strip(), get_structure())
+                    st.session_state.structure_version = version_name.strip()
+                    st.session_state.proposed_structure = None
+                    st.session_state.structure_edited = False
+                    st.success("Struttura registrata!")
+                except Exception as e:
+                    st.error(f"Impossibile salvare il registro: {e}")
+
+    st.markdown("---")
+    
+    # Structure Table
+    st.markdown("#### Mappatura Indici PDF")
+    st.caption("Definisce quale Luogo/Orario assegnare in base alla riga in cui viene trovato il cognome.")
+    struct_errors = compile_structure(get_structure()).errors
+    if struct_errors:
+        st.warning("Orari non validi nella struttura:\n\n" + "\n".join(f"- {e}" for e in struct_errors))
+    
+    col_ed1, col_ed2 = st.columns([2, 1])
+    with col_ed1:
+        edited_struct_df = st.data_editor(
+            structure_to_df(get_structure()),
+            num_rows="dynamic",
+            use_container_width=True,
+            height=400,
+            column_config={
+                "Indice": st.column_config.NumberColumn("Indice Riga", disabled=False),
+                "Luogo": st.column_config.TextColumn("Luogo Predefinito"),
+                "Orario": st.column_config.TextColumn("Orario Predefinito"),
+            }
+        )
+    
+    with col_ed2:
+        st.markdown("##### 🛠️ Azioni Rapide")
+        ins_idx = st.number_input("Indice di riferimento", min_value=0, value=0)
+        if st.button("➕ Inserisci riga qui", use_container_width=True):
+            curr = get_structure()
+            new_s = {}
+            for k, v in curr.items():
+                if k >= ins_idx: new_s[k+1] = v
+                else: new_s[k] = v
+            new_s[ins_idx] = ("Nuovo Luogo", "", "")
+            st.session_state.structure = new_s
+            st.session_state.structure_edited = True
+            st.rerun()
+            
+        if st.button("➖ Rimuovi riga qui", use_container_width=True):
+            curr = get_structure()
+            if ins_idx in curr:
+                new_s = {}
+                for k, v in curr.items():
+                    if k < ins_idx: new_s[k] = v
+                    elif k > ins_idx: new_s[k-1] = v
+                st.session_state.structure = new_s
+                st.session_state.structure_edited = True
+                st.rerun()
+
+        st.markdown("---")
+        if st.button("💾 APPLICA E SALVA", type="primary", use_container_width=True):
+            st.session_state.structure = df_to_structure(edited_struct_df)
+            st.session_state.structure_edited = True
+            try:
+                with open("structure.json", "wb") as f:
+                    f.write(structure_to_json_bytes(st.session_state.structure))
+                st.success("Struttura salvata localmente!")
+            except: st.error("Impossibile salvare il file.")
+            st.session_state.pdf_processed = False
+            st.rerun()
+            
+        if st.button("🔄 Ripristina Default", use_container_width=True):
+            st.session_state.structure = get_hardcoded_structure()
+            st.session_state.structure_edited = True
+            st.session_state.pdf_processed = False
+            st.rerun()
+
+    st.markdown("---")
+    st.markdown("#### 📂 Import/Export Struttura")
+    c1, c2 = st.columns(2)
+    with c1:
+        up_json = st.file_uploader("Carica structure.json", type="json")
+        if up_json:
+            st.session_state.structure = structure_from_json_bytes(up_json.read())
+            st.session_state.structure_edited = True
+            st.success("JSON caricato!")
+            st.rerun()
+    with c2:
+        st.write("") # Spacer
+        st.write("")
+        st.download_button(
+            "⬇️ Scarica JSON per GitHub",
+            data=structure_to_json_bytes(get_structure()),
+            file_name="structure.json",
+            mime="application/json",
+            use_container_width=True
+        )
+
+
+@st.fragment(key="input_preview")
+def input_preview():
+    """Anteprima del PDF originale in fondo alla pagina; lo zoom riesegue solo questa parte."""
+    st.toggle("Zoom nel browser (pagine vettoriali)", key="vector_preview",
+              help="Le pagine vengono disegnate una volta come SVG: zoom (pulsanti o Ctrl+rotella) "
+                   "e spostamento (trascinando) avvengono nel browser e restano nitidi.")
+    if st.session_state.vector_preview:
+        input_container = st.container()
+        st.caption("**📄 Visualizza PDF Originale (Input)**")
+        fill_svg_preview(input_container, submit_input_preview(), "Anteprima PDF originale")
+        return
+    input_container, input_zoom = pdf_preview_area(
+        title="📄 Visualizza PDF Originale (Input)",
+        zoom_key=f"zoom_{st.session_state.pdf_hash}",
+    )
+    fill_pdf_preview(input_container, submit_input_preview(), input_zoom, "Anteprima PDF originale")
+
+
 # ── App Logic ────────────────────────────────────────────────────────────────
 
 init_session_state()
+SESSION_ID = current_session_id()
+RESOURCES.expire(is_active=is_active_session)
 
 # ── Sidebar ──────────────────────────────────────────────────────────────────
 with st.sidebar:
@@ -440,13 +996,17 @@ with st.sidebar:
                     file_name_display = extracted_filename
             
             if pdf_data:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                    tmp.write(pdf_data)
-                    tmp_path = tmp.name
-                
+                digest = content_hash(pdf_data)
+                remember_previous_version(digest)
+                tmp_path = RESOURCES.temp_pdf(SESSION_ID, pdf_data, digest)
                 st.session_state.temp_pdf_path = tmp_path
-                tables = parse_pdf(tmp_path)
+                try:
+                    tables = parse_pdf_cached(tmp_path, digest)
+                    read_error = "Errore nella lettura del PDF"
+                except SandboxError as e:
+                    tables, read_error = None, str(e)
                 if tables:
+                    apply_layout_registry(tables)
                     extracted = extract_shifts_for_person_hardcoded(
                         tables, surname_input, structure=get_structure()
                     )
@@ -454,24 +1014,37 @@ with st.sidebar:
                         st.session_state.shifts = sort_days(extracted)
                         st.session_state.pdf_processed = True
                         st.session_state.output_filename = get_output_filename(file_name_display, surname_input)
-                        st.session_state.input_pdf_bytes = pdf_data
+                        RESOURCES.drop(SESSION_ID, "raw_pdf_rows")
+                        st.session_state.show_raw_pdf_rows = False
                         st.session_state.surname = surname_input
                         st.session_state.need_regenerate = True
                         st.session_state.last_processed_key = current_proc_key
+                        st.session_state.pdf_hash = digest
+                        st.session_state.pdf_name = file_name_display
                         st.toast(f"Trovati {len(extracted)} turni!", icon="✅")
                     else:
                         st.error(f"Nessun turno trovato per {surname_input}")
                 else:
-                    st.error("Errore nella lettura del PDF")
+                    st.error(read_error)
 
     if st.session_state.pdf_processed:
         st.markdown("---")
         st.caption(f"📁 File: {file_name_display}")
         st.caption(f"👤 Persona: {st.session_state.surname}")
+        if st.session_state.structure_version:
+            st.caption(f"🧬 Struttura: {st.session_state.structure_version}")
+        elif st.session_state.layout_fingerprint:
+            st.warning("Layout PDF non registrato: verifica la struttura in Configurazione.")
 
 # ── Main Area ────────────────────────────────────────────────────────────────
 st.title("📅 Turnizio Bar.S.A.")
 
+if st.session_state.pdf_processed and input_pdf_path() is None:
+    # Sessione scaduta: il file temporaneo è stato rimosso, si rielabora il PDF ancora caricato
+    st.session_state.pdf_processed = False
+    st.session_state.last_processed_key = None
+    st.rerun()
+
 if not st.session_state.pdf_processed:
     st.info("👋 Benvenuto! Carica il PDF dei turni nella barra laterale a sinistra per iniziare.")
     col1, col2 = st.columns(2)
@@ -487,180 +1060,22 @@ if not st.session_state.pdf_processed:
         st.image("https://cdn-icons-png.flaticon.com/512/3394/3394866.png", width=200)
 
 else:
-    tab1, tab2, tab3 = st.tabs(["📄 PDF GENERATO", "✏️ MODIFICA TURNI", "⚙️ CONFIGURAZIONE"])
-
-    # ── TAB 1: PDF GENERATO ──────────────────────────────────────────────────
+    # Solo la scheda aperta viene eseguita; l'anteprima del PDF originale parte
+    # subito in background, così gira insieme alla generazione del PDF personale.
+    submit_input_preview()
+    tab1, tab2, tab3 = st.tabs(TABS, key="main_tab", on_change="rerun")
     with tab1:
-        if st.session_state.need_regenerate or st.session_state.generated_pdf_bytes is None:
-            with st.spinner("Generazione file..."):
-                st.session_state.generated_pdf_bytes = generate_pdf_bytes(
-                    st.session_state.shifts,
-                    st.session_state.output_filename,
-                    st.session_state.surname
-                )
-                st.session_state.need_regenerate = False
-        
-        display_pdf(
-            st.session_state.generated_pdf_bytes,
-            filename=st.session_state.output_filename,
-            show_download=True
-        )
-
-    # ── TAB 2: MODIFICA TURNI ────────────────────────────────────────────────
+        if tab1.open:
+            generated_tab()
     with tab2:
-        st.subheader("📋 Gestione Turni Estratti")
-        
-        # Add new shift form (Compact)
-        with st.expander("➕ Aggiungi un nuovo turno manualmente", expanded=False):
-            with st.form("new_shift_form", clear_on_submit=True):
-                c1, c2, c3 = st.columns([1, 1, 1])
-                with c1:
-                    d_day = st.selectbox("Giorno", ["lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica"])
-                    d_num = st.text_input("Data (Giorno)", placeholder="Es: 15")
-                with c2:
-                    d_loc = st.text_input("Luogo", placeholder="Es: Giardini del Castello")
-                    d_time = st.text_input("Orario", placeholder="Es: 08:00-14:00")
-                with c3:
-                    st.write("") # Spacer
-                    st.write("")
-                    d_pul = st.checkbox("Pulizia Bagni")
-                    add_btn = st.form_submit_button("AGGIUNGI ORA", use_container_width=True)
-                
-                if add_btn:
-                    if d_loc:
-                        new_s = (normalize_day_name(d_day), d_num, d_loc, d_time, "Sì" if d_pul else "No")
-                        st.session_state.shifts.append(new_s)
-                        st.session_state.shifts = sort_days(st.session_state.shifts)
-                        st.session_state.need_regenerate = True
-                        st.rerun()
-        
-        st.markdown("#### Tabella Modifica Rapida")
-        st.caption("Puoi modificare i testi direttamente nella tabella qui sotto. Ricordati di cliccare Salva.")
-        
-        # Shift data editor (Compact & Modern)
-        edited_shifts_df = st.data_editor(
-            shifts_to_df(st.session_state.shifts),
-            num_rows="dynamic",
-            use_container_width=True,
-            column_config={
-                "Giorno": st.column_config.SelectboxColumn("Giorno", options=["lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica"], required=True),
-                "Data": st.column_config.TextColumn("Data", width="small"),
-                "Luogo": st.column_config.TextColumn("Luogo", width="large"),
-                "Orario": st.column_config.TextColumn("Orario", width="medium"),
-                "Pulizia Bagni": st.column_config.SelectboxColumn("Pulizia", options=["", "No", "Sì"], width="small"),
-            }
-        )
-        
-        c_save, c_empty = st.columns([1, 2])
-        with c_save:
-            if st.button("💾 SALVA MODIFICHE E RIGENERA PDF", use_container_width=True, type="primary"):
-                st.session_state.shifts = df_to_shifts(edited_shifts_df)
-                st.session_state.need_regenerate = True
-                st.success("Modifiche salvate con successo!")
-                st.rerun()
-
-    # ── TAB 3: CONFIGURAZIONE ────────────────────────────────────────────────
+        if tab2.open:
+            editor_tab()
     with tab3:
-        st.subheader("⚙️ Configurazione Tecnica")
-        
-        with st.expander("🔍 Strumenti Debug PDF", expanded=False):
-            st.write("Visualizza esattamente come il programma legge le righe del PDF per correggere la struttura.")
-            if hasattr(st.session_state, "temp_pdf_path") and os.path.exists(st.session_state.temp_pdf_path):
-                if st.button("Analizza Righe PDF"):
-                    st.session_state.raw_pdf_rows = get_raw_pdf_rows(st.session_state.temp_pdf_path)
-                
-                if hasattr(st.session_state, "raw_pdf_rows"):
-                    st.dataframe(st.session_state.raw_pdf_rows, use_container_width=True, height=300)
-            else:
-                st.warning("Carica un PDF per attivare il debug.")
-
-        st.markdown("---")
-        
-        # Structure Table
-        st.markdown("#### Mappatura Indici PDF")
-        st.caption("Definisce quale Luogo/Orario assegnare in base alla riga in cui viene trovato il cognome.")
-        
-        col_ed1, col_ed2 = st.columns([2, 1])
-        with col_ed1:
-            edited_struct_df = st.data_editor(
-                structure_to_df(get_structure()),
-                num_rows="dynamic",
-                use_container_width=True,
-                height=400,
-                column_config={
-                    "Indice": st.column_config.NumberColumn("Indice Riga", disabled=False),
-                    "Luogo": st.column_config.TextColumn("Luogo Predefinito"),
-                    "Orario": st.column_config.TextColumn("Orario Predefinito"),
-                }
-            )
-        
-        with col_ed2:
-            st.markdown("##### 🛠️ Azioni Rapide")
-            ins_idx = st.number_input("Indice di riferimento", min_value=0, value=0)
-            if st.button("➕ Inserisci riga qui", use_container_width=True):
-                curr = get_structure()
-                new_s = {}
-                for k, v in curr.items():
-                    if k >= ins_idx: new_s[k+1] = v
-                    else: new_s[k] = v
-                new_s[ins_idx] = ("Nuovo Luogo", "", "")
-                st.session_state.structure = new_s
-                st.rerun()
-                
-            if st.button("➖ Rimuovi riga qui", use_container_width=True):
-                curr = get_structure()
-                if ins_idx in curr:
-                    new_s = {}
-                    for k, v in curr.items():
-                        if k < ins_idx: new_s[k] = v
-                        elif k > ins_idx: new_s[k-1] = v
-                    st.session_state.structure = new_s
-                    st.rerun()
+        if tab3.open:
+            configuration_tab()
 
-            st.markdown("---")
-            if st.button("💾 APPLICA E SALVA", type="primary", use_container_width=True):
-                st.session_state.structure = df_to_structure(edited_struct_df)
-                try:
-                    with open("structure.json", "wb") as f:
-                        f.write(structure_to_json_bytes(st.session_state.structure))
-                    st.success("Struttura salvata localmente!")
-                except: st.error("Impossibile salvare il file.")
-                st.session_state.pdf_processed = False
-                st.rerun()
-                
-            if st.button("🔄 Ripristina Default", use_container_width=True):
-                st.session_state.structure = get_hardcoded_structure()
-                st.session_state.pdf_processed = False
-                st.rerun()
-
-        st.markdown("---")
-        st.markdown("#### 📂 Import/Export Struttura")
-        c1, c2 = st.columns(2)
-        with c1:
-            up_json = st.file_uploader("Carica structure.json", type="json")
-            if up_json:
-                st.session_state.structure = structure_from_json_bytes(up_json.read())
-                st.success("JSON caricato!")
-                st.rerun()
-        with c2:
-            st.write("") # Spacer
-            st.write("")
-            st.download_button(
-                "⬇️ Scarica JSON per GitHub",
-                data=structure_to_json_bytes(get_structure()),
-                file_name="structure.json",
-                mime="application/json",
-                use_container_width=True
-            )
-
-    # ── PDF Input Preview (Bottom) ───────────────────────────────────────────
     st.markdown("---")
-    display_pdf(
-        st.session_state.input_pdf_bytes,
-        title="📄 Visualizza PDF Originale (Input)",
-        highlight_text=st.session_state.surname,
-        use_zoom=True
-    )
+    input_preview()
 
 # ── Footer ────────────────────────────────────────────────────────────────────
 st.markdown(
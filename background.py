@@ -0,0 +1,80 @@
+"""
+Esecutore condiviso per il lavoro pesante dell'app.
+
+Lettura del PDF, generazione del PDF personale e rasterizzazione delle
+anteprime vengono eseguite in un pool di thread comune a tutte le
+sessioni. Ogni lavoro ha una chiave: finché è in corso, chi lo chiede di
+nuovo (ad esempio un rerun di Streamlit) riceve lo stesso Job invece di
+ripartire. La funzione riceve progress(fatti, totale), che lo script
+legge per mostrare l'avanzamento per pagina mentre aspetta.
+
+Il numero di thread si imposta con TURNIZIO_WORKERS (default 4).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 4
+
+
+class Job:
+    def __init__(self, key):
+        self.key = key
+        self.done_steps = 0
+        self.total = 0
+        self.future = None
+
+    def progress(self, done, total):
+        """Chiamata dal worker: assegnazioni semplici, lette senza lock dallo script."""
+        self.done_steps = done
+        self.total = total
+
+    @property
+    def fraction(self):
+        return min(self.done_steps / self.total, 1.0) if self.total else 0.0
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class BackgroundExecutor:
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="turnizio")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        Avvia fn(*args, progress=..., **kwargs), oppure ritorna il Job
+        con la stessa chiave se è ancora in corso.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            job = self._jobs[key] = Job(key)
+            job.future = self._pool.submit(fn, *args, progress=job.progress, **kwargs)
+        job.future.add_done_callback(lambda _: self._forget(job))
+        return job
+
+    def _forget(self, job):
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def running(self):
+        with self._lock:
+            return len(self._jobs)
+
+
+def _env_workers():
+    try:
+        return max(1, int(os.environ.get("TURNIZIO_WORKERS", DEFAULT_WORKERS)))
+    except ValueError:
+        return DEFAULT_WORKERS
+
+
+BACKGROUND = BackgroundExecutor(_env_workers())
@@ -0,0 +1,351 @@
+"""
+Elaborazione non interattiva di uno o più PDF dei turni.
+
+Ogni PDF viene letto una sola volta; le tabelle estratte vengono poi
+riusate per tutti i cognomi richiesti. Con più file e workers > 1 i PDF
+vengono elaborati in processi separati.
+"""
+import csv
+import glob
+import html
+import json
+import logging
+import os
+import re
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import logs
+from diff import diff_rosters
+from ics import PERIOD_RE, FeedStore, roster_period, shift_events
+from layout import find_day_columns
+from main import (
+    get_hardcoded_structure,
+    get_output_filename,
+    resolve_structure,
+    read_pdf_tables,
+    extract_days_from_header,
+    extract_shifts_for_person_hardcoded,
+    sort_days,
+    write_booklet,
+    write_shifts_to_pdf,
+)
+from profiling import PROFILER
+from shifts import TIME_RANGE_RE
+from timetable_image import DEFAULT_WIDTH, IMAGE_FORMATS, render_shifts_image
+
+log = logs.get_logger("batch")
+
+FORMATS = ("pdf", "json", "csv", "booklet") + IMAGE_FORMATS
+ALL_PEOPLE = "all"
+BOOKLET_NAME = "personale"  # "Turni personale dal ... al ....pdf"
+ROSTER_GLOB = "servizio custodia*.pdf"
+INDEX_NAME = "index.json"
+FEEDS_DIR = "ics"
+
+
+@dataclass
+class RosterResult:
+    path: str
+    written: dict = field(default_factory=dict)   # persona -> file scritto
+    missing: list = field(default_factory=list)
+    removed: list = field(default_factory=list)   # persone senza più turni rispetto a previous_tables
+    error: str = None
+    profile: dict = field(default_factory=dict)
+    period: tuple = None                          # (primo giorno, ultimo giorno) per i calendari
+    events: dict = field(default_factory=dict)    # persona -> eventi .ics
+    tables: list = None                           # tabelle lette, per confrontare la prossima revisione
+    diff: object = None                           # diff.RosterDiff rispetto a previous_tables
+
+    @property
+    def ok(self):
+        return self.error is None and not self.missing
+
+
+def expand_inputs(patterns):
+    """File, cartelle (cerca "servizio custodia*.pdf") e pattern glob -> lista di percorsi senza duplicati."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, ROSTER_GLOB)))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def day_cells(tables):
+    """Testi delle celle nelle colonne dei giorni (righe dati), in ordine."""
+    cells = []
+    for table in tables:
+        if not table:
+            continue
+        header_row_idx, day_columns = find_day_columns(table)
+        for row in table[header_row_idx + 1:] if day_columns else ():
+            for col_idx in day_columns:
+                if row and col_idx < len(row) and row[col_idx]:
+                    cells.append(str(row[col_idx]))
+    return cells
+
+
+def list_people(tables):
+    """Nomi presenti nelle colonne dei giorni (una persona per riga di cella), senza orari."""
+    people = {}
+    for cell in day_cells(tables):
+        for line in cell.split("\n"):
+            name = " ".join(TIME_RANGE_RE.sub(" ", line).split()).strip(" -/,.")
+            if name and re.search(r"[^\W\d_]", name):
+                people.setdefault(name.lower(), name)
+    return sorted(people.values(), key=str.lower)
+
+
+def output_path(input_path, surname, output_dir, fmt):
+    """Percorso del file di una persona per il PDF dei turni input_path nel formato fmt."""
+    base = os.path.splitext(get_output_filename(os.path.basename(input_path), surname))[0]
+    return os.path.join(output_dir, f"{base}.{fmt}")
+
+
+def write_output(shifts, input_path, surname, output_dir, fmt, image_width=DEFAULT_WIDTH):
+    """Scrive i turni di una persona nel formato richiesto e ritorna il percorso."""
+    if fmt == "pdf":
+        return write_shifts_to_pdf(shifts, input_path, surname, output_dir=output_dir)
+
+    shifts = sort_days(shifts)
+    path = output_path(input_path, surname, output_dir, fmt)
+    if fmt in IMAGE_FORMATS:
+        with open(path, "wb") as f:
+            f.write(render_shifts_image(shifts, surname, image_width, fmt))
+        return path
+    records = shifts.to_records()
+    if fmt == "json":
+        payload = {"persona": surname, "file": os.path.basename(input_path), "turni": records}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["persona", *records[0].keys()] if records else ["persona"])
+            writer.writeheader()
+            for record in records:
+                writer.writerow({"persona": surname, **record})
+    return path
+
+
+def process_roster(path, surnames, output_dir, fmt="pdf", structure_path=None, feeds=False, per_page=1,
+                   previous_tables=None, image_width=DEFAULT_WIDTH):
+    """
+    Legge un PDF una volta ed estrae/scrive i turni di tutti i cognomi richiesti.
+    Con fmt="booklet" tutte le persone finiscono in un unico libretto (per_page persone per pagina),
+    con fmt "png"/"webp" ognuna ha un'immagine larga image_width pixel.
+    Con feeds=True prepara anche gli eventi dei calendari, scritti poi da update_feeds().
+    Con previous_tables (tabelle della revisione precedente dello stesso periodo) vengono
+    rigenerate solo le persone con turni cambiati; il libretto viene comunque rifatto intero.
+    Chi non ha più nessun turno finisce in result.removed: il suo file viene
+    cancellato e il suo calendario svuotato per il periodo.
+    """
+    result = RosterResult(path)
+    before = PROFILER.snapshot()
+    try:
+        tables = read_pdf_tables(path)
+        if not tables:
+            result.error = "impossibile leggere le tabelle dal PDF"
+            return result
+        result.tables = tables
+        if feeds:
+            result.period = roster_period(path, header_days=extract_days_from_header(tables))
+            if result.period is None and roster_period(path) is None:
+                logs.event(log, logging.WARNING, "periodo DAL/AL non trovato nel nome, calendari non aggiornati", file=path)
+            elif result.period is None:
+                logs.event(log, logging.WARNING, "i giorni dell'header non corrispondono al periodo del nome, "
+                           "calendari non aggiornati", file=path)
+
+        if structure_path:
+            structure = get_hardcoded_structure(structure_path)
+        else:
+            structure, version, _ = resolve_structure(tables)
+            if version:
+                logs.event(log, logging.INFO, "struttura riconosciuta", file=path, version=version)
+
+        all_people = any(s.lower() == ALL_PEOPLE for s in surnames)
+        people = list_people(tables) if all_people else surnames
+        cells_text = "\n".join(day_cells(tables)).lower()
+        if previous_tables is not None:
+            result.diff = diff_rosters(previous_tables, tables, structure)
+            logs.event(log, logging.INFO, "confronto con la revisione precedente", file=path,
+                       comparable=result.diff.comparable, changed=result.diff.people)
+            if fmt != "booklet":
+                people = [p for p in people if result.diff.affects(p)]
+            # persone cambiate che non compaiono più nel PDF: i loro turni sono stati tutti tolti
+            changed = result.diff.people if all_people else [s for s in surnames if result.diff.affects(s)]
+            result.removed = [person for person in changed if person.lower() not in cells_text]
+            for person in result.removed:
+                remove_output(path, person, output_dir, fmt)
+                if result.period:
+                    result.events[person] = []
+            if result.removed:
+                logs.event(log, logging.INFO, "persone senza più turni", file=path, people=result.removed)
+        booklet = []
+
+        for surname in people:
+            if surname in result.removed:
+                continue
+            if surname.lower() not in cells_text:
+                result.missing.append(surname)
+                logs.event(log, logging.WARNING, "cognome non trovato", file=path, person=surname)
+                continue
+            shifts = extract_shifts_for_person_hardcoded(tables, surname, structure=structure)
+            if not shifts:
+                result.missing.append(surname)
+                continue
+            if fmt == "booklet":
+                booklet.append((surname, shifts))
+            else:
+                result.written[surname] = write_output(shifts, path, surname, output_dir, fmt, image_width)
+            if result.period:
+                result.events[surname] = shift_events(sort_days(shifts), surname, result.period)
+
+        if booklet:
+            booklet_path = os.path.join(output_dir, get_output_filename(os.path.basename(path), BOOKLET_NAME))
+            write_booklet(booklet, booklet_path, per_page)
+            result.written = {surname: booklet_path for surname, _ in booklet}
+    except Exception as e:
+        logs.event(log, logging.ERROR, "errore elaborazione", file=path, error=str(e))
+        result.error = str(e)
+    finally:
+        result.profile = PROFILER.since(before)
+    return result
+
+
+def remove_output(input_path, surname, output_dir, fmt):
+    """Cancella il file di una persona rimasta senza turni (il libretto viene riscritto intero)."""
+    if fmt != "booklet":
+        remove_file(output_path(input_path, surname, output_dir, fmt))
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    logs.event(log, logging.INFO, "file rimosso", path=path)
+
+
+def run_batch(paths, surnames, output_dir, fmt="pdf", structure_path=None, workers=1, feeds=False, per_page=1,
+              previous_tables=None, image_width=DEFAULT_WIDTH):
+    """
+    Elabora tutti i PDF; ritorna la lista di RosterResult nello stesso ordine.
+    Con feeds=True aggiorna anche i calendari in <output_dir>/ics.
+    previous_tables vale per un solo PDF: vedi process_roster().
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if workers <= 1 or len(paths) <= 1:
+        # le misure sono già nel PROFILER di questo processo
+        results = [
+            process_roster(p, surnames, output_dir, fmt, structure_path, feeds, per_page, previous_tables, image_width)
+            for p in paths
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(process_roster, p, surnames, output_dir, fmt, structure_path, feeds, per_page,
+                            previous_tables, image_width)
+                for p in paths
+            ]
+            results = [f.result() for f in futures]
+        for result in results:
+            PROFILER.merge(result.profile)
+    for result in results:
+        if result.written or result.removed:
+            update_index(output_dir, result)
+    if feeds:
+        update_feeds(output_dir, results)
+    return results
+
+
+def update_feeds(output_dir, results):
+    """
+    Aggiorna i calendari .ics in <output_dir>/ics con gli eventi dei risultati
+    (in ordine, così un PDF più recente prevale). Ritorna le persone il cui feed è stato riscritto.
+    """
+    store = FeedStore(os.path.join(output_dir, FEEDS_DIR))
+    rewritten = []
+    for result in results:
+        if not result.period:
+            continue
+        for person, events in result.events.items():
+            if store.update(person, result.period, events):
+                rewritten.append(person)
+    store.save()
+    logs.event(log, logging.INFO, "calendari aggiornati", rewritten=len(rewritten),
+               unchanged=sum(len(r.events) for r in results) - len(rewritten))
+    return rewritten
+
+
+def index_key(roster_path):
+    """
+    Voce dell'indice per un PDF dei turni: il periodo "dal gg-mm al gg-mm" del
+    nome, così una revisione salvata con un altro nome aggiorna la stessa voce.
+    """
+    name = os.path.basename(roster_path)
+    match = PERIOD_RE.search(name)
+    return " ".join(match.group(0).lower().split()) if match else name
+
+
+def update_index(output_dir, result):
+    """
+    Aggiorna l'indice pubblicato (index.json + index.html) nella cartella di uscita
+    con i file generati per un PDF dei turni: nella voce del suo periodo vengono
+    aggiornate le persone elaborate e tolte quelle rimaste senza turni; le altre restano.
+    """
+    index_path = os.path.join(output_dir, INDEX_NAME)
+    index = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            logs.event(log, logging.WARNING, "indice illeggibile, verrà ricreato", path=index_path, error=str(e))
+
+    roster = index_key(result.path)
+    entry = index.pop(os.path.basename(result.path), {})  # voce di un indice precedente, per nome del file
+    entry.update(index.get(roster, {}))
+    entry.update({person: os.path.basename(path) for person, path in result.written.items()})
+    written = {os.path.basename(path) for path in result.written.values()}
+    for person in result.removed:
+        name = entry.pop(person, None)
+        if name and name not in written:  # anche il file di una revisione con un altro nome
+            remove_file(os.path.join(output_dir, name))
+    index.pop(roster, None)
+    if entry:
+        index[roster] = dict(sorted(entry.items(), key=lambda kv: kv[0].lower()))
+
+    write_atomic(index_path, json.dumps(index, ensure_ascii=False, indent=2))
+    write_atomic(os.path.join(output_dir, "index.html"), render_index_html(index))
+    return index
+
+
+def render_index_html(index):
+    sections = []
+    for roster in sorted(index, reverse=True):
+        items = "".join(
+            f'<li><a href="{html.escape(urllib.parse.quote(name))}">{html.escape(person)}</a></li>'
+            for person, name in index[roster].items()
+        )
+        sections.append(f"<h2>{html.escape(roster)}</h2><ul>{items}</ul>")
+    return (
+        '<!DOCTYPE html><html lang="it"><head><meta charset="utf-8">'
+        "<title>Turni Bar.S.A.</title></head><body><h1>Turni Bar.S.A.</h1>"
+        + "".join(sections) + "</body></html>"
+    )
+
+
+def write_atomic(path, text):
+    """Scrive text in un file temporaneo e lo rinomina; i fine riga restano quelli del testo (CRLF dei .ics)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    os.replace(tmp, path)
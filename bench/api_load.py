@@ -0,0 +1,129 @@
+"""
+Test di carico dell'API HTTP (api.py).
+
+Avvia il server nello stesso processo su una cartella di PDF (oppure usa
+--url per un server già in esecuzione) e lo interroga da più thread client
+con connessioni persistenti per la durata indicata, alternando gli endpoint
+people/shifts/pdf sulle persone del PDF più recente. Riporta richieste al
+secondo e latenze p50/p95/p99 per endpoint.
+
+Uso:
+    python bench/api_load.py /percorso/pdf --clients 16 --duration 10
+    python bench/api_load.py --url http://127.0.0.1:8502 --clients 32
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def client(base, paths, deadline, latencies, errors, lock):
+    url = urllib.parse.urlsplit(base)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    local = {}
+    i = 0
+    while time.perf_counter() < deadline:
+        kind, path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+            ok = False
+        elapsed = time.perf_counter() - started
+        if ok:
+            local.setdefault(kind, []).append(elapsed)
+        else:
+            with lock:
+                errors[kind] = errors.get(kind, 0) + 1
+    conn.close()
+    with lock:
+        for kind, values in local.items():
+            latencies.setdefault(kind, []).extend(values)
+
+
+def fetch_json(base, path):
+    url = urllib.parse.urlsplit(base)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    conn.request("GET", path)
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    conn.close()
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test di carico dell'API dei turni.")
+    parser.add_argument("directory", nargs="?", help="cartella con i PDF (avvia il server in-process)")
+    parser.add_argument("--url", help="server già avviato, es. http://127.0.0.1:8502")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="secondi di carico")
+    parser.add_argument("--workers", type=int, default=8, help="thread del server in-process")
+    args = parser.parse_args(argv)
+    if not args.directory and not args.url:
+        parser.error("indicare una cartella di PDF oppure --url")
+
+    server = None
+    base = args.url
+    if not base:
+        import api
+        server = api.make_server(args.directory, port=0, workers=args.workers)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    people = fetch_json(base, "/rosters/latest/people")  # la prima richiesta legge il PDF
+    roster = people["id"]
+    paths = [("people", f"/rosters/{roster}/people")]
+    for person in people["persone"]:
+        quoted = urllib.parse.quote(person)
+        paths += [("shifts", f"/rosters/{roster}/shifts?person={quoted}"),
+                  ("pdf", f"/rosters/{roster}/pdf?person={quoted}")]
+
+    latencies, errors, lock = {}, {}, threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=client, args=(base, paths[i % len(paths):] + paths[:i % len(paths)],
+                                              deadline, latencies, errors, lock))
+        for i in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{total} richieste in {elapsed:.1f} s con {args.clients} client: {total / elapsed:.0f} req/s")
+    print(f"{'endpoint':<8} {'richieste':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errori':>7}")
+    for kind in sorted(set(latencies) | set(errors)):
+        values = latencies.get(kind, [])
+        print(f"{kind:<8} {len(values):>9} {statistics.median(values) * 1000 if values else 0:>8.2f} "
+              f"{percentile(values, 95) * 1000:>8.2f} {percentile(values, 99) * 1000:>8.2f} {errors.get(kind, 0):>7}")
+    if server:
+        server.shutdown()
+        server.server_close()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Test di carico dell'app Streamlit con più sessioni contemporanee.
+
+Ogni sessione è un AppTest headless in un processo a sé: AppTest sostituisce
+il Runtime globale di Streamlit e non può girare in più thread dello stesso
+processo. Le cache in memoria quindi non sono condivise tra le sessioni e ogni
+sessione legge il PDF da zero, il caso peggiore. Ogni sessione ripete: apertura della pagina,
+inserimento del cognome, caricamento del PDF (che avvia la generazione),
+passaggio alla scheda di modifica, aggiunta di un turno, spostamento dello zoom. Riporta le latenze p50/p95 per interazione, il
+tempo CPU totale delle sessioni e il picco di memoria (per sessione e sommato).
+
+AppTest riesegue sempre l'intero script, anche per i widget dentro un
+fragment: le latenze misurate sono quelle di un rerun completo, con le sole
+schede aperte eseguite.
+
+Senza --roster viene generato un PDF dei turni con la struttura predefinita.
+
+Uso:
+    python bench/app_load.py --sessions 8 --iterations 3
+    python bench/app_load.py --roster "servizio custodia DAL 06-10 AL 12-10.pdf" --surname Rossi --max-p95 5000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STEPS = ("apertura", "cognome", "genera", "scheda", "modifica", "zoom")
+NAMES = [
+    "Rossi Mario", "Bianchi Luca", "Verdi Anna", "Neri Paolo", "Gallo Sara", "Russo Marco",
+    "Costa Elena", "Greco Luigi", "Conti Rosa", "Marino Ugo", "Bruno Ida", "Ferrari Gino",
+]
+DAYS = ["lunedì 6", "martedì 7", "mercoledì 8", "giovedì 9", "venerdì 10", "sabato 11", "domenica 12"]
+
+
+def make_roster(path, seed=1):
+    """PDF dei turni di una settimana sulla struttura predefinita, ogni persona un turno al giorno."""
+    from fpdf import FPDF
+    from main import get_hardcoded_structure
+
+    structure = get_hardcoded_structure()
+    rng = random.Random(seed)
+    assign = {}
+    for day in range(len(DAYS)):
+        rows = sorted(structure)
+        rng.shuffle(rows)
+        for row, name in zip(rows, NAMES):
+            assign[row, day] = name
+
+    def latin1(text):
+        return text.encode("latin-1", "replace").decode("latin-1")
+
+    pdf = FPDF(orientation="P", unit="mm", format="A3")
+    pdf.add_page()
+    pdf.set_font("Arial", size=5)
+    pdf.cell(0, 5, "SERVIZIO CUSTODIA DAL 06/10/2025 AL 12/10/2025", ln=True)
+    widths = [50, 20] + [30] * len(DAYS)
+    for width, text in zip(widths, ["Luogo", "Orario"] + DAYS):
+        pdf.cell(width, 4, latin1(text), border=1)
+    pdf.ln()
+    for row in range(max(structure) + 1):
+        location, time_slot, _ = structure.get(row, ("", "", ""))
+        pdf.cell(widths[0], 3.4, latin1(location)[:35], border=1)
+        pdf.cell(widths[1], 3.4, time_slot, border=1)
+        for day in range(len(DAYS)):
+            pdf.cell(widths[2 + day], 3.4, assign.get((row, day), ""), border=1)
+        pdf.ln()
+    pdf.output(path)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def by_label(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"elemento non trovato: {label}")
+
+
+def session(roster_name, roster_bytes, surname, iterations, timeout):
+    """Esegue una sessione; ritorna ({interazione: [secondi]}, errori, picco RSS in KB)."""
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(ROOT)  # app.py legge structure.json e il registro dei layout dalla cartella corrente
+    local = {step: [] for step in STEPS}
+    failures = []
+
+    def timed(step, action):
+        started = time.perf_counter()
+        at = action()
+        local[step].append(time.perf_counter() - started)
+        if at.exception:
+            failures.append(f"{step}: {at.exception[0].message}")
+        return at
+
+    for _ in range(iterations):
+        try:
+            at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+            timed("apertura", at.run)
+            timed("cognome", by_label(at.text_input, "Cognome da cercare").input(surname).run)
+            # come nel browser, il caricamento del file avvia da solo l'elaborazione
+            timed("genera", at.file_uploader[0].set_value((roster_name, roster_bytes, "application/pdf")).run)
+            if not at.session_state["pdf_processed"]:
+                failures.append(f"genera: nessun turno per {surname}")
+                continue
+            at.session_state["main_tab"] = "✏️ MODIFICA TURNI"
+            timed("scheda", at.run)
+            by_label(at.text_input, "Luogo").input("Sala prova carico")
+            by_label(at.text_input, "Orario").input("09:00-12:00")
+            timed("modifica", by_label(at.button, "AGGIUNGI ORA").click().run)
+            timed("zoom", by_label(at.slider, "Livello Zoom (%)").set_value(150).run)
+        except Exception as e:  # timeout dell'AppTest o elemento mancante
+            failures.append(f"{type(e).__name__}: {e}")
+
+    return local, failures, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test di carico dell'app Streamlit con sessioni headless.")
+    parser.add_argument("--sessions", type=int, default=8, help="sessioni contemporanee (default: 8)")
+    parser.add_argument("--iterations", type=int, default=3, help="ripetizioni per sessione (default: 3)")
+    parser.add_argument("--roster", help="PDF dei turni da caricare (default: generato)")
+    parser.add_argument("--surname", default="Bianchi", help="cognome da cercare (default: Bianchi)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="secondi massimi per interazione")
+    parser.add_argument("--max-p95", type=float, help="esce con 1 se un'interazione supera questo p95 in ms")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.roster:
+            roster_name = os.path.basename(args.roster)
+            with open(args.roster, "rb") as f:
+                roster_bytes = f.read()
+        else:
+            roster_name = "servizio custodia DAL 06-10 AL 12-10.pdf"
+            make_roster(os.path.join(tmp, roster_name))
+            with open(os.path.join(tmp, roster_name), "rb") as f:
+                roster_bytes = f.read()
+
+    latencies, errors, peaks = {}, [], []
+    cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.sessions, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(session, roster_name, roster_bytes, args.surname, args.iterations, args.timeout)
+            for _ in range(args.sessions)
+        ]
+        for future in futures:
+            local, failures, peak_kb = future.result()
+            for step, values in local.items():
+                latencies.setdefault(step, []).extend(values)
+            errors.extend(failures)
+            peaks.append(peak_kb / 1024)  # KB su Linux
+    elapsed = time.perf_counter() - started
+    cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+    print(f"{args.sessions} sessioni x {args.iterations} ripetizioni in {elapsed:.1f} s; "
+          f"CPU {cpu:.1f} s ({cpu / elapsed:.1f} core in media)")
+    print(f"picco memoria per sessione {max(peaks):.0f} MB, somma dei picchi {sum(peaks):.0f} MB")
+    print(f"{'interazione':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    over = []
+    for step in STEPS:
+        values = latencies.get(step, [])
+        p95 = percentile(values, 95) * 1000
+        print(f"{step:<12} {len(values):>5} {statistics.median(values) * 1000 if values else 0:>9.1f} "
+              f"{p95:>9.1f} {max(values, default=0) * 1000:>9.1f}")
+        if args.max_p95 and p95 > args.max_p95:
+            over.append(step)
+    for error in errors[:10]:
+        print(f"errore: {error}")
+    if len(errors) > 10:
+        print(f"... altri {len(errors) - 10} errori")
+    if over:
+        print(f"p95 oltre {args.max_p95:.0f} ms: {', '.join(over)}")
+    return 1 if errors or over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Benchmark del tempo di import con budget, basato su `python -X importtime`.
+
+Misura due obiettivi in processi nuovi (cold start dell'interprete):
+  - cli: `import main`
+  - app: gli import di primo livello di app.py (senza eseguire lo script Streamlit)
+
+Per ciascuno riporta la mediana su --repeat esecuzioni, i moduli più
+costosi e verifica che le dipendenze pesanti non vengano caricate
+all'avvio. Esce con codice 1 se un budget viene superato.
+
+Uso:
+    python bench/import_time.py
+    python bench/import_time.py --budget-cli-ms 80 --budget-app-ms 1500 --repeat 7
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dipendenze che devono essere caricate solo al primo uso
+HEAVY_MODULES = ("pdfplumber", "fpdf", "fitz", "pymupdf", "PIL", "pandas", "numpy", "requests", "pdf2image")
+
+
+def app_import_code():
+    """Gli import di primo livello di app.py, come codice eseguibile."""
+    with open(os.path.join(ROOT, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    nodes = [n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(n) for n in nodes)
+
+
+def run_importtime(code):
+    """Esegue code con -X importtime; ritorna {modulo: cumulativo_us} per gli import di primo livello."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    top_level = {}
+    all_modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        all_modules[module] = int(self_us)
+        if name.startswith(" ") and not name.startswith("  "):
+            top_level[module] = int(cumulative_us)
+    return top_level, all_modules
+
+
+def measure(code, repeat):
+    baseline, _ = run_importtime("pass")
+    totals = []
+    modules = {}
+    for _ in range(repeat):
+        top_level, modules = run_importtime(code)
+        totals.append(sum(us for name, us in top_level.items() if name not in baseline) / 1000)
+    return statistics.median(totals), modules
+
+
+def report(name, code, budget_ms, repeat, top):
+    total_ms, modules = measure(code, repeat)
+    heavy = sorted(m for m in modules if m.split(".")[0] in HEAVY_MODULES and "." not in m)
+    status = "OK" if total_ms <= budget_ms and not heavy else "FUORI BUDGET"
+    print(f"[{name}] {total_ms:.1f} ms (budget {budget_ms:.0f} ms) - {status}")
+    for module, us in sorted(modules.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"    {us / 1000:8.2f} ms  {module}")
+    if heavy:
+        print(f"    dipendenze pesanti importate all'avvio: {', '.join(heavy)}")
+    return status == "OK"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del tempo di import con budget.")
+    parser.add_argument("--budget-cli-ms", type=float, default=100.0)
+    parser.add_argument("--budget-app-ms", type=float, default=2000.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="moduli più lenti da mostrare (tempo proprio)")
+    args = parser.parse_args(argv)
+
+    ok = report("cli", "import main", args.budget_cli_ms, args.repeat, args.top)
+    ok = report("app", app_import_code(), args.budget_app_ms, args.repeat, args.top) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Controllo del PDF dei turni prima della pubblicazione.
+
+Ogni turno con orario diventa una mappa di occupazione della settimana a
+fasce di 15 minuti: 8 giorni da 96 fasce, l'ottavo per i turni notturni
+della domenica che finiscono dopo la mezzanotte. Sommando le mappe per
+persona si ottiene una matrice persone × fasce; da questa vengono, con
+operazioni sull'intera matrice:
+
+    errori   doppie assegnazioni (una fascia occupata da due turni della stessa persona)
+             giornate con più ore di MAX_DAY_HOURS
+    avvisi   righe di lavoro della struttura senza nessuno in un giorno dell'header
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from analytics import Occurrences
+from shifts import DAY_BY_NAME, DAY_DISPLAY_NAMES, MINUTES_PER_DAY, NO_TIME, format_time_range
+from structure import ShiftKind, compile_structure
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = MINUTES_PER_DAY // SLOT_MINUTES
+WEEK_DAYS = 8  # la settimana più il giorno dopo per i turni notturni della domenica
+MAX_DAY_HOURS = 13  # 11 ore di riposo consecutive ogni 24
+
+ERROR = "errore"
+WARNING = "avviso"
+
+
+@dataclass
+class Issue:
+    level: str
+    kind: str
+    day: str
+    detail: str
+    person: str = ""
+
+
+@dataclass
+class CheckResult:
+    issues: list = field(default_factory=list)
+
+    @property
+    def errors(self):
+        return [i for i in self.issues if i.level == ERROR]
+
+    @property
+    def warnings(self):
+        return [i for i in self.issues if i.level == WARNING]
+
+    def rows(self):
+        """Righe per la visualizzazione, errori prima degli avvisi."""
+        return [
+            {"Livello": i.level, "Tipo": i.kind, "Giorno": i.day, "Persona": i.person, "Dettaglio": i.detail}
+            for i in sorted(self.issues, key=lambda i: i.level != ERROR)
+        ]
+
+    def summary(self):
+        return f"{len(self.errors)} errori, {len(self.warnings)} avvisi"
+
+
+def _day_labels(header_days):
+    """Etichetta "lunedì 6" per giorno della settimana; l'ottavo giorno è il lunedì seguente."""
+    labels = {int(DAY_BY_NAME[name]): f"{DAY_DISPLAY_NAMES[DAY_BY_NAME[name]]} {number}" for name, number in header_days}
+    labels.setdefault(7, "lunedì seguente")
+    return labels
+
+
+def shift_bitmaps(weekday, start, end):
+    """Matrice booleana turni × fasce della settimana; i minuti parziali occupano l'intera fascia."""
+    first = weekday * SLOTS_PER_DAY + start // SLOT_MINUTES
+    last = weekday * SLOTS_PER_DAY - (-end // SLOT_MINUTES)
+    slots = np.arange(WEEK_DAYS * SLOTS_PER_DAY)
+    return (slots >= first[:, None]) & (slots < last[:, None])
+
+
+class OccupancyIndex:
+    """
+    Indici di un PDF costruiti una volta sola: mappe dei turni con orario,
+    occupazione per persona e fascia, tipi di turno per persona e giorno.
+    """
+
+    def __init__(self, tables, structure):
+        self.compiled = compile_structure(structure)
+        self.occ = occ = Occurrences([(tables, structure, None)])
+        self.names = occ.names
+        self.header_days = occ.header_days[0]
+        self.labels = _day_labels(self.header_days)
+        self.timed = np.flatnonzero((occ.kind == ShiftKind.WORK) & (occ.start != NO_TIME))
+        self.person = occ.person[self.timed]
+        self.bits = shift_bitmaps(occ.weekday[self.timed].astype(np.int64), occ.start[self.timed], occ.end[self.timed])
+        self.grid = np.zeros((len(self.names), self.bits.shape[1]), dtype=np.uint8)
+        np.add.at(self.grid, self.person, self.bits)
+        # bit (1 << tipo) per ogni tipo di turno della persona nel giorno
+        self.day_kinds = np.zeros((len(self.names), 7), dtype=np.int16)
+        np.bitwise_or.at(self.day_kinds, (occ.person, occ.weekday), (1 << occ.kind.astype(np.int16)))
+
+    def shift_label(self, i):
+        """ "Luogo HH:MM-HH:MM" dell'i-esimo turno con orario."""
+        k = self.timed[i]
+        return f"{self.compiled.location[self.occ.row[k]]} {format_time_range(int(self.occ.start[k]), int(self.occ.end[k]))}"
+
+
+def check_roster(tables, structure, max_day_hours=MAX_DAY_HOURS):
+    """Controlla un PDF già letto (tabelle pdfplumber) con la sua struttura."""
+    index = OccupancyIndex(tables, structure)
+    compiled, occ, labels = index.compiled, index.occ, index.labels
+    timed, person, bits, grid = index.timed, index.person, index.bits, index.grid
+    shift_label = index.shift_label
+    result = CheckResult()
+
+    # Doppie assegnazioni: turni che toccano fasce occupate più di una volta, poi le coppie che si sovrappongono
+    conflicting = np.flatnonzero((bits & (grid[person] > 1)).any(axis=1))
+    conflicting = conflicting[np.argsort(bits[conflicting].argmax(axis=1), kind="stable")]  # per prima fascia
+    for n, i in enumerate(conflicting):
+        for j in conflicting[n + 1:]:
+            if person[i] == person[j] and (bits[i] & bits[j]).any():
+                day = max(occ.weekday[timed[i]], occ.weekday[timed[j]])
+                result.issues.append(Issue(ERROR, "Doppia assegnazione", labels.get(int(day), ""),
+                                           f"{shift_label(i)} e {shift_label(j)}", occ.names[person[i]]))
+
+    # Giornate troppo lunghe: fasce occupate per giorno di calendario
+    hours = (grid > 0).reshape(len(occ.names), WEEK_DAYS, SLOTS_PER_DAY).sum(axis=2) * SLOT_MINUTES / 60
+    for p, day in zip(*np.nonzero(hours > max_day_hours)):
+        result.issues.append(Issue(ERROR, "Giornata troppo lunga", labels.get(int(day), ""),
+                                   f"{hours[p, day]:g} ore (massimo {max_day_hours})", occ.names[p]))
+
+    # Righe scoperte: righe di lavoro della struttura senza nessuno nei giorni dell'header
+    covered = np.zeros((len(compiled), 7), dtype=bool)
+    covered[occ.row, occ.weekday] = True
+    required = np.asarray(compiled.mapped) & (np.asarray(compiled.kind) == ShiftKind.WORK)
+    header = np.zeros(7, dtype=bool)
+    header[[int(DAY_BY_NAME[name]) for name, _ in index.header_days]] = True
+    uncovered = required[:, None] & header[None, :] & ~covered
+    for row in np.flatnonzero(uncovered.any(axis=1)):
+        days = ", ".join(labels[int(d)] for d in np.flatnonzero(uncovered[row]))
+        time_label = format_time_range(compiled.start[row], compiled.end[row])
+        result.issues.append(Issue(WARNING, "Riga scoperta", days,
+                                   f"riga {row}: {compiled.location[row]} {time_label}".rstrip()))
+    return result
@@ -0,0 +1,181 @@
+"""
+Differenze tra due revisioni dello stesso PDF dei turni.
+
+Le celle delle colonne dei giorni delle due versioni vengono confrontate
+in un solo passaggio, indicizzate per (tabella, indice struttura, giorno):
+solo le celle con testo diverso vengono scomposte in persone, e con la
+struttura compilata ogni persona comparsa o sparita diventa un turno
+guadagnato o perso. Un turno perso e uno guadagnato nello stesso giorno
+sono uno spostamento. Così si rigenerano solo le persone toccate.
+"""
+from dataclasses import dataclass, field
+
+from layout import find_day_columns
+from shifts import DAY_BY_NAME, DAY_DISPLAY_NAMES, NO_TIME, TIME_RANGE_RE, format_time_range, range_minutes
+from structure import TIMED_KINDS, compile_structure
+
+
+@dataclass(frozen=True)
+class Slot:
+    day: int
+    day_number: str
+    location: str
+    start: int = NO_TIME
+    end: int = NO_TIME
+
+    def label(self):
+        text = f"{DAY_DISPLAY_NAMES[self.day]} {self.day_number}: {self.location}"
+        if self.start != NO_TIME:
+            text += f" {format_time_range(self.start, self.end)}"
+        return text
+
+
+@dataclass
+class PersonChange:
+    person: str
+    gained: list = field(default_factory=list)   # Slot
+    lost: list = field(default_factory=list)     # Slot
+    moved: list = field(default_factory=list)    # (Slot prima, Slot dopo)
+
+    def rows(self):
+        """Righe per la visualizzazione: (Tipo, Prima, Dopo)."""
+        return (
+            [("Spostato", old.label(), new.label()) for old, new in self.moved]
+            + [("Nuovo", "", s.label()) for s in self.gained]
+            + [("Tolto", s.label(), "") for s in self.lost]
+        )
+
+
+@dataclass
+class RosterDiff:
+    comparable: bool                               # False se i giorni dell'header sono diversi
+    changes: dict = field(default_factory=dict)    # nome in minuscolo -> PersonChange
+
+    @property
+    def people(self):
+        return sorted((c.person for c in self.changes.values()), key=str.lower)
+
+    def affects(self, surname):
+        """Vero se il cognome (cercato come sottostringa, come nell'estrazione) ha turni cambiati."""
+        surname = surname.lower()
+        return not self.comparable or any(surname in key for key in self.changes)
+
+    def for_person(self, surname):
+        """Modifiche di tutte le persone il cui nome contiene il cognome, unite in una sola."""
+        surname = surname.lower()
+        merged = PersonChange(surname)
+        for key, change in self.changes.items():
+            if surname in key:
+                merged.person = change.person
+                merged.gained += change.gained
+                merged.lost += change.lost
+                merged.moved += change.moved
+        return merged
+
+    def summary(self):
+        if not self.comparable:
+            return "Le due versioni coprono giorni diversi: confronto non possibile."
+        if not self.changes:
+            return "Nessuna modifica."
+        return "\n".join(
+            f"{c.person}: +{len(c.gained)} -{len(c.lost)} spostati {len(c.moved)}"
+            for c in sorted(self.changes.values(), key=lambda c: c.person.lower())
+        )
+
+
+def cell_map(tables):
+    """
+    {(tabella, indice struttura, giorno): (numero del giorno, testo)} per le celle
+    non vuote delle colonne dei giorni, più la lista dei giorni dell'header.
+    """
+    cells = {}
+    header_days = []
+    for table_idx, table in enumerate(tables or []):
+        if not table:
+            continue
+        header_row_idx, day_columns = find_day_columns(table)
+        if not day_columns:
+            continue
+        if not header_days:
+            header_days = [day_columns[col] for col in sorted(day_columns)]
+        for row_idx in range(header_row_idx + 1, len(table)):
+            row = table[row_idx] or []
+            structure_idx = row_idx - header_row_idx - 1
+            for col_idx, (day_name, day_number) in day_columns.items():
+                cell = row[col_idx] if col_idx < len(row) else None
+                if cell and str(cell).strip():
+                    cells[table_idx, structure_idx, DAY_BY_NAME[day_name]] = (day_number, str(cell))
+    return cells, header_days
+
+
+def cell_people(text):
+    """{nome in minuscolo: (nome, orario scritto nella riga o None)} per le righe di una cella."""
+    people = {}
+    for line in (text or "").split("\n"):
+        name = " ".join(TIME_RANGE_RE.sub(" ", line).split()).strip(" -/,.")
+        if name and any(c.isalpha() for c in name):
+            time_match = TIME_RANGE_RE.search(line)
+            people[name.lower()] = (name, time_match.groups() if time_match else None)
+    return people
+
+
+def _slot(compiled, structure_idx, day, day_number, time_groups):
+    row_pos = compiled.row(structure_idx)
+    start, end = NO_TIME, NO_TIME
+    if compiled.kind[row_pos] in TIMED_KINDS:
+        start, end = compiled.start[row_pos], compiled.end[row_pos]
+        if time_groups:
+            start, end = range_minutes(*(int(g) for g in time_groups))
+    return Slot(day, day_number, compiled.location[row_pos], start, end)
+
+
+def diff_rosters(old_tables, new_tables, structure):
+    """Confronta due revisioni già lette (liste di tabelle pdfplumber) con la stessa struttura."""
+    old_cells, old_days = cell_map(old_tables)
+    new_cells, new_days = cell_map(new_tables)
+    if old_days != new_days:
+        return RosterDiff(comparable=False)
+
+    compiled = compile_structure(structure)
+    changes = {}
+    for key in old_cells.keys() | new_cells.keys():
+        old = old_cells.get(key, (None, ""))
+        new = new_cells.get(key, (None, ""))
+        if old[1] == new[1]:
+            continue
+        _, structure_idx, day = key
+        old_people = cell_people(old[1])
+        new_people = cell_people(new[1])
+        for name_key in old_people.keys() | new_people.keys():
+            before = old_people.get(name_key)
+            after = new_people.get(name_key)
+            if before == after:
+                continue
+            change = changes.setdefault(name_key, PersonChange((after or before)[0]))
+            if before:
+                change.lost.append(_slot(compiled, structure_idx, day, old[0], before[1]))
+            if after:
+                change.gained.append(_slot(compiled, structure_idx, day, new[0], after[1]))
+
+    for change in changes.values():
+        _pair_moves(change)
+    # Una persona che perde e riguadagna lo stesso turno (es. riga spostata nella cella) non cambia
+    return RosterDiff(True, {k: c for k, c in changes.items() if c.gained or c.lost or c.moved})
+
+
+def _pair_moves(change):
+    """Un turno perso e uno guadagnato nello stesso giorno diventano uno spostamento."""
+    lost = sorted(change.lost, key=lambda s: (s.day, s.start))
+    gained = sorted(change.gained, key=lambda s: (s.day, s.start))
+    for old in list(lost):
+        if old in gained:
+            lost.remove(old)
+            gained.remove(old)
+            continue
+        for new in gained:
+            if new.day == old.day:
+                change.moved.append((old, new))
+                lost.remove(old)
+                gained.remove(new)
+                break
+    change.lost, change.gained = lost, gained
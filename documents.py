@@ -0,0 +1,125 @@
+"""
+Documenti PDF aperti una volta e condivisi.
+
+Un Document tiene i byte del PDF in un solo buffer, mai copiato, e apre su
+richiesta, una volta sola, il documento PyMuPDF e quello pdfplumber sopra
+lo stesso buffer. DocumentCache li conserva (LRU) per contenuto o per file:
+impronte delle pagine, estrazione delle tabelle, ricerca delle parole da
+evidenziare e anteprime riusano lo stesso documento invece di rileggere il
+file e riaprirlo a ogni interazione.
+
+Ogni processo ha la sua cache, compresi i processi di lavoro di sandbox.py:
+a questi basta passare il percorso del file, letto solo la prima volta.
+L'app manda i lavori di uno stesso PDF sempre allo stesso processo
+(SANDBOX.run(..., affinity=hash)), così ogni PDF caricato è aperto una
+volta sola; lo è di nuovo solo quando quel processo viene sostituito
+(limiti superati o TURNIZIO_SANDBOX_MAX_JOBS).
+PyMuPDF e pdfplumber non sono thread-safe: chi usa i documenti aperti
+tiene document.lock.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import logs
+
+log = logs.get_logger("pdf")
+
+MAX_DOCUMENTS = 8
+
+
+class Document:
+    def __init__(self, data, name="<memoria>"):
+        self.data = data
+        self.name = name
+        self.lock = threading.RLock()
+        self._fitz = None
+        self._plumber = None
+
+    def fitz(self):
+        """Documento PyMuPDF sul buffer (aperto alla prima chiamata)."""
+        from pagecache import load_pymupdf
+
+        with self.lock:
+            if self._fitz is None:
+                self._fitz = load_pymupdf().open(stream=self.data, filetype="pdf")
+            return self._fitz
+
+    def plumber(self):
+        """Documento pdfplumber sul buffer (aperto alla prima chiamata); BytesIO condivide i byte senza copiarli."""
+        import pdfplumber
+
+        with self.lock:
+            if self._plumber is None:
+                self._plumber = pdfplumber.open(io.BytesIO(self.data))
+            return self._plumber
+
+    def close(self):
+        with self.lock:
+            if self._fitz is not None:
+                self._fitz.close()
+            if self._plumber is not None:
+                self._plumber.close()
+            self._fitz = self._plumber = None
+
+
+def source_name(source):
+    """Nome da riportare nei log per un percorso, dei byte o un Document."""
+    if isinstance(source, Document):
+        return source.name
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return "<memoria>"
+    return str(source)
+
+
+class DocumentCache:
+    def __init__(self, max_documents=MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return ("dati", hashlib.sha256(source).hexdigest())
+        stat = os.stat(source)  # un file riscritto con lo stesso nome è un altro documento
+        return ("file", os.path.realpath(source), stat.st_mtime_ns, stat.st_size)
+
+    def open(self, source):
+        """Document per un percorso, per dei byte o per un Document (restituito così com'è)."""
+        if isinstance(source, Document):
+            return source
+        key = self._key(source)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                return document
+        if key[0] == "file":
+            with open(source, "rb") as f:
+                document = Document(f.read(), str(source))
+        else:
+            document = Document(bytes(source))
+        with self._lock:
+            document = self._documents.setdefault(key, document)  # un altro thread può averlo aperto intanto
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_documents:
+                _, old = self._documents.popitem(last=False)
+                old.close()
+                logs.event(log, logging.DEBUG, "documento chiuso", name=old.name)
+        return document
+
+    def clear(self):
+        with self._lock:
+            documents, self._documents = list(self._documents.values()), OrderedDict()
+        for document in documents:
+            document.close()
+
+    def __len__(self):
+        return len(self._documents)
+
+
+DOCUMENTS = DocumentCache()
@@ -0,0 +1,280 @@
+"""
+Calendari iCalendar (.ics) per persona.
+
+Le date vere dei turni si ricavano dal periodo "DAL gg-mm AL gg-mm" nel
+nome del PDF e dai numeri dei giorni dell'header (anche a cavallo di due
+mesi o di due anni); senza anno nel nome vale quello in cui i numeri
+dell'header cadono nei giorni della settimana indicati. Ogni persona ha un feed statico <nome>.ics che
+accumula le settimane elaborate: quando arriva un PDF vengono sostituiti
+solo gli eventi del suo periodo, e il file viene riscritto solo se gli
+eventi della persona sono cambiati. I feed possono essere serviti da
+qualunque web server e sottoscritti dal telefono.
+"""
+import datetime
+import html
+import json
+import os
+import re
+import unicodedata
+import urllib.parse
+
+from shifts import CLEANING_LABELS, DAY_BY_NAME, NO_TIME, MINUTES_PER_DAY, format_time_range
+
+PERIOD_RE = re.compile(
+    r"DAL\s+(\d{1,2})[-./](\d{1,2})(?:[-./](\d{2,4}))?\s+AL\s+(\d{1,2})[-./](\d{1,2})(?:[-./](\d{2,4}))?",
+    re.IGNORECASE,
+)
+
+TIMEZONE = "Europe/Rome"
+PRODID = "-//Bar.S.A.//Turnizio//IT"
+STATE_NAME = ".calendari.json"
+RETENTION_DAYS = 120  # gli eventi più vecchi escono dal feed
+
+# Ora legale europea: dall'ultima domenica di marzo all'ultima di ottobre
+VTIMEZONE = (
+    "BEGIN:VTIMEZONE",
+    f"TZID:{TIMEZONE}",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:+0100",
+    "TZOFFSETTO:+0200",
+    "TZNAME:CEST",
+    "DTSTART:19700329T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:+0200",
+    "TZOFFSETTO:+0100",
+    "TZNAME:CET",
+    "DTSTART:19701025T030000",
+    "RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+)
+
+
+def _year(text):
+    year = int(text)
+    return year + 2000 if year < 100 else year
+
+
+def header_matches(period, header_days):
+    """
+    True se i numeri dei giorni dell'header [(giorno, numero)] cadono, dentro
+    il periodo, nei giorni della settimana indicati (almeno uno verificabile).
+    """
+    start, end = period
+    by_number = {str(d.day): d for d in (start + datetime.timedelta(n) for n in range((end - start).days + 1))}
+    checked = False
+    for day_name, number in header_days:
+        date = by_number.get(str(number).strip().lstrip("0"))
+        if date is None or day_name not in DAY_BY_NAME:
+            continue
+        if date.weekday() != int(DAY_BY_NAME[day_name]):
+            return False
+        checked = True
+    return checked
+
+
+def roster_period(filename, today=None, header_days=None):
+    """
+    (primo_giorno, ultimo_giorno) dal nome del PDF, oppure None.
+    Senza anno nel nome si sceglie, tra l'anno scorso, questo e il prossimo,
+    il più vicino a oggi; con header_days ([(giorno, numero)] dell'header)
+    solo tra quelli in cui i numeri cadono nei giorni della settimana giusti.
+    None anche quando nessun anno corrisponde all'header.
+    """
+    match = PERIOD_RE.search(os.path.basename(filename or ""))
+    if not match:
+        return None
+    d1, m1, y1, d2, m2, y2 = match.groups()
+    today = today or datetime.date.today()
+    periods = []
+    for year in [_year(y1)] if y1 else [today.year + k for k in (-1, 0, 1)]:
+        try:
+            start = datetime.date(year, int(m1), int(d1))
+            end = datetime.date(_year(y2) if y2 else start.year, int(m2), int(d2))
+            if end < start:
+                end = end.replace(year=end.year + 1)
+        except ValueError:
+            continue  # 29 febbraio fuori dagli anni bisestili
+        periods.append((start, end))
+    periods.sort(key=lambda p: abs(p[0] - today))
+    for period in periods:
+        if not header_days or header_matches(period, header_days):
+            return period
+    return None
+
+
+def shift_dates(shifts, period):
+    """Data di ogni turno: dal numero del giorno dentro il periodo, altrimenti dal giorno della settimana."""
+    start, end = period
+    days = [start + datetime.timedelta(n) for n in range((end - start).days + 1)]
+    by_number = {str(d.day): d for d in days}
+    by_weekday = {d.weekday(): d for d in days}
+    return [
+        by_number.get(number.strip().lstrip("0")) or by_weekday.get(int(day))
+        for day, number in zip(shifts.day, shifts.day_number)
+    ]
+
+
+def person_slug(person):
+    ascii_name = unicodedata.normalize("NFKD", person).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "-", ascii_name.lower()).strip("-") or "persona"
+
+
+def shift_events(shifts, person, period):
+    """
+    Eventi serializzabili (dict) per i turni di una persona nel periodo.
+    L'UID dipende solo da persona, data e posizione nella giornata, così una
+    modifica di orario o luogo aggiorna l'evento invece di duplicarlo.
+    """
+    slug = person_slug(person)
+    events = []
+    per_day = {}
+    for i, date in enumerate(shift_dates(shifts, period)):
+        if date is None:
+            continue
+        ordinal = per_day[date] = per_day.get(date, 0) + 1
+        events.append({
+            "uid": f"{date:%Y%m%d}-{ordinal}-{slug}@turnizio",
+            "data": date.isoformat(),
+            "inizio": shifts.start[i],
+            "fine": shifts.end[i],
+            "luogo": shifts.location[i],
+            "pulizia": CLEANING_LABELS[shifts.cleaning[i]],
+        })
+    return events
+
+
+def _escape(text):
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _fold(line):
+    """Spezza le righe oltre 75 ottetti (RFC 5545 §3.1)."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    parts = []
+    while data:
+        cut = 75 if not parts else 74
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1  # non spezzare un carattere UTF-8
+        parts.append(data[:cut].decode("utf-8"))
+        data = data[cut:]
+    return "\r\n ".join(parts)
+
+
+def _local(date, minutes):
+    moment = datetime.datetime.combine(date, datetime.time()) + datetime.timedelta(minutes=minutes)
+    return f"{moment:%Y%m%dT%H%M%S}"
+
+
+def _event_lines(event, stamp):
+    date = datetime.date.fromisoformat(event["data"])
+    lines = ["BEGIN:VEVENT", f"UID:{event['uid']}", f"DTSTAMP:{stamp}"]
+    if event["inizio"] == NO_TIME:
+        lines += [
+            f"DTSTART;VALUE=DATE:{date:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{date + datetime.timedelta(1):%Y%m%d}",
+            "TRANSP:TRANSPARENT",
+        ]
+    else:
+        end = event["fine"] if event["fine"] > event["inizio"] else event["fine"] + MINUTES_PER_DAY
+        lines += [
+            f"DTSTART;TZID={TIMEZONE}:{_local(date, event['inizio'])}",
+            f"DTEND;TZID={TIMEZONE}:{_local(date, end)}",
+        ]
+    lines += [f"SUMMARY:{_escape(event['luogo'])}", f"LOCATION:{_escape(event['luogo'])}"]
+    description = []
+    if event["inizio"] != NO_TIME:
+        description.append(f"Orario: {format_time_range(event['inizio'], event['fine'])}")
+    if event["pulizia"]:
+        description.append(f"Pulizia bagni: {event['pulizia']}")
+    if description:
+        lines.append(f"DESCRIPTION:{_escape(chr(10).join(description))}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def render_calendar(person, events, stamp=None):
+    """Testo del feed .ics (righe CRLF)."""
+    stamp = stamp or datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(f'Turni {person}')}",
+        f"X-WR-TIMEZONE:{TIMEZONE}",
+        *VTIMEZONE,
+    ]
+    for event in events:
+        lines += _event_lines(event, stamp)
+    lines.append("END:VCALENDAR")
+    return "".join(_fold(line) + "\r\n" for line in lines)
+
+
+class FeedStore:
+    """
+    Cartella dei feed: un <slug>.ics per persona più lo stato {slug: {"persona", "eventi"}}
+    da cui si decide se un feed è cambiato senza rileggere i file .ics.
+    """
+
+    def __init__(self, directory, retention_days=RETENTION_DAYS, today=None):
+        self.directory = directory
+        self.cutoff = ((today or datetime.date.today()) - datetime.timedelta(retention_days)).isoformat()
+        os.makedirs(directory, exist_ok=True)
+        self.state_path = os.path.join(directory, STATE_NAME)
+        self.state = {}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                self.state = {}  # i feed vengono ricostruiti ai prossimi PDF
+        self.changed = False
+
+    def path_for(self, person):
+        return os.path.join(self.directory, f"{person_slug(person)}.ics")
+
+    def update(self, person, period, events):
+        """Sostituisce gli eventi del periodo; ritorna True se il feed è stato riscritto."""
+        from batch import write_atomic  # importato qui: batch importa questo modulo
+
+        slug = person_slug(person)
+        first, last = (d.isoformat() for d in period)
+        previous = self.state.get(slug, {}).get("eventi", [])
+        merged = [e for e in previous if not first <= e["data"] <= last and e["data"] >= self.cutoff]
+        merged += events
+        merged.sort(key=lambda e: (e["data"], e["uid"]))
+        path = self.path_for(person)
+        if merged == previous and os.path.exists(path):
+            return False
+        write_atomic(path, render_calendar(person, merged))
+        self.state[slug] = {"persona": person, "eventi": merged}
+        self.changed = True
+        return True
+
+    def save(self):
+        """Salva lo stato e l'indice dei calendari, solo se qualcosa è cambiato."""
+        from batch import write_atomic
+
+        if not self.changed:
+            return
+        write_atomic(self.state_path, json.dumps(self.state, ensure_ascii=False, indent=1))
+        write_atomic(os.path.join(self.directory, "index.html"), self.render_index_html())
+        self.changed = False
+
+    def render_index_html(self):
+        items = "".join(
+            f'<li><a href="{html.escape(urllib.parse.quote(slug))}.ics">{html.escape(entry["persona"])}</a></li>'
+            for slug, entry in sorted(self.state.items(), key=lambda kv: kv[1]["persona"].lower())
+        )
+        return (
+            '<!DOCTYPE html><html lang="it"><head><meta charset="utf-8">'
+            "<title>Calendari turni Bar.S.A.</title></head><body><h1>Calendari turni Bar.S.A.</h1>"
+            "<p>Copia il link di un calendario e aggiungilo come abbonamento sul telefono.</p>"
+            f"<ul>{items}</ul></body></html>"
+        )
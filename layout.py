@@ -0,0 +1,137 @@
+"""
+Layout del PDF dei turni.
+
+Riconoscimento dell'header dei giorni, impronta (fingerprint) del layout
+della tabella e registro delle strutture: ogni versione di structure.json
+viene associata all'impronta del layout per cui è stata scritta, così un
+nuovo PDF con lo stesso layout trova la struttura giusta con un lookup.
+"""
+import hashlib
+import json
+import os
+import re
+
+import logs
+from shifts import DAY_BY_NAME, DAY_NAMES, TIME_RANGE_RE
+
+log = logs.get_logger("structure")
+
+DAY_HEADER_RE = re.compile(r"([a-zàèéìòù']+)\s+(\d+)", re.IGNORECASE)
+HEADER_SEARCH_ROWS = 3
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "structure_registry.json")
+
+
+def find_day_columns(table):
+    """
+    Cerca l'header dei giorni nelle prime righe della tabella.
+    Ritorna (indice_riga_header, {colonna: (giorno_normalizzato, numero)}) oppure (-1, {}).
+    """
+    for row_idx in range(min(HEADER_SEARCH_ROWS, len(table))):
+        row = table[row_idx]
+        if not row:
+            continue
+        day_columns = {}
+        for col_idx, cell in enumerate(row):
+            if cell:
+                match = DAY_HEADER_RE.match(str(cell).strip())
+                if match:
+                    day = DAY_BY_NAME.get(match.group(1).lower())
+                    if day is not None:
+                        day_columns[col_idx] = (DAY_NAMES[day], match.group(2))
+        if day_columns:
+            return row_idx, day_columns
+    return -1, {}
+
+
+def _label(cell):
+    return " ".join(str(cell).split()).lower() if cell else ""
+
+
+def layout_fingerprint(tables):
+    """
+    Impronta del layout: per ogni tabella con header, posizione dell'header,
+    colonne dei giorni, numero di righe ed etichette delle colonne prima dei giorni.
+    I numeri dei giorni e i nomi delle persone non entrano nell'impronta.
+    """
+    parts = []
+    for table in tables or []:
+        if not table:
+            continue
+        header_row_idx, day_columns = find_day_columns(table)
+        if not day_columns:
+            continue
+        first_day_col = min(day_columns)
+        labels = [
+            [_label(c) for c in (row or [])[:first_day_col]]
+            for row in table[header_row_idx + 1:]
+        ]
+        parts.append([header_row_idx, sorted(day_columns), len(table) - header_row_idx - 1, labels])
+    if not parts:
+        return None
+    payload = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def propose_structure(tables):
+    """
+    Propone una struttura leggendo le etichette Luogo/Orario del PDF stesso
+    (colonne prima dei giorni). Le celle unite lasciano vuote le righe
+    successive: in quel caso si prosegue con il luogo precedente.
+    """
+    for table in tables or []:
+        if not table:
+            continue
+        header_row_idx, day_columns = find_day_columns(table)
+        if not day_columns:
+            continue
+        first_day_col = min(day_columns)
+        proposal = {}
+        current_location = ""
+        for row_idx in range(header_row_idx + 1, len(table)):
+            labels = [" ".join(str(c).split()) for c in (table[row_idx] or [])[:first_day_col] if c]
+            time_slot = ""
+            location = ""
+            for label in labels:
+                time_match = TIME_RANGE_RE.search(label)
+                if time_match and not time_slot:
+                    h1, m1, h2, m2 = time_match.groups()
+                    time_slot = f"{int(h1):02d}:{m1}-{int(h2):02d}:{m2}"
+                    label = (label[:time_match.start()] + label[time_match.end():]).strip(" -")
+                if label and not location:
+                    location = label
+            if location and not any(k in location.lower() for k in ("sabato", "domenica", "festivi")):
+                current_location = location
+            if current_location or time_slot:
+                proposal[row_idx - header_row_idx - 1] = (current_location, time_slot, "")
+        return proposal
+    return {}
+
+
+class StructureRegistry:
+    """Registro {impronta: {"nome": ..., "struttura": {...}}} salvato in JSON."""
+
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                log.warning("impossibile caricare %s: %s", path, e)
+
+    def match(self, fingerprint):
+        """Ritorna (nome, struttura) per l'impronta, oppure None."""
+        entry = self.entries.get(fingerprint) if fingerprint else None
+        if entry is None:
+            return None
+        return entry["nome"], {int(k): tuple(v) for k, v in entry["struttura"].items()}
+
+    def register(self, fingerprint, name, structure):
+        self.entries[fingerprint] = {
+            "nome": name,
+            "struttura": {str(k): list(v) for k, v in sorted(structure.items())},
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,110 @@
+"""
+Logging strutturato per la pipeline.
+
+Ogni fase ha il proprio logger ("turnizio.pdf", "turnizio.header",
+"turnizio.match", ...) con livello configurabile separatamente. Gli
+eventi portano campi leggibili da macchina (persona, tabella, riga,
+colonna, decisione) in record.fields; nei cicli caldi il chiamante
+controlla una sola volta isEnabledFor(), così con il debug spento non
+viene costruito alcun messaggio.
+
+Configurazione da variabili d'ambiente:
+    TURNIZIO_LOG="DEBUG"                  livello per tutte le fasi
+    TURNIZIO_LOG="WARNING,match=DEBUG"    livello base + livelli per fase
+    TURNIZIO_LOG_FORMAT="json"            una riga JSON per evento
+"""
+import json
+import logging
+import os
+import sys
+
+ROOT = "turnizio"
+STAGES = ("pdf", "header", "structure", "match", "render", "batch", "resources", "api", "sandbox")
+
+_handler = None
+
+
+def get_logger(stage):
+    return logging.getLogger(f"{ROOT}.{stage}")
+
+
+def event(logger, level, decision, **fields):
+    """Registra un evento strutturato: decision è il messaggio, fields i dati associati."""
+    logger.log(level, decision, extra={"fields": fields})
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Formato leggibile: "DEBUG match: trovato person='Rossi' row=12"."""
+
+    def format(self, record):
+        stage = record.name[len(ROOT) + 1:] or ROOT
+        text = f"{record.levelname} {stage}: {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{k}={v!r}" for k, v in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Una riga JSON per evento."""
+
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "stage": record.name[len(ROOT) + 1:] or ROOT,
+            "decision": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def parse_level_spec(spec):
+    """"WARNING,match=DEBUG" -> ("WARNING", {"match": "DEBUG"})."""
+    base = None
+    per_stage = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            stage, level = part.split("=", 1)
+            per_stage[stage.strip()] = level.strip().upper()
+        else:
+            base = part.upper()
+    return base, per_stage
+
+
+def configure(debug=False, spec=None, json_output=None, stream=None):
+    """
+    Installa (una sola volta) l'handler sul logger radice "turnizio" e imposta i livelli.
+    debug=True equivale a TURNIZIO_LOG="DEBUG"; spec ha la stessa sintassi della variabile.
+    """
+    global _handler
+    if spec is None:
+        spec = os.environ.get("TURNIZIO_LOG", "")
+    if json_output is None:
+        json_output = os.environ.get("TURNIZIO_LOG_FORMAT", "").lower() == "json"
+    base, per_stage = parse_level_spec(spec)
+    if debug:
+        base = "DEBUG"
+
+    root = logging.getLogger(ROOT)
+    if _handler is None:
+        _handler = logging.StreamHandler(stream or sys.stderr)
+        root.addHandler(_handler)
+        root.propagate = False
+    _handler.setFormatter(JsonFormatter() if json_output else KeyValueFormatter())
+    root.setLevel(base or "WARNING")
+    for stage in STAGES:
+        get_logger(stage).setLevel(per_stage.get(stage, logging.NOTSET))
+    for stage, level in per_stage.items():
+        get_logger(stage).setLevel(level)
+    return root
+
@@ -1,17 +1,24 @@
-import pdfplumber
 import os
 import re
 import glob
 import json
-from datetime import datetime
-from fpdf import FPDF
 import sys
-
-DEBUG_MODE = False
-
-def debug_print(*args, **kwargs):
-    if DEBUG_MODE:
-        print(*args, **kwargs)
+import argparse
+from shifts import (
+    ShiftTable, Cleaning, CLEANING_BY_LABEL, DAY_BY_NAME, NO_TIME, TIME_RANGE_RE,
+    range_minutes, format_time_range, parse_time_range,
+)
+from structure import TIMED_KINDS, compile_structure
+from layout import StructureRegistry, find_day_columns, layout_fingerprint
+from pagecache import PAGE_CACHE, load_pymupdf, page_fingerprints
+from profiling import PROFILER, span
+import logging
+import logs
+
+log_pdf = logs.get_logger("pdf")
+log_header = logs.get_logger("header")
+log_structure = logs.get_logger("structure")
+log_match = logs.get_logger("match")
 
 def normalize_day_name(day_name):
     day_name = day_name.lower().strip()
@@ -26,7 +33,10 @@ def format_day_for_display(day_name):
 
 def get_raw_pdf_rows(file_path):
     """Ritorna una lista di tuple (indice_riga_tabella, contenuto_riga) per debug."""
-    tables = read_pdf_tables(file_path)
+    return raw_pdf_rows(read_pdf_tables(file_path))
+
+def raw_pdf_rows(tables):
+    """Come get_raw_pdf_rows, dalle tabelle già lette."""
     if not tables:
         return []
     
@@ -69,9 +79,11 @@ def get_hardcoded_structure(json_path=None):
             try:
                 with open(path, "r", encoding="utf-8") as f:
                     raw = json.load(f)
-                return {int(k): tuple(v) for k, v in raw.items()}
+                structure = {int(k): tuple(v) for k, v in raw.items()}
+                compile_structure(structure)  # segnala subito eventuali orari non validi
+                return structure
             except Exception as e:
-                print(f"Avviso: impossibile caricare {path}: {e}")
+                log_structure.warning("impossibile caricare %s: %s", path, e)
 
     # Fallback hardcoded
     return {
@@ -160,47 +172,87 @@ def structure_from_json_bytes(data: bytes) -> dict:
     raw = json.loads(data.decode("utf-8"))
     return {int(k): tuple(v) for k, v in raw.items()}
 
-def read_pdf_tables(file_path):
+def read_pdf_tables(file_path, progress=None):
+    """
+    Tabelle di tutte le pagine, in ordine. Le pagine già viste (stessa impronta,
+    anche in un PDF precedente) vengono prese dalla cache; solo le altre passano da pdfplumber.
+    file_path può essere anche dei byte o un documents.Document, aperto una volta e condiviso.
+    progress(fatte, totale), se indicata, viene chiamata dopo ogni pagina estratta.
+    """
+    import pdfplumber  # importato al primo uso: i comandi che non leggono PDF non lo caricano
+    from documents import DOCUMENTS, source_name
+
     try:
-        with pdfplumber.open(file_path) as pdf:
-            all_tables = []
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                all_tables.extend(tables)
-            return all_tables
+        document = DOCUMENTS.open(file_path)
+        with span("pdf.fingerprint") as s:
+            fingerprints = page_fingerprints(document, salt=pdfplumber.__version__)
+            s["items"] = len(fingerprints or ())
+        cached = [PAGE_CACHE.get(fp) for fp in fingerprints] if fingerprints else []
+        missing = [i for i, tables in enumerate(cached) if tables is None]
+        if fingerprints is None or missing:
+            with document.lock:
+                with span("pdf.open"):
+                    pages = document.plumber().pages
+                # senza impronte si leggono tutte le pagine
+                pages = [pages[i] for i in missing] if fingerprints else pages
+                extracted = []
+                for page in pages:
+                    with span("pdf.page_tables") as s:
+                        tables = page.extract_tables()
+                        s["items"] = len(tables)
+                    page.close()  # libera gli oggetti della pagina, il documento resta aperto
+                    extracted.append(tables)
+                    if progress:
+                        progress(len(extracted), len(pages))
+            if fingerprints is None:
+                cached = extracted
+            for i, tables in zip(missing, extracted):
+                cached[i] = tables
+                PAGE_CACHE.put(fingerprints[i], tables)
+        reused = len(cached) - len(missing) if fingerprints else 0
+        if reused:
+            PROFILER.record("pdf.page_reused", 0.0, items=reused)
+        logs.event(log_pdf, logging.DEBUG, "pagine lette", path=source_name(file_path),
+                   reused=reused, extracted=len(cached) - reused)
+        return [table for page_tables in cached for table in page_tables]
+    except MemoryError:
+        raise  # segnalata a parte dai processi di lavoro (sandbox.py)
     except Exception as e:
-        print(f"Errore nella lettura del PDF: {str(e)}")
+        logs.event(log_pdf, logging.ERROR, "Errore nella lettura del PDF", path=source_name(file_path), error=str(e))
         return None
 
-def parse_pdf(file_path):
-    return read_pdf_tables(file_path)
+def parse_pdf(file_path, progress=None):
+    return read_pdf_tables(file_path, progress=progress)
 
 def extract_days_from_header(tables):
     days = []
     for table in tables:
         if not table:
             continue
-        for row_idx in range(min(3, len(table))):
-            row = table[row_idx]
-            if not row:
-                continue
-            debug_print(f"Debug: Analizzando header riga {row_idx}: {row}")
-            for cell in row:
-                if cell:
-                    cell_text = str(cell).strip()
-                    match = re.match(r"([a-zàèéìòù']+)\s+(\d+)", cell_text, re.IGNORECASE)
-                    if match:
-                        giorno = normalize_day_name(match.group(1))
-                        if giorno in ['lunedì', 'martedì', "mercoledi'", 'giovedì', 'venerdì', 'sabato', 'domenica']:
-                            days.append((giorno, match.group(2)))
-                            debug_print(f"Debug: Trovato giorno: {giorno} {match.group(2)}")
-            if days:
-                break
-        if days:
+        with span("header"):
+            header_row_idx, day_columns = find_day_columns(table)
+        if day_columns:
+            days = [day_columns[col] for col in sorted(day_columns)]
+            if log_header.isEnabledFor(logging.DEBUG):
+                logs.event(log_header, logging.DEBUG, "header trovato", row=header_row_idx, days=days)
             break
-    debug_print(f"Debug: Giorni estratti: {days}")
     return days
 
+def resolve_structure(tables, json_path=None):
+    """
+    Sceglie la struttura per le tabelle: quella registrata per l'impronta del
+    layout se presente, altrimenti structure.json / default.
+    Ritorna (struttura, nome_versione_o_None, impronta).
+    """
+    fingerprint = layout_fingerprint(tables)
+    matched = StructureRegistry().match(fingerprint)
+    if matched:
+        name, structure = matched
+        logs.event(log_structure, logging.DEBUG, "layout riconosciuto", fingerprint=fingerprint, version=name)
+        return structure, name, fingerprint
+    logs.event(log_structure, logging.DEBUG, "layout non registrato, struttura predefinita", fingerprint=fingerprint)
+    return get_hardcoded_structure(json_path), None, fingerprint
+
 def extract_shifts_for_person_hardcoded(tables, surname, structure=None):
     """
     Estrae i turni per il cognome specificato.
@@ -212,200 +264,253 @@ def extract_shifts_for_person_hardcoded(tables, surname, structure=None):
 
     days = extract_days_from_header(tables)
     if not days:
-        print("Errore: Non è stato possibile trovare i giorni nelle tabelle")
+        log_header.error("Non è stato possibile trovare i giorni nelle tabelle")
         return []
 
     if structure is None:
         structure = get_hardcoded_structure()
+    compiled = compile_structure(structure)
+    surname_lower = surname.lower()
 
-    shifts = []
+    shifts = ShiftTable()
     days_with_shifts = set()
 
-    debug_print(f"\nCercando turni per: {surname}")
+    debug = log_match.isEnabledFor(logging.DEBUG)
 
-    for table in tables:
+    for table_idx, table in enumerate(tables):
         if not table:
             continue
 
-        debug_print(f"\nDebug: Processando tabella con {len(table)} righe")
-
-        day_columns = {}
-        header_row_idx = -1
-
-        for row_idx in range(min(3, len(table))):
-            row = table[row_idx]
-            if not row:
-                continue
-            temp_day_columns = {}
-            for col_idx, cell in enumerate(row):
-                if cell:
-                    cell_text = str(cell).strip()
-                    match = re.match(r"([a-zàèéìòù']+)\s+(\d+)", cell_text, re.IGNORECASE)
-                    if match:
-                        giorno = normalize_day_name(match.group(1))
-                        numero = match.group(2)
-                        if giorno in ['lunedì', 'martedì', "mercoledi'", 'giovedì', 'venerdì', 'sabato', 'domenica']:
-                            temp_day_columns[col_idx] = (giorno, numero)
-            if temp_day_columns:
-                day_columns = temp_day_columns
-                header_row_idx = row_idx
-                break
+        with span("header"):
+            header_row_idx, day_columns = find_day_columns(table)
 
         if not day_columns:
             continue
 
-        debug_print(f"Debug: Header trovato nella riga {header_row_idx}")
-        debug_print(f"Debug: Colonne giorni: {day_columns}")
-
-        for row_idx in range(header_row_idx + 1, len(table)):
-            row = table[row_idx]
-            if not row or all(cell is None or str(cell).strip() == '' for cell in row):
-                continue
-
-            structure_idx = row_idx - header_row_idx - 1
-            debug_print(f"\nDebug: Riga {row_idx} (struttura idx {structure_idx}): {[str(cell)[:30] if cell else None for cell in row[:5]]}")
-
-            if structure_idx in structure and structure[structure_idx] is not None:
-                location, time_slot, notes = structure[structure_idx]
-            else:
-                debug_print(f"Debug: Struttura non definita per riga {structure_idx}, uso fallback Riposo")
-                location = "Riposo"
-                time_slot = ""
-                notes = ""
-
-            for col_idx, cell in enumerate(row):
-                if cell and surname.lower() in str(cell).lower():
-                    if col_idx in day_columns:
-                        day_name, day_number = day_columns[col_idx]
-                        debug_print(f"Debug: Trovato '{surname}' in {day_name} {day_number} (colonna {col_idx})")
-                        days_with_shifts.add(day_name)
-
-                        final_location = location if location else "Turno"
-                        final_time = time_slot if time_slot else ""
-                        
-                        time_override = re.search(r'(\d{1,2}[,:]\d{2})\s*[-/]\s*(\d{1,2}[,:]\d{2})', str(cell))
-                        if time_override:
-                            final_time = time_override.group(0).replace(',', ':').replace('/', '-')
-
-                        if "CHIUSO" in final_location.upper() or "CHIUSA" in final_location.upper():
-                            shifts.append((day_name, day_number, "Riposo - " + final_location, "", ""))
-                        elif "riposo" in final_location.lower() or "ferie" in final_location.lower():
-                            shifts.append((day_name, day_number, final_location, "", ""))
-                        else:
-                            shifts.append((day_name, day_number, final_location, final_time, ""))
-
-                        debug_print(f"Debug: Aggiunto turno: {day_name} {day_number}, {final_location}, {final_time}")
+        if debug:
+            logs.event(log_match, logging.DEBUG, "tabella", person=surname, table=table_idx,
+                       rows=len(table), header_row=header_row_idx, day_columns=day_columns)
+
+        with span("match", items=len(table) - header_row_idx - 1):
+            for row_idx in range(header_row_idx + 1, len(table)):
+                row = table[row_idx]
+                if not row or all(cell is None or str(cell).strip() == '' for cell in row):
+                    continue
+
+                structure_idx = row_idx - header_row_idx - 1
+                row_pos = compiled.row(structure_idx)
+                if debug and not compiled.mapped[row_pos]:
+                    logs.event(log_match, logging.DEBUG, "struttura non definita, fallback Riposo",
+                               person=surname, table=table_idx, row=structure_idx)
+                location = compiled.location[row_pos]
+                timed = compiled.kind[row_pos] in TIMED_KINDS
+
+                for col_idx, cell in enumerate(row):
+                    if cell and surname_lower in str(cell).lower():
+                        if col_idx in day_columns:
+                            day_name, day_number = day_columns[col_idx]
+                            days_with_shifts.add(day_name)
+
+                            start, end = NO_TIME, NO_TIME
+                            time_override = None
+                            if timed:
+                                start, end = compiled.start[row_pos], compiled.end[row_pos]
+                                time_override = TIME_RANGE_RE.search(str(cell))
+                                if time_override:
+                                    start, end = range_minutes(*(int(g) for g in time_override.groups()))
+                            shifts.append(DAY_BY_NAME[day_name], day_number, location, start, end)
+
+                            if debug:
+                                logs.event(log_match, logging.DEBUG, "turno aggiunto", person=surname,
+                                           table=table_idx, row=structure_idx, column=col_idx,
+                                           day=f"{day_name} {day_number}", cell=str(cell), location=location,
+                                           time=format_time_range(start, end),
+                                           time_source="cella" if time_override else "struttura")
 
     for day_name, day_number in days:
         if day_name not in days_with_shifts:
-            shifts.append((day_name, day_number, "Riposo", "", ""))
+            shifts.append(DAY_BY_NAME[day_name], day_number, "Riposo")
 
-    debug_print(f"\nDebug: Totale turni trovati: {len(shifts)}")
+    if debug:
+        logs.event(log_match, logging.DEBUG, "totale turni", person=surname, count=len(shifts))
     return shifts
 
 def has_giardini_castello(shifts):
-    for shift in shifts:
-        if "giardini del castello" in shift[2].lower():
-            return True
-    return False
+    return shifts.has_giardini_castello()
 
 def sort_days(shifts):
-    day_order = {
-        'lunedì': 1, 'martedì': 2, "mercoledi'": 3,
-        'giovedì': 4, 'venerdì': 5, 'sabato': 6, 'domenica': 7
-    }
-
-    def get_day_number(shift):
-        return day_order.get(normalize_day_name(shift[0]), 8)
+    """Ordina una ShiftTable per giorno della settimana e ora di inizio."""
+    with span("sort", items=len(shifts)):
+        return shifts.sorted()
 
-    def get_time(shift):
-        time_str = shift[3]
-        if time_str:
-            try:
-                return datetime.strptime(time_str.split('-')[0].strip(), "%H:%M")
-            except (ValueError, IndexError):
-                return datetime.max
-        return datetime.max
+def get_output_filename(input_filename, surname):
+    match = re.search(r"DAL.*\.pdf", input_filename, re.IGNORECASE)
+    return f"Turni {surname} " + match.group(0).lower() if match else f"Turni {surname}.pdf"
 
-    return sorted(shifts, key=lambda s: (get_day_number(s), get_time(s)))
+def write_shifts_to_pdf(shifts, input_filename, surname, output_dir=None):
+    with span("pdf.write", items=len(shifts)):
+        return _write_shifts_to_pdf(sort_days(shifts), input_filename, surname, output_dir)
 
-def write_shifts_to_pdf(shifts, input_filename, surname):
-    shifts = sort_days(shifts)
+def _write_shifts_to_pdf(shifts, input_filename, surname, output_dir=None):
+    output_filename = get_output_filename(input_filename, surname)
+    if output_dir:
+        output_filename = os.path.join(output_dir, output_filename)
 
-    match = re.search(r"DAL.*\.pdf", input_filename, re.IGNORECASE)
-    output_filename = f"Turni {surname} " + match.group(0).lower() if match else f"Turni {surname}.pdf"
+    _timetable_pdf(shifts, surname).output(output_filename)
+    print(f"File '{output_filename}' creato con successo!")
+    return output_filename
 
-    has_bagni = has_giardini_castello(shifts)
+def render_shifts_pdf(shifts, surname):
+    """PDF personale in memoria (bytes), senza passare dal disco."""
+    with span("pdf.write", items=len(shifts)):
+        return _timetable_pdf(sort_days(shifts), surname).output(dest="S").encode("latin-1")
 
-    if has_bagni:
-        updated_shifts = []
-        for shift in shifts:
-            if len(shift) < 5:
-                pulizia = "No" if "giardini del castello" in shift[2].lower() else ""
-                updated_shifts.append(shift + (pulizia,))
-            else:
-                pulizia_value = shift[4]
-                if "giardini del castello" in shift[2].lower() and not pulizia_value:
-                    updated_shifts.append(shift[:4] + ("No",))
-                else:
-                    updated_shifts.append(shift)
-        shifts = updated_shifts
+def _timetable_pdf(shifts, surname):
+    from fpdf import FPDF
 
     pdf = FPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
+    _draw_timetable(pdf, shifts, surname)
+    return pdf
 
-    pdf.set_font("Arial", "B", size=17)
-    pdf.cell(200, 10, txt=f"Turni di lavoro {surname}", ln=True, align='C')
-    pdf.ln(10)
+# Misure della tabella in mm: (giorno, numero, luogo, orario, pulizia) e caratteri massimi del luogo
+_COLUMNS_BAGNI = ((25, 10, 80, 40, 30), 40)
+_COLUMNS_STANDARD = ((30, 15, 85, 60), 44)
+PAGE_WIDTH = 210   # A4
+PAGE_HEIGHT = 297
 
-    # Calculate total table width to center it
+def timetable_layout(shifts):
+    """
+    Regole della tabella comuni a PDF, HTML e immagine: la colonna "Pulizia
+    bagni" c'è solo con i Giardini del Castello (e vale "No" se non indicata).
+    Ritorna (turni, con_pulizia, larghezze in mm, caratteri massimi del luogo).
+    """
+    has_bagni = has_giardini_castello(shifts)
     if has_bagni:
-        table_width = 25 + 10 + 80 + 40 + 30 # = 185
-    else:
-        table_width = 30 + 15 + 85 + 60 # = 190
-    
-    page_width = 210 # A4 width in mm
-    x_offset = (page_width - table_width) / 2
+        shifts = shifts.with_default_cleaning()
+    widths, max_location = _COLUMNS_BAGNI if has_bagni else _COLUMNS_STANDARD
+    return shifts, has_bagni, widths, max_location
+
+def _draw_timetable(pdf, shifts, surname, row_height=10, title_size=17):
+    """
+    Disegna titolo e tabella dei turni di una persona dalla posizione corrente.
+    Usata sia per il PDF personale sia per il libretto (row_height/title_size ridotti per due persone per pagina).
+    """
+    shifts, has_bagni, widths, max_location = timetable_layout(shifts)
+
+    pdf.set_font("Arial", "B", size=title_size)
+    pdf.cell(200, row_height, txt=f"Turni di lavoro {surname}", ln=True, align='C')
+    pdf.ln(row_height)
+
+    # Larghezza totale della tabella per centrarla
+    x_offset = (PAGE_WIDTH - sum(widths)) / 2
+    w_day, w_number, w_location, w_time = widths[:4]
 
     pdf.set_font("Arial", size=12)
     pdf.set_fill_color(200, 200, 200)
 
     pdf.set_x(x_offset)
+    pdf.cell(w_day, row_height, 'Giorno', border='LTB', align='R', fill=True)
+    pdf.cell(w_number, row_height, ' ', border='RTB', align='C', fill=True)
+    pdf.cell(w_location, row_height, 'Luogo', border=1, align='C', fill=True)
+    pdf.cell(w_time, row_height, 'Orario', border=1, align='C', fill=True)
     if has_bagni:
-        pdf.cell(25, 10, 'Giorno', border='LTB', align='R', fill=True)
-        pdf.cell(10, 10, ' ', border='RTB', align='C', fill=True)
-        pdf.cell(80, 10, 'Luogo', border=1, align='C', fill=True)
-        pdf.cell(40, 10, 'Orario', border=1, align='C', fill=True)
-        pdf.cell(30, 10, 'Pulizia bagni', border=1, align='C', fill=True)
-    else:
-        pdf.cell(30, 10, 'Giorno', border='LTB', align='R', fill=True)
-        pdf.cell(15, 10, ' ', border='RTB', align='C', fill=True)
-        pdf.cell(85, 10, 'Luogo', border=1, align='C', fill=True)
-        pdf.cell(60, 10, 'Orario', border=1, align='C', fill=True)
+        pdf.cell(widths[4], row_height, 'Pulizia bagni', border=1, align='C', fill=True)
     pdf.ln()
 
-    for shift in shifts:
-        day, day_number, location, time = shift[:4]
-        pulizia_bagni = shift[4] if len(shift) > 4 else ""
-        day_display = format_day_for_display(day)
-
+    for day_display, day_number, location, time, pulizia_bagni in shifts.display_rows():
         pdf.set_x(x_offset)
+        pdf.cell(w_day, row_height, day_display, border='LTB', align='R')
+        pdf.cell(w_number, row_height, day_number, border='RTB', align='L')
+        pdf.cell(w_location, row_height, location[:max_location], border=1, align='C')
+        pdf.cell(w_time, row_height, time, border=1, align='C')
         if has_bagni:
-            pdf.cell(25, 10, day_display, border='LTB', align='R')
-            pdf.cell(10, 10, day_number, border='RTB', align='L')
-            pdf.cell(80, 10, location[:40], border=1, align='C')
-            pdf.cell(40, 10, time, border=1, align='C')
-            pdf.cell(30, 10, pulizia_bagni, border=1, align='C')
-        else:
-            pdf.cell(30, 10, day_display, border='LTB', align='R')
-            pdf.cell(15, 10, day_number, border='RTB', align='L')
-            pdf.cell(85, 10, location[:44], border=1, align='C')
-            pdf.cell(60, 10, time, border=1, align='C')
+            pdf.cell(widths[4], row_height, pulizia_bagni, border=1, align='C')
         pdf.ln()
 
-    pdf.output(output_filename)
-    print(f"File '{output_filename}' creato con successo!")
+def render_shifts_html(shifts, surname):
+    """
+    Tabella dei turni in HTML con le stesse regole del PDF personale (ordine
+    dei giorni, colonna "Pulizia bagni" solo con i Giardini del Castello,
+    larghezze e tabella centrata), per l'anteprima senza generare il PDF.
+    """
+    from html import escape
+
+    shifts, _, widths, max_location = timetable_layout(sort_days(shifts))
+    total = sum(widths)
+
+    cell = "border:1px solid #000; padding:0.35em 0.4em; text-align:center;"
+    # giorno e numero formano una sola cella visiva, come i bordi 'LTB' e 'RTB' del PDF
+    day_cell = "border:1px solid #000; border-right:none; padding:0.35em 0.2em; text-align:right;"
+    number_cell = "border:1px solid #000; border-left:none; padding:0.35em 0.2em; text-align:left;"
+    header = ("Giorno", "", "Luogo", "Orario", "Pulizia bagni")[:len(widths)]
+    styles = (day_cell, number_cell, cell, cell, cell)
+
+    cols = "".join(f'<col style="width:{w / total * 100:.2f}%">' for w in widths)
+    head = "".join(f'<th style="{style} background:#c8c8c8; font-weight:normal;">{escape(text) or "&nbsp;"}</th>'
+                   for text, style in zip(header, styles))
+    body = []
+    for day_display, day_number, location, time, pulizia_bagni in shifts.display_rows():
+        values = (day_display, day_number, location[:max_location], time, pulizia_bagni)[:len(widths)]
+        body.append("<tr>" + "".join(f'<td style="{style}">{escape(value) or "&nbsp;"}</td>'
+                                     for value, style in zip(values, styles)) + "</tr>")
+    return (
+        '<div style="background:#fff; color:#000; font-family:Arial, Helvetica, sans-serif; padding:1.5em 0;">'
+        f'<div style="text-align:center; font-weight:bold; font-size:1.4em; margin-bottom:1em;">'
+        f'Turni di lavoro {escape(surname)}</div>'
+        f'<table style="width:{total / PAGE_WIDTH * 100:.1f}%; margin:0 auto; border-collapse:collapse; '
+        f'table-layout:fixed;">{cols}<thead><tr>{head}</tr></thead><tbody>{"".join(body)}</tbody></table>'
+        '</div>'
+    )
+
+def _timetable_height(shifts, row_height):
+    # titolo + spazio + header + righe
+    return row_height * (len(shifts) + 3)
+
+def write_booklet(entries, output_filename, per_page=1):
+    """
+    Libretto unico con i turni di tutto il personale: entries è una lista di
+    (cognome, ShiftTable), una persona per pagina oppure due (per_page=2, con
+    righe più basse; chi non entra in mezza pagina va su una pagina propria).
+    Un solo FPDF per tutto il documento; segnalibri per persona aggiunti con PyMuPDF.
+    Ritorna il percorso del file.
+    """
+    from fpdf import FPDF
+
+    with span("pdf.booklet", items=len(entries)):
+        pdf = FPDF()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        half = PAGE_HEIGHT / 2
+        compact = (7, 14)  # row_height, title_size per le mezze pagine
+        bookmarks = []
+        slot = 0  # 0: pagina nuova, 1: metà inferiore libera
+        for surname, shifts in entries:
+            shifts = sort_days(shifts)
+            fits_half = per_page == 2 and _timetable_height(shifts, compact[0]) <= half - 15
+            if slot == 1 and fits_half:
+                pdf.set_y(half + 5)
+                slot = 0
+            else:
+                pdf.add_page()
+                slot = 1 if fits_half else 0
+            bookmarks.append([1, surname, pdf.page_no()])
+            if fits_half:
+                _draw_timetable(pdf, shifts, surname, *compact)
+            else:
+                _draw_timetable(pdf, shifts, surname)
+        pdf.output(output_filename)
+
+        fitz = load_pymupdf()
+        if fitz is None:
+            log_pdf.warning("PyMuPDF non installato: libretto senza segnalibri")
+            return output_filename
+        doc = fitz.open(output_filename)
+        doc.set_toc(bookmarks)
+        tmp = output_filename + ".tmp"
+        doc.save(tmp, garbage=4, deflate=True)
+        doc.close()
+        os.replace(tmp, output_filename)
     return output_filename
 
 # ── CLI ──────────────────────────────────────────────────────────────────────
@@ -416,19 +521,62 @@ def print_shifts(shifts):
     print(f"\nTurni attuali:\n{sep}")
     header = f"{'N.':<3} {'Giorno':<12} {'Data':<6} {'Luogo':<35} {'Orario':<15}"
     if has_bagni:
-        header += " {'Pulizia bagni':<12}"
+        header += f" {'Pulizia bagni':<12}"
     print(header)
     print(sep)
-    for i, shift in enumerate(shifts, 1):
-        day, day_number, location, time = shift[:4]
-        pulizia_bagni = shift[4] if len(shift) > 4 else ""
-        day_display = format_day_for_display(day)
+    for i, (day_display, day_number, location, time, pulizia_bagni) in enumerate(shifts.display_rows(), 1):
         row = f"{i:<3} {day_display:<12} {day_number:<6} {location:<35} {time:<15}"
         if has_bagni:
             row += f" {pulizia_bagni:<12}"
         print(row)
     print(sep)
 
+def modify_shifts(shifts):
+    """Modifica interattiva dei turni da terminale: modifica, aggiunta ed eliminazione di righe."""
+    shifts = shifts.take(range(len(shifts)))
+    while True:
+        print("\n--- OPZIONI ---")
+        print("• Inserisci il numero della riga da modificare")
+        print("• Scrivi 'aggiungi' per aggiungere un nuovo turno")
+        print("• Scrivi 'elimina N' per eliminare la riga N")
+        print("• Scrivi '0' per finire")
+        choice = input("\nCosa vuoi fare? ").strip().lower()
+
+        try:
+            if choice == "0":
+                break
+            elif choice in ("aggiungi", "add", "nuovo"):
+                giorno = DAY_BY_NAME[normalize_day_name(input("Giorno (lunedì, martedì, ...): "))]
+                data = input("Data (numero del giorno): ").strip()
+                luogo = input("Luogo: ").strip() or "Turno"
+                start, end = parse_time_range(input("Orario (es: 08:00-14:00, opzionale): "))
+                pulizia = input("Pulizia bagni (Sì/No, vuoto se non prevista): ").strip()
+                shifts.append(giorno, data, luogo, start, end, CLEANING_BY_LABEL.get(pulizia.capitalize(), Cleaning.NONE))
+                shifts = sort_days(shifts)
+            elif choice.startswith("elimina"):
+                row = int(choice.split()[1]) - 1
+                shifts = shifts.take([i for i in range(len(shifts)) if i != row])
+            else:
+                row = int(choice) - 1
+                if not 0 <= row < len(shifts):
+                    print(f"Numero riga non valido (deve essere tra 1 e {len(shifts)})")
+                    continue
+                old_time = format_time_range(shifts.start[row], shifts.end[row])
+                luogo = input(f"Nuovo luogo (Invio per mantenere '{shifts.location[row]}'): ").strip()
+                orario = input(f"Nuovo orario (Invio per mantenere '{old_time}'): ").strip()
+                pulizia = input("Pulizia bagni (Sì/No, Invio per mantenere): ").strip()
+                if luogo:
+                    shifts.location[row] = luogo
+                if orario:
+                    shifts.start[row], shifts.end[row] = parse_time_range(orario)
+                if pulizia:
+                    shifts.cleaning[row] = CLEANING_BY_LABEL[pulizia.capitalize()]
+        except (ValueError, KeyError, IndexError) as e:
+            print(f"Input non valido: {e}")
+            continue
+        print_shifts(shifts)
+    return shifts
+
 def find_pdf_file():
     pdf_files = []
     for file in glob.glob(os.path.join(os.getcwd(), "*")):
@@ -436,10 +584,153 @@ def find_pdf_file():
             pdf_files.append(file)
     return pdf_files
 
-def main():
-    global DEBUG_MODE
-    DEBUG_MODE = input("Vuoi attivare la modalità debug? (s/n): ").strip().lower() in ['s', 'si', 'sì', 'y', 'yes']
-    if DEBUG_MODE:
+def build_parser():
+    from batch import FORMATS
+    from timetable_image import DEFAULT_WIDTH, WIDTHS
+    parser = argparse.ArgumentParser(
+        description="Estrae i turni personali dal PDF Bar.S.A. "
+                    "Senza file in ingresso parte la modalità interattiva.",
+        epilog="Esempio: python main.py 'servizio custodia*.pdf' -s all -f json -o turni/ -w 4",
+    )
+    parser.add_argument("inputs", nargs="*", help="PDF dei turni, cartelle o pattern glob")
+    parser.add_argument("-s", "--surname", action="append", default=[],
+                        help="cognome da estrarre (ripetibile); 'all' per tutte le persone")
+    parser.add_argument("-o", "--output-dir", default=".", help="cartella di destinazione (default: corrente)")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="pdf", help="formato di uscita (default: pdf)")
+    parser.add_argument("--structure", help="file structure.json da usare al posto del registro/predefinito")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="processi paralleli per più file (default: 1)")
+    parser.add_argument("--per-page", type=int, choices=(1, 2), default=1,
+                        help="con -f booklet: persone per pagina (default: 1)")
+    parser.add_argument("--image-width", type=int, choices=WIDTHS, default=DEFAULT_WIDTH,
+                        help=f"con -f png/webp: larghezza dell'immagine in pixel (default: {DEFAULT_WIDTH})")
+    parser.add_argument("--since", metavar="PDF_PRECEDENTE",
+                        help="revisione precedente dello stesso periodo: rigenera solo le persone con turni cambiati")
+    parser.add_argument("--ics", action="store_true",
+                        help="aggiorna anche i calendari .ics per persona in <output-dir>/ics")
+    parser.add_argument("--check", action="store_true",
+                        help="controlla doppie assegnazioni, giornate troppo lunghe e righe scoperte "
+                             "(codice di uscita 1 se ci sono errori); senza -s non estrae nulla")
+    parser.add_argument("--replace", nargs=2, metavar=("GIORNO", "RIGA"),
+                        help="elenca chi può coprire la riga RIGA della struttura nel GIORNO "
+                             "(es. 'giovedì' o il numero del giorno); senza -s non estrae nulla")
+    parser.add_argument("--debug", action="store_true", help="log di debug su stderr")
+    parser.add_argument("--profile", action="store_true", help="stampa i tempi di ogni fase al termine")
+    parser.add_argument("--log-json", action="store_true", help="log in formato JSON (una riga per evento)")
+    return parser
+
+def run_checks(paths, structure_path=None):
+    """Controlla i PDF e stampa errori e avvisi; ritorna 1 se almeno un PDF ha errori o non si legge."""
+    from checks import check_roster
+    exit_code = 0
+    for path in paths:
+        tables = read_pdf_tables(path)
+        if not tables:
+            print(f"ERRORE {path}: impossibile leggere le tabelle", file=sys.stderr)
+            exit_code = 1
+            continue
+        structure = get_hardcoded_structure(structure_path) if structure_path else resolve_structure(tables)[0]
+        with span("check") as s:
+            result = check_roster(tables, structure)
+            s["items"] = len(result.issues)
+        print(f"{path}: {result.summary()}")
+        for issue in result.errors + result.warnings:
+            person = f"{issue.person}, " if issue.person else ""
+            print(f"  {issue.level.upper()} {issue.kind}: {person}{issue.day}: {issue.detail}")
+        if result.errors:
+            exit_code = 1
+    return exit_code
+
+def run_replacements(paths, day, row, structure_path=None):
+    """Stampa i candidati per coprire un turno in ogni PDF; ritorna 1 se un PDF non si legge o la richiesta non è valida."""
+    from replacements import replacements_for
+    try:
+        row = int(row)
+    except ValueError:
+        print(f"ERRORE: la riga deve essere un numero, non {row!r}", file=sys.stderr)
+        return 2
+    exit_code = 0
+    for path in paths:
+        tables = read_pdf_tables(path)
+        if not tables:
+            print(f"ERRORE {path}: impossibile leggere le tabelle", file=sys.stderr)
+            exit_code = 1
+            continue
+        structure = get_hardcoded_structure(structure_path) if structure_path else resolve_structure(tables)[0]
+        try:
+            label, rows = replacements_for(tables, structure, day, row)
+        except ValueError as e:
+            print(f"ERRORE {path}: {e}", file=sys.stderr)
+            exit_code = 1
+            continue
+        print(f"{path}: {len(rows)} candidati per la riga {row}, {label}")
+        for r in rows:
+            gap = f", stacco {r['Stacco minimo (ore)']:g} ore" if r["Stacco minimo (ore)"] != "" else ""
+            notes = f" [{r['Note']}]" if r["Note"] else ""
+            print(f"  {r['Persona']}: {r['Stato']}; {r['Ore settimana']:g} ore in settimana, "
+                  f"{r['Ore nel giorno']:g} nel giorno{gap}{notes}")
+    return exit_code
+
+def run_cli(args):
+    """Modalità batch: ritorna il codice di uscita (0 ok, 1 errori o cognomi non trovati)."""
+    from batch import expand_inputs, run_batch
+    logs.configure(debug=args.debug, json_output=args.log_json or None)
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("Nessun PDF trovato per gli input indicati.", file=sys.stderr)
+        return 1
+
+    check_code = run_checks(paths, args.structure) if args.check else 0
+    if args.replace:
+        check_code = max(check_code, run_replacements(paths, *args.replace, args.structure))
+    if not args.surname:
+        if args.profile:
+            print("\nPrestazioni:")
+            print(PROFILER.report())
+        return check_code
+
+    previous_tables = None
+    if args.since:
+        if len(paths) != 1:
+            print("--since richiede un solo PDF in ingresso.", file=sys.stderr)
+            return 2
+        previous_tables = read_pdf_tables(args.since)
+        if not previous_tables:
+            print(f"Impossibile leggere le tabelle da {args.since}", file=sys.stderr)
+            return 1
+
+    results = run_batch(paths, args.surname, args.output_dir, args.format, args.structure, args.workers, args.ics,
+                        per_page=args.per_page, previous_tables=previous_tables, image_width=args.image_width)
+    exit_code = 0
+    for result in results:
+        if result.error:
+            print(f"ERRORE {result.path}: {result.error}", file=sys.stderr)
+        else:
+            print(f"{result.path}: {len(set(result.written.values()))} file scritti")
+        if result.diff is not None:
+            print("  Modifiche rispetto alla revisione precedente:")
+            print("    " + result.diff.summary().replace("\n", "\n    "))
+        if result.missing:
+            print(f"  Cognomi non trovati: {', '.join(result.missing)}", file=sys.stderr)
+        if not result.ok:
+            exit_code = 1
+    if args.profile:
+        print("\nPrestazioni:")
+        print(PROFILER.report())
+    return max(exit_code, check_code)
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers deve essere almeno 1")
+    if args.inputs:
+        if not args.surname and not args.check and not args.replace:
+            parser.error("indicare almeno un cognome con -s/--surname (oppure -s all), --check o --replace")
+        return run_cli(args)
+
+    debug_mode = input("Vuoi attivare la modalità debug? (s/n): ").strip().lower() in ['s', 'si', 'sì', 'y', 'yes']
+    logs.configure(debug=debug_mode, json_output=args.log_json or None)
+    if debug_mode:
         print("Modalità debug attivata.")
     print()
 
@@ -468,22 +759,28 @@ def main():
     surname = input("Inserisci il cognome: ").strip()
     tables = read_pdf_tables(pdf_path)
     if tables is None:
-        return
+        return 1
 
-    shifts = extract_shifts_for_person_hardcoded(tables, surname)
+    structure, version, _ = resolve_structure(tables)
+    if version:
+        print(f"Struttura riconosciuta per questo layout: {version}")
+    shifts = extract_shifts_for_person_hardcoded(tables, surname, structure=structure)
     if not shifts:
         print(f"\nNessun turno trovato per {surname}")
-        return
+        return 1
 
     shifts_sorted = sort_days(shifts)
     print_shifts(shifts_sorted)
 
     if input("\nSono necessarie modifiche ai turni? (s/n): ").strip().lower() in ['s', 'si', 'sì', 'y', 'yes']:
-        from main import modify_shifts  # CLI only
         shifts_sorted = modify_shifts(shifts_sorted)
 
     write_shifts_to_pdf(shifts_sorted, pdf_path, surname)
+    if args.profile:
+        print("\nPrestazioni:")
+        print(PROFILER.report())
     input("Premi Invio per uscire...")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
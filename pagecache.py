@@ -0,0 +1,146 @@
+"""
+Cache delle tabelle estratte per pagina.
+
+Ogni pagina del PDF ha un'impronta calcolata con PyMuPDF (content stream
+decompresso e quelli delle Form XObject che disegna, anche annidate,
+dimensioni, rotazione e font usati), molto più economica dell'estrazione
+delle tabelle con pdfplumber. Le pagine con un'impronta già vista, anche
+in un PDF precedente, riusano le tabelle in cache: in una revisione
+corretta si rielabora di solito una sola pagina. Insieme alle tabelle
+viene salvata l'impronta del testo della pagina: se a parità di impronta
+il testo è diverso le tabelle in cache non vengono usate.
+
+La cache è in memoria (LRU) e, se TURNIZIO_PAGE_CACHE indica una cartella,
+anche su disco, un file JSON per pagina, condiviso tra processi.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import logs
+
+log = logs.get_logger("pdf")
+
+MAX_MEMORY_PAGES = 2048
+CACHE_FORMAT = 2  # da incrementare se cambia il modo in cui le tabelle vengono estratte o salvate
+
+PageFingerprint = namedtuple("PageFingerprint", "key text")
+
+
+def load_pymupdf():
+    """
+    Modulo PyMuPDF oppure None se non installato. Le versioni recenti stampano
+    un avviso su stdout importando "fitz", per cui si preferisce "pymupdf".
+    """
+    try:
+        import pymupdf
+        return pymupdf
+    except ImportError:
+        pass
+    try:
+        import fitz
+        return fitz
+    except ImportError:
+        return None
+
+
+def page_fingerprints(source, salt=""):
+    """
+    Impronte delle pagine (lista di PageFingerprint: key per la cache, text
+    del testo della pagina), oppure None se PyMuPDF non è disponibile o il
+    file non si apre: in quel caso si estraggono tutte le pagine.
+    source è un percorso, dei byte o un documents.Document.
+    """
+    from documents import DOCUMENTS, source_name
+
+    if load_pymupdf() is None:
+        return None
+    try:
+        document = DOCUMENTS.open(source)
+        with document.lock:
+            fingerprints = []
+            doc = document.fitz()
+            for page in doc:
+                digest = hashlib.sha1(f"{CACHE_FORMAT}|{salt}|{tuple(page.rect)}|{page.rotation}".encode())
+                for font in page.get_fonts():
+                    digest.update(repr(font[1:]).encode())  # senza xref, che cambia tra file
+                digest.update(page.read_contents())
+                # Form XObject usate dalla pagina, comprese quelle annidate (show_pdf_page, moduli)
+                for xref, name, _, bbox in page.get_xobjects():
+                    digest.update(f"|{name}|{tuple(bbox)}|".encode())
+                    digest.update(doc.xref_stream(xref) or b"")
+                text = hashlib.sha1(page.get_text("text").encode()).hexdigest()
+                fingerprints.append(PageFingerprint(digest.hexdigest(), text))
+            return fingerprints
+    except Exception as e:
+        logs.event(log, logging.WARNING, "impronta pagine non calcolabile", path=source_name(source), error=str(e))
+        return None
+
+
+class PageTableCache:
+    def __init__(self, directory=None, max_pages=MAX_MEMORY_PAGES):
+        self._directory = directory
+        self.max_pages = max_pages
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        """Cartella su disco: quella data al costruttore, altrimenti TURNIZIO_PAGE_CACHE (letta al momento)."""
+        return self._directory or os.environ.get("TURNIZIO_PAGE_CACHE") or None
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, f"{fingerprint}.json")
+
+    def get(self, fingerprint):
+        """Tabelle della pagina (PageFingerprint), oppure None anche se il testo salvato è diverso."""
+        with self._lock:
+            entry = self._pages.get(fingerprint.key)
+            if entry is not None:
+                self._pages.move_to_end(fingerprint.key)
+        if entry is None and self.directory:
+            try:
+                with open(self._path(fingerprint.key), "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                entry = (saved["testo"], saved["tabelle"])
+            except (OSError, ValueError, KeyError, TypeError):
+                return None
+            self._remember(fingerprint.key, entry)
+        if entry is None:
+            return None
+        text, tables = entry
+        if text != fingerprint.text:
+            logs.event(log, logging.WARNING, "impronta uguale ma testo diverso, pagina rielaborata",
+                       fingerprint=fingerprint.key)
+            return None
+        return tables
+
+    def put(self, fingerprint, tables):
+        self._remember(fingerprint.key, (fingerprint.text, tables))
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(fingerprint.key)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"testo": fingerprint.text, "tabelle": tables}, f, ensure_ascii=False)
+                os.replace(tmp, path)
+            except OSError as e:
+                logs.event(log, logging.WARNING, "cache pagine non scrivibile", directory=self.directory, error=str(e))
+
+    def _remember(self, fingerprint, entry):
+        with self._lock:
+            self._pages[fingerprint] = entry
+            self._pages.move_to_end(fingerprint)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+PAGE_CACHE = PageTableCache()
@@ -0,0 +1,196 @@
+"""
+Anteprima delle pagine PDF come immagini o come SVG.
+
+Senza dipendenze da Streamlit, così la rasterizzazione può girare in un
+processo di lavoro separato (vedi sandbox.py) e restituire solo l'HTML.
+Le pagine SVG si ingrandiscono nel browser (svg_viewer_html) senza
+ricalcoli sul server e restano nitide a ogni livello di zoom.
+Il PDF (percorso, byte o documents.Document) viene aperto da DOCUMENTS:
+le anteprime successive dello stesso file non lo rileggono né lo riaprono.
+"""
+import base64
+import io
+import re
+
+from documents import DOCUMENTS
+from pagecache import load_pymupdf
+from profiling import span
+
+HIGHLIGHT_FILL = (255, 230, 0, 150)
+
+
+def normalize_token(s):
+    s = s.strip()
+    s = re.sub(r"[^\wÀ-ÖØ-öø-ÿ]+", "", s, flags=re.UNICODE)
+    return s.lower()
+
+
+def highlight_tokens(highlight_text):
+    if not highlight_text:
+        return []
+    return [normalize_token(t) for t in highlight_text.strip().split() if normalize_token(t)]
+
+
+def highlight_rects(page, target_tokens):
+    """
+    Rettangoli (in punti PDF) delle sequenze di parole uguali al testo cercato;
+    se la sequenza intera non c'è, delle parole uguali al primo token.
+    """
+    rects = []
+    words = page.get_text("words")
+    n, m = len(words), len(target_tokens)
+    for idx in range(n - m + 1):
+        if all(normalize_token(words[idx + k][4]) == target_tokens[k] for k in range(m)):
+            rects.append((
+                min(words[idx + k][0] for k in range(m)),
+                min(words[idx + k][1] for k in range(m)),
+                max(words[idx + k][2] for k in range(m)),
+                max(words[idx + k][3] for k in range(m)),
+            ))
+    if not rects:
+        rects = [tuple(w[:4]) for w in words if normalize_token(w[4]) == target_tokens[0]]
+    return rects
+
+
+def rasterize_pdf(source, dpi, highlight_text=None, progress=None):
+    """
+    Pagine del PDF come tag <img> HTML, con il testo cercato evidenziato.
+    Chiama progress(fatte, totale) dopo ogni pagina.
+    """
+    fitz = load_pymupdf()
+
+    with span("render.open"):
+        document = DOCUMENTS.open(source)
+        document.fitz()
+    mat = fitz.Matrix(dpi / 72.0, dpi / 72.0)
+    target_tokens = highlight_tokens(highlight_text)
+
+    with document.lock:
+        return _rasterize_pages(document.fitz(), mat, target_tokens, progress)
+
+
+def _rasterize_pages(doc, mat, target_tokens, progress):
+    from PIL import Image, ImageDraw
+    fitz = load_pymupdf()
+
+    html_images = []
+    for i in range(doc.page_count):
+        with span("render.page", items=1):
+            page = doc.load_page(i)
+            pix = page.get_pixmap(matrix=mat, alpha=False)
+            mode = "RGB" if pix.n < 4 else "RGBA"
+            img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
+
+            if target_tokens:
+                overlay = Image.new("RGBA", img.size, (255, 255, 255, 0))
+                draw = ImageDraw.Draw(overlay)
+                for r in highlight_rects(page, target_tokens):
+                    rect = fitz.Rect(r) * mat
+                    draw.rectangle([rect.x0, rect.y0, rect.x1, rect.y1], fill=HIGHLIGHT_FILL)
+                img = Image.alpha_composite(img.convert("RGBA"), overlay)
+
+            buffered = io.BytesIO()
+            img.save(buffered, format="PNG")
+            img_str = base64.b64encode(buffered.getvalue()).decode()
+            html_images.append(f'<img src="data:image/png;base64,{img_str}" style="width:100%; margin-bottom:10px; border-radius:4px; display:block;">')
+        if progress:
+            progress(i + 1, doc.page_count)
+    return html_images
+
+
+def vectorize_pdf(source, highlight_text=None, progress=None):
+    """
+    Pagine del PDF come elementi <svg> (testo come testo, non come tracciati),
+    con il testo cercato evidenziato. Chiama progress(fatte, totale) dopo ogni pagina.
+    """
+    with span("render.open"):
+        document = DOCUMENTS.open(source)
+        document.fitz()
+    target_tokens = highlight_tokens(highlight_text)
+
+    with document.lock:
+        return _vectorize_pages(document.fitz(), target_tokens, progress)
+
+
+def _vectorize_pages(doc, target_tokens, progress):
+    r, g, b, a = HIGHLIGHT_FILL
+    pages = []
+    for i in range(doc.page_count):
+        with span("render.svg", items=1):
+            page = doc.load_page(i)
+            svg = page.get_svg_image(text_as_path=False)
+            if target_tokens:
+                # il viewBox è in punti PDF, con l'origine in alto a sinistra come le parole
+                marks = "".join(
+                    f'<rect x="{x0:.2f}" y="{y0:.2f}" width="{x1 - x0:.2f}" height="{y1 - y0:.2f}" '
+                    f'fill="rgb({r},{g},{b})" fill-opacity="{a / 255:.2f}"/>'
+                    for x0, y0, x1, y1 in highlight_rects(page, target_tokens)
+                )
+                svg = svg.replace("</svg>", marks + "</svg>", 1)
+            pages.append(svg)
+        if progress:
+            progress(i + 1, doc.page_count)
+    return pages
+
+
+def svg_viewer_html(pages, height=800):
+    """
+    Documento HTML autonomo con le pagine SVG e zoom/spostamento gestiti nel
+    browser: pulsanti + e -, Ctrl+rotella sul punto indicato, trascinamento.
+    """
+    body = "".join(f'<div class="page">{svg}</div>' for svg in pages)
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><style>
+  body {{ margin: 0; font-family: sans-serif; }}
+  .bar {{ display: flex; gap: 6px; align-items: center; padding: 4px 0; }}
+  .bar button {{ min-width: 32px; padding: 2px 8px; cursor: pointer; }}
+  #view {{ height: {height - 40}px; overflow: auto; border: 1px solid #ddd; border-radius: 4px; cursor: grab; }}
+  #view.drag {{ cursor: grabbing; user-select: none; }}
+  #pages {{ width: 100%; margin: 0 auto; }}
+  .page {{ background: white; margin-bottom: 10px; }}
+  .page svg {{ width: 100%; height: auto; display: block; }}
+</style></head><body>
+<div class="bar">
+  <button id="out" title="Riduci">−</button>
+  <span id="level">100%</span>
+  <button id="in" title="Ingrandisci">+</button>
+  <button id="fit" title="Adatta alla larghezza">Adatta</button>
+</div>
+<div id="view"><div id="pages">{body}</div></div>
+<script>
+  const view = document.getElementById("view"), pages = document.getElementById("pages");
+  const label = document.getElementById("level");
+  let zoom = 100;
+  function setZoom(value, cx, cy) {{
+    value = Math.min(800, Math.max(50, Math.round(value)));
+    const ratio = value / zoom;
+    if (cx === undefined) {{ cx = view.clientWidth / 2; cy = view.clientHeight / 2; }}
+    const x = view.scrollLeft + cx, y = view.scrollTop + cy;
+    zoom = value;
+    pages.style.width = zoom + "%";
+    label.textContent = zoom + "%";
+    view.scrollLeft = x * ratio - cx;
+    view.scrollTop = y * ratio - cy;
+  }}
+  document.getElementById("in").onclick = () => setZoom(zoom * 1.25);
+  document.getElementById("out").onclick = () => setZoom(zoom / 1.25);
+  document.getElementById("fit").onclick = () => setZoom(100);
+  view.addEventListener("wheel", (e) => {{
+    if (!e.ctrlKey) return;
+    e.preventDefault();
+    const box = view.getBoundingClientRect();
+    setZoom(zoom * Math.exp(-e.deltaY / 300), e.clientX - box.left, e.clientY - box.top);
+  }}, {{ passive: false }});
+  let start = null;
+  view.addEventListener("pointerdown", (e) => {{
+    start = {{ x: e.clientX, y: e.clientY, left: view.scrollLeft, top: view.scrollTop }};
+    view.classList.add("drag");
+  }});
+  window.addEventListener("pointermove", (e) => {{
+    if (!start) return;
+    view.scrollLeft = start.left - (e.clientX - start.x);
+    view.scrollTop = start.top - (e.clientY - start.y);
+  }});
+  window.addEventListener("pointerup", () => {{ start = null; view.classList.remove("drag"); }});
+</script>
+</body></html>"""
@@ -0,0 +1,125 @@
+"""
+Misure di tempo per le fasi della pipeline.
+
+Ogni fase viene racchiusa in uno span che registra durata e numero di
+elementi elaborati. Le statistiche sono totali di processo (chiamate,
+tempo complessivo, massimo, elementi) e costano un perf_counter() e un
+lock per span, quindi possono restare sempre attive.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+STAGE_LABELS = {
+    "pdf.fingerprint": "Impronta pagine",
+    "pdf.open": "Apertura PDF",
+    "pdf.page_tables": "Estrazione tabelle (per pagina)",
+    "pdf.page_reused": "Pagine riusate dalla cache",
+    "header": "Riconoscimento header",
+    "match": "Ricerca turni",
+    "sort": "Ordinamento",
+    "check": "Controllo turni",
+    "pdf.write": "Scrittura PDF",
+    "pdf.booklet": "Scrittura libretto",
+    "image.write": "Scrittura immagine",
+    "render.open": "Apertura PDF (anteprima)",
+    "render.page": "Rasterizzazione (per pagina)",
+    "render.svg": "Pagine SVG (per pagina)",
+}
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}  # nome -> [chiamate, secondi totali, secondi max, elementi]
+
+    def record(self, name, seconds, items=0):
+        with self._lock:
+            stat = self._stats.get(name)
+            if stat is None:
+                self._stats[name] = [1, seconds, seconds, items]
+            else:
+                stat[0] += 1
+                stat[1] += seconds
+                if seconds > stat[2]:
+                    stat[2] = seconds
+                stat[3] += items
+
+    @contextmanager
+    def span(self, name, items=0):
+        """
+        with span("match") as s:
+            ...
+            s["items"] = len(risultati)
+        """
+        info = {"items": items}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.record(name, time.perf_counter() - start, info["items"])
+
+    def snapshot(self):
+        """Copia serializzabile delle statistiche (per raccoglierle dai processi worker)."""
+        with self._lock:
+            return {name: list(stat) for name, stat in self._stats.items()}
+
+    def since(self, before):
+        """
+        Statistiche registrate dopo lo snapshot before, nello stesso formato:
+        così una funzione misura il proprio lavoro senza azzerare quelle degli altri.
+        Il massimo è quello complessivo della fase (un limite superiore).
+        """
+        delta = {}
+        for name, (calls, total, peak, items) in self.snapshot().items():
+            old_calls, old_total, _, old_items = before.get(name, (0, 0.0, 0.0, 0))
+            if calls > old_calls:
+                delta[name] = [calls - old_calls, total - old_total, peak, items - old_items]
+        return delta
+
+    def merge(self, snapshot):
+        with self._lock:
+            for name, (calls, total, peak, items) in snapshot.items():
+                stat = self._stats.setdefault(name, [0, 0.0, 0.0, 0])
+                stat[0] += calls
+                stat[1] += total
+                stat[2] = max(stat[2], peak)
+                stat[3] += items
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self):
+        """Lista di dict per fase, ordinata per tempo totale decrescente."""
+        with self._lock:
+            items = [(name, list(stat)) for name, stat in self._stats.items()]
+        rows = []
+        for name, (calls, total, peak, count) in sorted(items, key=lambda x: -x[1][1]):
+            rows.append({
+                "Fase": STAGE_LABELS.get(name, name),
+                "Chiamate": calls,
+                "Totale (ms)": round(total * 1000, 2),
+                "Media (ms)": round(total * 1000 / calls, 2),
+                "Max (ms)": round(peak * 1000, 2),
+                "Elementi": count,
+            })
+        return rows
+
+    def report(self):
+        """Tabella testuale per la CLI."""
+        rows = self.summary()
+        if not rows:
+            return "Nessuna misura registrata."
+        lines = [f"{'Fase':<34} {'Chiamate':>8} {'Totale ms':>10} {'Media ms':>9} {'Max ms':>9} {'Elementi':>9}"]
+        lines.append("-" * len(lines[0]))
+        for r in rows:
+            lines.append(
+                f"{r['Fase']:<34} {r['Chiamate']:>8} {r['Totale (ms)']:>10.2f} "
+                f"{r['Media (ms)']:>9.2f} {r['Max (ms)']:>9.2f} {r['Elementi']:>9}"
+            )
+        return "\n".join(lines)
+
+
+PROFILER = Profiler()
+span = PROFILER.span
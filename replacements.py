@@ -0,0 +1,130 @@
+"""
+Ricerca dei sostituti per un turno scoperto.
+
+Dato un giorno e una riga della struttura, i candidati vengono cercati negli
+indici di checks.OccupancyIndex (occupazione persone × fasce e tipi di
+turno per persona e giorno) con operazioni sull'intera matrice, senza
+rileggere i turni di ogni collega. Sono esclusi:
+
+    chi ha già un turno che si sovrappone (compreso chi il turno ce l'ha)
+    chi quel giorno è in ferie, in malattia o in permesso
+
+Gli altri sono ordinati: prima chi rispetta il massimo di ore nel giorno e
+le 11 ore di riposo tra giorni diversi, poi chi quel giorno non è di
+riposo, poi chi ha meno ore nella settimana.
+"""
+import numpy as np
+
+from checks import MAX_DAY_HOURS, SLOT_MINUTES, SLOTS_PER_DAY, OccupancyIndex, shift_bitmaps
+from shifts import DAY_BY_NAME, DAY_DISPLAY_NAMES, NO_TIME, format_time_range
+from structure import ShiftKind
+
+MIN_REST_HOURS = 11
+
+ABSENT_KINDS = (ShiftKind.LEAVE, ShiftKind.SICK, ShiftKind.PERMIT)
+REST_KINDS = (ShiftKind.REST, ShiftKind.SECOND_REST)
+
+COLUMNS = ("Persona", "Stato", "Ore settimana", "Ore nel giorno", "Stacco minimo (ore)", "Note")
+
+
+def _mask(kinds):
+    return sum(1 << int(kind) for kind in kinds)
+
+
+def shift_rows(compiled):
+    """Righe della struttura sostituibili: [(indice, "Luogo HH:MM-HH:MM")] dei turni di lavoro con orario."""
+    return [
+        (row, f"{compiled.location[row]} {format_time_range(compiled.start[row], compiled.end[row])}")
+        for row in range(compiled.fallback)
+        if compiled.mapped[row] and compiled.kind[row] == ShiftKind.WORK and compiled.start[row] != NO_TIME
+    ]
+
+
+def parse_day(text, header_days):
+    """
+    Giorno della settimana (0 = lunedì) da "giovedì", "giovedi", "gio",
+    "giovedì 9" o dal numero del giorno nell'header del PDF.
+    """
+    text = text.strip().lower()
+    for name, number in header_days:
+        if text == str(number).strip():
+            return int(DAY_BY_NAME[name])
+    word = text.split()[0] if text else ""
+    for i, name in enumerate(DAY_DISPLAY_NAMES):
+        plain = name.rstrip("ì") + "i"
+        if word and (name.startswith(word) or plain.startswith(word)) and len(word) >= 3:
+            return i
+    raise ValueError(f"giorno non riconosciuto: {text!r}")
+
+
+def find_replacements(index, day, row, max_day_hours=MAX_DAY_HOURS):
+    """
+    Candidati per coprire la riga row della struttura nel giorno day (0 = lunedì):
+    righe con le chiavi di COLUMNS, già ordinate.
+    """
+    compiled = index.compiled
+    if not any(r == row for r, _ in shift_rows(compiled)):
+        raise ValueError(f"la riga {row} non è un turno di lavoro con orario")
+    target = shift_bitmaps(np.asarray([day]), np.asarray([compiled.start[row]]), np.asarray([compiled.end[row]]))[0]
+    first = int(target.argmax())
+    last = len(target) - int(target[::-1].argmax())  # fascia dopo la fine del turno
+
+    busy = index.grid > 0
+    kinds = index.day_kinds[:, day]
+    candidate = ~(busy & target).any(axis=1) & (kinds & _mask(ABSENT_KINDS) == 0)
+
+    occ = index.occ
+    week_hours = np.bincount(index.person, weights=occ.end[index.timed] - occ.start[index.timed],
+                             minlength=len(index.names)) / 60
+    day_slots = slice(day * SLOTS_PER_DAY, (day + 1) * SLOTS_PER_DAY)
+    day_hours = (busy[:, day_slots] | target[day_slots]).sum(axis=1) * SLOT_MINUTES / 60
+
+    # stacco dal turno precedente e dal successivo, in fasce; il giorno del turno vicino decide se conta il riposo
+    before, after = busy[:, :first], busy[:, last:]
+    prev_end = first - before[:, ::-1].argmax(axis=1)  # fascia dopo l'ultima occupata prima del turno
+    next_start = last + after.argmax(axis=1)
+    has_prev, has_next = before.any(axis=1), after.any(axis=1)
+    gap_prev = np.where(has_prev, first - prev_end, np.iinfo(np.int64).max)
+    gap_next = np.where(has_next, next_start - last, np.iinfo(np.int64).max)
+    short_prev = has_prev & ((prev_end - 1) // SLOTS_PER_DAY != first // SLOTS_PER_DAY) & (gap_prev * SLOT_MINUTES < MIN_REST_HOURS * 60)
+    short_next = has_next & (next_start // SLOTS_PER_DAY != (last - 1) // SLOTS_PER_DAY) & (gap_next * SLOT_MINUTES < MIN_REST_HOURS * 60)
+    gap = np.minimum(gap_prev, gap_next)
+
+    shifts_today = {}
+    for i in np.flatnonzero(occ.weekday[index.timed] == day):
+        shifts_today.setdefault(int(index.person[i]), []).append(index.shift_label(i))
+
+    rows = []
+    for p in np.flatnonzero(candidate):
+        notes = []
+        if day_hours[p] > max_day_hours:
+            notes.append(f"oltre {max_day_hours} ore nel giorno")
+        if short_prev[p] or short_next[p]:
+            notes.append(f"meno di {MIN_REST_HOURS} ore di riposo")
+        resting = bool(kinds[p] & _mask(REST_KINDS))
+        if int(p) in shifts_today:
+            state = "in turno: " + ", ".join(shifts_today[int(p)])
+        elif kinds[p] & (1 << ShiftKind.SECOND_REST):
+            state = "secondo riposo"
+        elif resting:
+            state = "riposo"
+        else:
+            state = "libero"
+        rows.append(((bool(notes), resting, week_hours[p], index.names[p]), {
+            "Persona": index.names[p],
+            "Stato": state,
+            "Ore settimana": round(float(week_hours[p]), 2),
+            "Ore nel giorno": round(float(day_hours[p]), 2),
+            "Stacco minimo (ore)": round(gap[p] * SLOT_MINUTES / 60, 2) if gap[p] != np.iinfo(np.int64).max else "",
+            "Note": "; ".join(notes),
+        }))
+    rows.sort(key=lambda item: item[0])
+    return [row for _, row in rows]
+
+
+def replacements_for(tables, structure, day, row, max_day_hours=MAX_DAY_HOURS):
+    """Come find_replacements, costruendo l'indice dalle tabelle; day può essere testo (vedi parse_day)."""
+    index = OccupancyIndex(tables, structure)
+    if isinstance(day, str):
+        day = parse_day(day, index.header_days)
+    return index.labels.get(day, DAY_DISPLAY_NAMES[day]), find_replacements(index, day, row, max_day_hours)
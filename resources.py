@@ -0,0 +1,270 @@
+"""
+Memoria e file temporanei delle sessioni dell'app.
+
+Gli artefatti grandi di ogni sessione (PDF caricato, PDF generato, righe
+di debug) e la cache delle tabelle estratte per hash del contenuto sono
+tenuti qui invece che in st.session_state, con la dimensione in byte di
+ciascuno. Oltre il budget globale vengono scartati gli artefatti usati
+meno di recente: sono tutti ricostruibili (dal file temporaneo, dalla
+cache o rigenerando il PDF). I file temporanei sono indirizzati per hash,
+condivisi tra le sessioni che caricano lo stesso PDF e cancellati quando
+l'ultima sessione che li usa termina o scade.
+
+Configurazione da variabili d'ambiente:
+    TURNIZIO_MEMORY_MB=512        budget globale della memoria (MB)
+    TURNIZIO_SESSION_TTL=3600     secondi di inattività prima di chiudere una sessione
+"""
+import atexit
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import logs
+
+log = logs.get_logger("resources")
+
+SHARED = None  # "sessione" degli artefatti condivisi (cache per hash)
+
+DEFAULT_BUDGET_MB = 512
+DEFAULT_SESSION_TTL = 3600
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def tables_key(digest):
+    """Chiave delle tabelle di un PDF nella cache condivisa."""
+    return f"tabelle:{digest[:12]}"
+
+
+def estimate_size(value):
+    """Stima in byte di bytes/str e di liste, tuple e dict annidati (es. tabelle pdfplumber)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(v) for v in value)
+    return size
+
+
+class _Session:
+    __slots__ = ("artefacts", "temp_files", "last_seen")
+
+    def __init__(self, now):
+        self.artefacts = {}     # nome -> (valore, byte, ultimo accesso)
+        self.temp_files = set()  # hash dei PDF su disco usati dalla sessione
+        self.last_seen = now
+
+
+class ResourceManager:
+    def __init__(self, budget_bytes, session_ttl, temp_dir=None):
+        self.budget_bytes = budget_bytes
+        self.session_ttl = session_ttl
+        self._temp_dir = temp_dir
+        self._owns_temp_dir = temp_dir is None
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._used = 0
+        self.evictions = 0
+
+    # ── Artefatti in memoria ─────────────────────────────────────────────────
+    def _session(self, session_id, now=None):
+        now = time.monotonic() if now is None else now
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session(now)
+        session.last_seen = now
+        return session
+
+    def put(self, session_id, name, value):
+        with self._lock:
+            now = time.monotonic()
+            session = self._session(session_id, now)
+            self._discard(session, name)
+            size = estimate_size(value)
+            session.artefacts[name] = (value, size, now)
+            self._used += size
+            self._evict(keep=(session_id, name))
+        return value
+
+    def put_if_open(self, session_id, name, value):
+        """
+        Come put, ma solo se la sessione non è stata chiusa nel frattempo (per i
+        risultati dei lavori in background, che possono finire dopo la scadenza).
+        Ritorna True se il valore è stato salvato.
+        """
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self.put(session_id, name, value)
+            return True
+
+    def get(self, session_id, name):
+        """Valore dell'artefatto, oppure None se assente o scartato."""
+        with self._lock:
+            now = time.monotonic()
+            session = self._session(session_id, now)
+            entry = session.artefacts.get(name)
+            if entry is None:
+                return None
+            session.artefacts[name] = (entry[0], entry[1], now)
+            return entry[0]
+
+    def get_or_create(self, session_id, name, factory):
+        """Ritorna l'artefatto; se manca (o è stato scartato) lo ricrea con factory()."""
+        value = self.get(session_id, name)
+        if value is None:
+            value = factory()
+            if value is not None:
+                self.put(session_id, name, value)
+        return value
+
+    def drop(self, session_id, name):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._discard(session, name)
+
+    def _discard(self, session, name):
+        entry = session.artefacts.pop(name, None)
+        if entry is not None:
+            self._used -= entry[1]
+
+    def _evict(self, keep):
+        """Scarta gli artefatti usati meno di recente finché non si rientra nel budget."""
+        if self._used <= self.budget_bytes:
+            return
+        candidates = sorted(
+            (
+                (last_used, session_id, name, size)
+                for session_id, session in self._sessions.items()
+                for name, (_, size, last_used) in session.artefacts.items()
+                if (session_id, name) != keep
+            ),
+            key=lambda c: c[0],
+        )
+        for _, session_id, name, size in candidates:
+            if self._used <= self.budget_bytes:
+                break
+            self._discard(self._sessions[session_id], name)
+            self.evictions += 1
+            logs.event(log, logging.INFO, "artefatto scartato", session=str(session_id)[:8], name=name, bytes=size)
+
+    # ── File temporanei ──────────────────────────────────────────────────────
+    @property
+    def temp_dir(self):
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.mkdtemp(prefix="turnizio-")
+        return self._temp_dir
+
+    def temp_pdf(self, session_id, data, digest=None):
+        """
+        Percorso di un file temporaneo con il contenuto di data, condiviso tra le sessioni.
+        Il file precedente della sessione viene rilasciato.
+        """
+        digest = digest or content_hash(data)
+        path = os.path.join(self.temp_dir, f"{digest}.pdf")
+        with self._lock:
+            session = self._session(session_id)
+            if not os.path.exists(path):
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            for old in session.temp_files - {digest}:
+                self._release_temp(session_id, old)
+            session.temp_files = {digest}
+        return path
+
+    def _release_temp(self, session_id, digest):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.temp_files.discard(digest)
+        if any(digest in s.temp_files for s in self._sessions.values()):
+            return
+        try:
+            os.remove(os.path.join(self.temp_dir, f"{digest}.pdf"))
+        except FileNotFoundError:
+            pass
+
+    # ── Ciclo di vita delle sessioni ─────────────────────────────────────────
+    def end_session(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            for name in list(session.artefacts):
+                self._discard(session, name)
+            for digest in list(session.temp_files):
+                self._release_temp(session_id, digest)
+            del self._sessions[session_id]
+
+    def expire(self, is_active=None, now=None):
+        """
+        Chiude le sessioni inattive da più di session_ttl secondi e, se is_active
+        è dato, quelle che il server non considera più attive.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [
+                session_id for session_id, session in self._sessions.items()
+                if session_id is not SHARED and (
+                    now - session.last_seen > self.session_ttl
+                    or (is_active is not None and not is_active(session_id))
+                )
+            ]
+            for session_id in expired:
+                self.end_session(session_id)
+        for session_id in expired:
+            logs.event(log, logging.INFO, "sessione chiusa", session=str(session_id)[:8])
+        return expired
+
+    def cleanup(self):
+        """Libera tutto; la cartella temporanea viene rimossa se creata da noi."""
+        with self._lock:
+            for session_id in list(self._sessions):
+                self.end_session(session_id)
+            if self._owns_temp_dir and self._temp_dir is not None:
+                shutil.rmtree(self._temp_dir, ignore_errors=True)
+                self._temp_dir = None
+
+    # ── Report ───────────────────────────────────────────────────────────────
+    @property
+    def used_bytes(self):
+        return self._used
+
+    def usage(self, now=None):
+        """Una riga per sessione (la cache condivisa compare come "condivisa")."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return [
+                {
+                    "Sessione": "condivisa" if session_id is SHARED else str(session_id)[:8],
+                    "Artefatti": ", ".join(sorted(session.artefacts)) or "-",
+                    "Memoria (MB)": round(sum(s for _, s, _ in session.artefacts.values()) / 2**20, 2),
+                    "File temporanei": len(session.temp_files),
+                    "Inattiva da (s)": int(now - session.last_seen),
+                }
+                for session_id, session in self._sessions.items()
+            ]
+
+
+def _env_number(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+RESOURCES = ResourceManager(
+    budget_bytes=int(_env_number("TURNIZIO_MEMORY_MB", DEFAULT_BUDGET_MB) * 2**20),
+    session_ttl=_env_number("TURNIZIO_SESSION_TTL", DEFAULT_SESSION_TTL),
+)
+atexit.register(RESOURCES.cleanup)
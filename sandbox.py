@@ -0,0 +1,299 @@
+"""
+Processi di lavoro isolati per leggere e rasterizzare i PDF caricati.
+
+Un PDF malformato o enorme non deve bloccare né far esaurire la memoria al
+server Streamlit condiviso: pdfplumber e PyMuPDF girano in un piccolo pool
+di sottoprocessi, ognuno con limiti propri:
+
+    TURNIZIO_SANDBOX_WORKERS     processi (default 2; 0 = tutto nel processo corrente)
+    TURNIZIO_SANDBOX_CPU         secondi di CPU per lavoro (default 60)
+    TURNIZIO_SANDBOX_MEMORY_MB   memoria oltre quella di partenza del processo (default 1024)
+    TURNIZIO_SANDBOX_TIMEOUT     secondi di attesa per lavoro (default 120)
+    TURNIZIO_SANDBOX_MAX_JOBS    lavori dopo i quali il processo viene sostituito (default 50)
+
+Ogni processo occupa un posto fisso del pool. Un lavoro con affinity (ad
+esempio l'hash del PDF) va sempre nello stesso posto, così lettura,
+anteprime e debug dello stesso file trovano il documento già aperto nella
+cache del processo (documents.DOCUMENTS); gli altri prendono il primo
+posto libero.
+
+Quando un limite scatta il processo viene terminato e sostituito al lavoro
+successivo; chi ha chiesto il lavoro riceve SandboxError con un messaggio
+da mostrare all'utente. Se invece è la funzione a sollevare un'eccezione
+l'errore arriva allo stesso modo, ma il processo (con la sua cache) resta.
+I limiti di CPU e memoria usano setrlimit e valgono solo dove esiste il
+modulo resource (Linux, macOS); su Windows, dove la pipe non si può passare
+al sottoprocesso, si lavora nel processo corrente.
+"""
+import atexit
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from multiprocessing.connection import Connection, Pipe
+
+import logs
+from profiling import PROFILER
+
+try:
+    import resource
+except ImportError:  # Windows: resta solo il limite di tempo
+    resource = None
+
+log = logs.get_logger("sandbox")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PRELOAD = ("pdfplumber", "pymupdf", "PIL.Image")
+
+
+class SandboxError(Exception):
+    """Lavoro non completato; il messaggio è pensato per l'utente."""
+
+
+class _JobFailed(SandboxError):
+    """La funzione ha sollevato un'eccezione: il processo ha risposto ed è ancora utilizzabile."""
+
+
+def _set_soft_limit(kind, value):
+    _, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(kind, (value, hard))
+
+
+def _address_space():
+    """Memoria virtuale attuale del processo in byte, oppure 0 se non leggibile."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _worker_main(fd, cpu_seconds, memory_bytes):
+    """Ciclo del sottoprocesso: riceve (funzione, args, kwargs, con_progress) e risponde sulla pipe."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C al server: chiude il padre, non il lavoro a metà
+    conn = Connection(fd)
+    sys.path[:] = conn.recv()  # per importare le funzioni ricevute come le importa il padre
+    logs.configure()
+    for name in PRELOAD:  # caricati prima di fissare il limite: contano nella memoria di partenza
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    if resource is not None and memory_bytes:
+        _set_soft_limit(resource.RLIMIT_AS, _address_space() + memory_bytes)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        except Exception as e:  # funzione non importabile qui
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+            continue
+        if message is None:
+            return
+        fn, args, kwargs, with_progress = message
+        if resource is not None and cpu_seconds:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            # SIGXCPU termina il processo quando il lavoro supera i suoi secondi
+            _set_soft_limit(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime) + cpu_seconds)
+        if with_progress:
+            kwargs["progress"] = lambda done, total: conn.send(("progress", done, total))
+        before = PROFILER.snapshot()
+        try:
+            result = fn(*args, **kwargs)
+            conn.send(("result", result, PROFILER.since(before)))  # gli span del lavoro tornano al padre
+        except MemoryError:
+            conn.send(("memory",))
+            return  # lo stato del processo non è più affidabile
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    """
+    Sottoprocesso avviato con "python -c" e collegato con una pipe ereditata.
+    Non si usa multiprocessing: sotto Streamlit __main__ è app.py, e il metodo
+    spawn lo rieseguirebbe in ogni processo; fork invece copierebbe i thread
+    del server a metà operazione.
+    """
+
+    def __init__(self, cpu_seconds, memory_bytes):
+        self.conn, child = Pipe()
+        code = f"import sandbox; sandbox._worker_main({child.fileno()}, {cpu_seconds}, {memory_bytes})"
+        self.process = subprocess.Popen([sys.executable, "-c", code], cwd=HERE, pass_fds=[child.fileno()])
+        child.close()
+        self.conn.send(sys.path)
+        self.jobs = 0
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.conn.close()
+
+
+class SandboxPool:
+    def __init__(self, workers=2, cpu_seconds=60, memory_mb=1024, timeout=120, max_jobs=50):
+        self.workers = workers
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_mb * 2**20
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self._free = threading.Condition()
+        self._busy = set()  # posti con un lavoro in corso
+        self._workers = [None] * max(workers, 1)  # processo di ogni posto, avviato al primo lavoro
+        atexit.register(self.shutdown)
+
+    @classmethod
+    def from_env(cls):
+        def env(name, default):
+            try:
+                return int(os.environ.get(name, default))
+            except ValueError:
+                return default
+
+        return cls(
+            workers=env("TURNIZIO_SANDBOX_WORKERS", 2),
+            cpu_seconds=env("TURNIZIO_SANDBOX_CPU", 60),
+            memory_mb=env("TURNIZIO_SANDBOX_MEMORY_MB", 1024),
+            timeout=env("TURNIZIO_SANDBOX_TIMEOUT", 120),
+            max_jobs=env("TURNIZIO_SANDBOX_MAX_JOBS", 50),
+        )
+
+    def run(self, fn, *args, progress=None, affinity=None, **kwargs):
+        """
+        Esegue fn(*args, **kwargs) in un processo di lavoro e ne ritorna il risultato.
+        fn deve essere una funzione di modulo (viene passata per nome); se progress
+        è indicata, fn la riceve come parola chiave e gli avanzamenti arrivano qui.
+        I lavori con la stessa affinity (stringa) vanno sempre allo stesso processo.
+        """
+        if self.workers <= 0 or os.name == "nt":
+            return fn(*args, progress=progress, **kwargs) if progress else fn(*args, **kwargs)
+        slot = self._acquire(affinity)
+        try:
+            worker = self._take(slot)
+            try:
+                result = self._execute(worker, fn, args, kwargs, progress)
+            except _JobFailed:
+                self._finished(slot, worker)  # errore della funzione: il processo resta al suo posto
+                raise
+            except BaseException:
+                self._discard(slot, kill=True)  # processo oltre i limiti, terminato o con una risposta a metà
+                raise
+            self._finished(slot, worker)
+            return result
+        finally:
+            self._release(slot)
+
+    def _finished(self, slot, worker):
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs:
+            self._discard(slot)
+
+    def _acquire(self, affinity):
+        """Posto per il lavoro: quello dell'affinity, altrimenti il primo libero; attende se è occupato."""
+        wanted = None if affinity is None else zlib.crc32(str(affinity).encode()) % len(self._workers)
+        with self._free:
+            while True:
+                if wanted is None:
+                    slot = next((i for i in range(len(self._workers)) if i not in self._busy), None)
+                else:
+                    slot = None if wanted in self._busy else wanted
+                if slot is not None:
+                    break
+                self._free.wait()
+            self._busy.add(slot)
+            return slot
+
+    def _release(self, slot):
+        with self._free:
+            self._busy.discard(slot)
+            self._free.notify_all()
+
+    def _take(self, slot):
+        worker = self._workers[slot]
+        if worker is not None and worker.alive():
+            return worker
+        if worker is not None:
+            self._discard(slot)
+        worker = self._workers[slot] = _Worker(self.cpu_seconds, self.memory_bytes)
+        return worker
+
+    def _discard(self, slot, kill=False):
+        worker, self._workers[slot] = self._workers[slot], None
+        if worker is not None:
+            worker.stop(kill=kill)
+
+    def _execute(self, worker, fn, args, kwargs, progress):
+        name = getattr(fn, "__qualname__", repr(fn))
+        worker.conn.send((fn, args, kwargs, progress is not None))
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._fail(name, "tempo scaduto", f"L'elaborazione ha superato i {self.timeout} secondi ed è stata interrotta.")
+            if not worker.conn.poll(min(remaining, 0.5)):
+                continue
+            try:
+                kind, *payload = worker.conn.recv()
+            except (EOFError, OSError):
+                try:
+                    worker.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    pass
+                self._died(name, worker.process.returncode)
+            if kind == "progress":
+                progress(*payload)
+            elif kind == "result":
+                value, profile = payload
+                PROFILER.merge(profile)
+                return value
+            elif kind == "memory":
+                self._fail(name, "memoria esaurita",
+                           f"Il file richiede più di {self.memory_bytes // 2**20} MB di memoria ed è stato scartato.")
+            else:
+                self._fail(name, "errore", f"Errore nell'elaborazione del file ({payload[0]}).", _JobFailed)
+
+    def _died(self, name, exitcode):
+        if exitcode == -getattr(signal, "SIGXCPU", -1):
+            self._fail(name, "CPU esaurita",
+                       f"L'elaborazione ha superato i {self.cpu_seconds} secondi di CPU ed è stata interrotta.")
+        # un'allocazione fallita dentro una libreria C spesso termina il processo invece di sollevare MemoryError
+        self._fail(name, "processo terminato", f"L'elaborazione del file si è interrotta (codice {exitcode}).")
+
+    def _fail(self, name, reason, message, error=SandboxError):
+        logs.event(log, logging.WARNING, "lavoro interrotto", function=name, reason=reason)
+        raise error(message)
+
+    def shutdown(self):
+        with self._free:
+            workers, self._workers = self._workers, [None] * len(self._workers)
+        for worker in workers:
+            if worker is not None:
+                worker.stop(kill=True)
+
+
+SANDBOX = SandboxPool.from_env()
@@ -0,0 +1,149 @@
+"""
+Tabella colonnare dei turni.
+
+Un'unica rappresentazione tipizzata usata dall'estrazione, dall'editor di
+Streamlit e dalla scrittura del PDF: una lista per colonna invece di una
+lista di tuple di lunghezza variabile.
+"""
+import re
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+
+class Day(IntEnum):
+    LUNEDI = 0
+    MARTEDI = 1
+    MERCOLEDI = 2
+    GIOVEDI = 3
+    VENERDI = 4
+    SABATO = 5
+    DOMENICA = 6
+
+
+class Cleaning(IntEnum):
+    """Colonna "Pulizia bagni": vuota, No, Sì."""
+    NONE = 0
+    NO = 1
+    YES = 2
+
+
+# Nomi normalizzati (come prodotti da normalize_day_name) e nomi da mostrare
+DAY_NAMES = ("lunedì", "martedì", "mercoledi'", "giovedì", "venerdì", "sabato", "domenica")
+DAY_DISPLAY_NAMES = ("lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica")
+DAY_BY_NAME = {name: Day(i) for i, name in enumerate(DAY_NAMES)}
+DAY_BY_NAME.update({name: Day(i) for i, name in enumerate(DAY_DISPLAY_NAMES)})
+
+CLEANING_LABELS = ("", "No", "Sì")
+CLEANING_BY_LABEL = {label: Cleaning(i) for i, label in enumerate(CLEANING_LABELS)}
+
+NO_TIME = -1
+MINUTES_PER_DAY = 24 * 60
+
+TIME_RANGE_PATTERN = r'(\d{1,2})[,:](\d{2})\s*[-/]\s*(\d{1,2})[,:](\d{2})'
+TIME_RANGE_RE = re.compile(TIME_RANGE_PATTERN)
+
+
+def range_minutes(h1, m1, h2, m2):
+    """Converte ore/minuti in (inizio, fine) in minuti; la fine di un turno notturno supera 1440."""
+    start = h1 * 60 + m1
+    end = h2 * 60 + m2
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return start, end
+
+
+def parse_time_range(text):
+    """
+    "HH:MM-HH:MM" -> (inizio, fine) in minuti. Stringa vuota -> (NO_TIME, NO_TIME).
+    Solleva ValueError se l'orario non è riconoscibile.
+    """
+    text = (text or "").strip()
+    if not text:
+        return NO_TIME, NO_TIME
+    match = TIME_RANGE_RE.fullmatch(text)
+    if not match:
+        raise ValueError(f"Orario non valido: {text!r}")
+    h1, m1, h2, m2 = (int(g) for g in match.groups())
+    if h1 > 24 or h2 > 24 or m1 > 59 or m2 > 59:
+        raise ValueError(f"Orario non valido: {text!r}")
+    return range_minutes(h1, m1, h2, m2)
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_time_range(start, end):
+    """Inverso di parse_time_range: 1440 resta "24:00", i turni notturni tornano all'ora del giorno dopo."""
+    if start == NO_TIME:
+        return ""
+    if end > MINUTES_PER_DAY:
+        end -= MINUTES_PER_DAY
+    return f"{format_minutes(start)}-{format_minutes(end)}"
+
+
+@dataclass
+class ShiftTable:
+    """Turni di una persona, una lista per colonna."""
+    day: list = field(default_factory=list)          # Day
+    day_number: list = field(default_factory=list)   # str, es. "15"
+    location: list = field(default_factory=list)     # str
+    start: list = field(default_factory=list)        # minuti o NO_TIME
+    end: list = field(default_factory=list)          # minuti o NO_TIME
+    cleaning: list = field(default_factory=list)     # Cleaning
+
+    COLUMNS = ("day", "day_number", "location", "start", "end", "cleaning")
+
+    def __len__(self):
+        return len(self.day)
+
+    def append(self, day, day_number, location, start=NO_TIME, end=NO_TIME, cleaning=Cleaning.NONE):
+        self.day.append(Day(day))
+        self.day_number.append(str(day_number))
+        self.location.append(location)
+        self.start.append(start)
+        self.end.append(end)
+        self.cleaning.append(Cleaning(cleaning))
+
+    def take(self, indices):
+        """Nuova tabella con le righe nell'ordine indicato."""
+        return ShiftTable(*([getattr(self, c)[i] for i in indices] for c in self.COLUMNS))
+
+    def sorted(self):
+        """Ordina per giorno della settimana e ora di inizio; i turni senza orario vanno in fondo al giorno."""
+        def key(i):
+            start = self.start[i]
+            return self.day[i], start if start != NO_TIME else MINUTES_PER_DAY * 2
+        return self.take(sorted(range(len(self)), key=key))
+
+    def has_giardini_castello(self):
+        return any("giardini del castello" in loc.lower() for loc in self.location)
+
+    def with_default_cleaning(self):
+        """Copia in cui i turni ai Giardini del Castello senza indicazione hanno "No" come pulizia bagni."""
+        cleaning = [
+            Cleaning.NO if c == Cleaning.NONE and "giardini del castello" in loc.lower() else c
+            for loc, c in zip(self.location, self.cleaning)
+        ]
+        return ShiftTable(list(self.day), list(self.day_number), list(self.location),
+                          list(self.start), list(self.end), cleaning)
+
+    def time_labels(self):
+        return [format_time_range(s, e) for s, e in zip(self.start, self.end)]
+
+    def display_rows(self):
+        """Righe già formattate per la stampa: (giorno, data, luogo, orario, pulizia)."""
+        return zip(
+            (DAY_DISPLAY_NAMES[d] for d in self.day),
+            self.day_number,
+            self.location,
+            self.time_labels(),
+            (CLEANING_LABELS[c] for c in self.cleaning),
+        )
+
+    def to_records(self):
+        """Lista di dict serializzabili in JSON/CSV."""
+        return [
+            {"giorno": giorno, "data": data, "luogo": luogo, "orario": orario, "pulizia_bagni": pulizia}
+            for giorno, data, luogo, orario, pulizia in self.display_rows()
+        ]
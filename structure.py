@@ -0,0 +1,128 @@
+"""
+Struttura compilata.
+
+La mappatura {indice riga: (luogo, orario, note)} di structure.json viene
+compilata una sola volta in tabelle indicizzate per riga: luogo già
+normalizzato, orario in minuti e tipo di turno. L'estrazione diventa una
+serie di lookup, e gli orari non validi vengono segnalati al caricamento.
+"""
+import sys
+from dataclasses import dataclass
+from enum import IntEnum
+
+import logs
+from shifts import NO_TIME, parse_time_range
+
+log = logs.get_logger("structure")
+
+
+class ShiftKind(IntEnum):
+    WORK = 0
+    REST = 1
+    SECOND_REST = 2
+    LEAVE = 3
+    SICK = 4
+    PERMIT = 5
+    CLOSED = 6
+
+
+# Tipi per cui l'orario (della struttura o scritto nella cella) viene riportato nel turno
+TIMED_KINDS = frozenset({ShiftKind.WORK, ShiftKind.SICK, ShiftKind.PERMIT})
+
+FALLBACK_LOCATION = "Riposo"
+
+
+def classify_location(location):
+    """Tipo di turno in base al nome del luogo."""
+    upper = location.upper()
+    lower = location.lower()
+    if "CHIUSO" in upper or "CHIUSA" in upper:
+        return ShiftKind.CLOSED
+    if "riposo" in lower:
+        return ShiftKind.SECOND_REST if "2°" in lower else ShiftKind.REST
+    if "ferie" in lower:
+        return ShiftKind.LEAVE
+    if "malattia" in lower:
+        return ShiftKind.SICK
+    if "permess" in lower:
+        return ShiftKind.PERMIT
+    return ShiftKind.WORK
+
+
+@dataclass(frozen=True)
+class CompiledStructure:
+    """
+    Colonne indicizzate per riga della tabella. L'ultima posizione (indice
+    len(self) - 1) è la riga di fallback "Riposo" usata per gli indici non mappati.
+    """
+    location: tuple
+    start: tuple
+    end: tuple
+    kind: tuple
+    mapped: tuple    # False per i buchi della struttura e per il fallback
+    errors: tuple    # messaggi per gli orari non validi
+
+    def __len__(self):
+        return len(self.kind)
+
+    @property
+    def fallback(self):
+        return len(self.kind) - 1
+
+    def row(self, structure_idx):
+        """Posizione nelle colonne per un indice di riga della tabella PDF."""
+        if 0 <= structure_idx < self.fallback:
+            return structure_idx
+        return self.fallback
+
+
+def _compile(items):
+    size = max((k for k, _ in items if k >= 0), default=-1) + 1
+    location = [FALLBACK_LOCATION] * (size + 1)
+    start = [NO_TIME] * (size + 1)
+    end = [NO_TIME] * (size + 1)
+    kind = [ShiftKind.REST] * (size + 1)
+    mapped = [False] * (size + 1)
+    errors = []
+
+    for idx, value in items:
+        if idx < 0 or value is None:
+            continue
+        loc, time_slot = value[0], value[1]
+        row_kind = classify_location(loc) if loc else ShiftKind.WORK
+        if row_kind == ShiftKind.CLOSED:
+            loc = "Riposo - " + loc
+        elif not loc:
+            loc = "Turno"
+        if row_kind in TIMED_KINDS:
+            try:
+                start[idx], end[idx] = parse_time_range(time_slot)
+            except ValueError:
+                errors.append(f"Riga {idx} ({loc}): orario non valido {time_slot!r}")
+        location[idx] = sys.intern(loc)
+        kind[idx] = row_kind
+        mapped[idx] = True
+
+    return CompiledStructure(
+        tuple(location), tuple(start), tuple(end), tuple(kind), tuple(mapped), tuple(errors)
+    )
+
+
+_compiled_cache = {}
+
+
+def compile_structure(structure):
+    """
+    Compila (con memoizzazione) una struttura {int: (luogo, orario, note)}.
+    Gli errori vengono segnalati nel log solo alla prima compilazione di una data struttura.
+    """
+    items = tuple(sorted((int(k), tuple(v) if v is not None else None) for k, v in structure.items()))
+    compiled = _compiled_cache.get(items)
+    if compiled is None:
+        compiled = _compile(items)
+        for message in compiled.errors:
+            log.warning("struttura: %s", message)
+        if len(_compiled_cache) > 16:
+            _compiled_cache.clear()
+        _compiled_cache[items] = compiled
+    return compiled
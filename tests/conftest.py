@@ -0,0 +1,27 @@
+"""
+Tabelle finte nel formato di pdfplumber per i test: una riga di header con
+i giorni ("lunedì 6", ...) e una riga per indice della struttura.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAYS = [("lunedì", "6"), ("martedì", "7"), ("mercoledì", "8"), ("giovedì", "9"),
+        ("venerdì", "10"), ("sabato", "11"), ("domenica", "12")]
+
+STRUCTURE = {
+    0: ("Museo", "08:00-14:00", ""),
+    1: ("Museo", "14:00-20:00", ""),
+    2: ("Notte", "22:00-06:00", ""),
+    3: ("Biglietteria", "05:00-10:00", ""),
+    4: ("Riposo", "", ""),
+    5: ("Ferie", "", ""),
+}
+
+
+def make_tables(rows, days=DAYS):
+    """rows: per ogni indice della struttura, il testo delle celle dal lunedì in poi."""
+    header = ["Luogo"] + [f"{name} {number}" for name, number in days]
+    body = [[f"riga {i}"] + list(cells) + [""] * (len(days) - len(cells)) for i, cells in enumerate(rows)]
+    return [[header] + body]
@@ -0,0 +1,44 @@
+import datetime
+
+from analytics import Occurrences, staff_summary
+from main import extract_shifts_for_person_hardcoded
+from shifts import NO_TIME
+from structure import ShiftKind, compile_structure
+
+from conftest import STRUCTURE, make_tables
+
+TABLES = make_tables([
+    ["Rossi Mario", "", "Verdi Anna"],
+    ["Verdi Anna", "Rossi Mario 15:00-19:30"],
+    ["", "", "", "Rossi Mario"],
+    [],
+    ["", "", "Rossi Mario"],
+    ["", "", "", "", "Verdi Anna"],
+])
+PERIOD = (datetime.date(2025, 10, 6), datetime.date(2025, 10, 12))
+
+
+def summary_by_person():
+    return {row["Persona"]: row for row in staff_summary(Occurrences([(TABLES, STRUCTURE, PERIOD)]))}
+
+
+def test_worked_hours_match_per_person_extraction():
+    compiled = compile_structure(STRUCTURE)
+    rows = summary_by_person()
+    for person in ("Rossi Mario", "Verdi Anna"):
+        shifts = extract_shifts_for_person_hardcoded(TABLES, person.split()[0], STRUCTURE)
+        minutes = sum(
+            end - start for loc, start, end in zip(shifts.location, shifts.start, shifts.end)
+            if start != NO_TIME and loc in {compiled.location[i] for i, k in enumerate(compiled.kind)
+                                            if k == ShiftKind.WORK}
+        )
+        assert rows[person]["Ore lavorate"] == minutes / 60
+
+
+def test_night_hours_and_absences():
+    rows = summary_by_person()
+    assert rows["Rossi Mario"]["Turni"] == 3
+    assert rows["Rossi Mario"]["Riposi"] == 1
+    assert rows["Verdi Anna"]["Ferie"] == 1
+    assert rows["Rossi Mario"]["Ore notturne"] == 8  # 22:00-06:00
+    assert rows["Verdi Anna"]["Ore notturne"] == 0
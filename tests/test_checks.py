@@ -0,0 +1,47 @@
+from checks import ERROR, WARNING, check_roster
+
+from conftest import STRUCTURE, make_tables
+
+def issues(tables, **kwargs):
+    return [(i.level, i.kind, i.day, i.person) for i in check_roster(tables, STRUCTURE, **kwargs).issues]
+
+
+def covered(rows):
+    """Righe di lavoro della struttura coperte ognuna da un collega diverso, più le persone indicate."""
+    base = [[name] * 7 for name in ("Bianchi Luca", "Verdi Anna", "Neri Ugo", "Gialli Eva")]
+    for i, cells in enumerate(rows):
+        base[i] = [f"{a}\n{b}" if b else a for a, b in zip(base[i], list(cells) + [""] * 7)]
+    return base
+
+
+def test_clean_roster_has_no_issues():
+    tables = make_tables([["Rossi Mario"] * 7, ["Verdi Anna"] * 7, ["Neri Ugo"] * 7, ["Gialli Eva"] * 7])
+    assert issues(tables) == []
+
+
+def test_double_booking_on_the_same_day():
+    tables = make_tables(covered([["Rossi Mario"], [], [], ["Rossi Mario"]]))
+    assert (ERROR, "Doppia assegnazione", "lunedì 6", "Rossi Mario") in issues(tables)
+
+
+def test_overnight_shift_overlaps_next_morning():
+    # notte di lunedì fino alle 6 di martedì e biglietteria di martedì dalle 5
+    tables = make_tables(covered([[], [], ["Rossi Mario"], ["", "Rossi Mario"]]))
+    assert [i for i in issues(tables) if i[0] == ERROR] == [
+        (ERROR, "Doppia assegnazione", "martedì 7", "Rossi Mario")]
+
+
+def test_adjacent_shifts_do_not_overlap():
+    tables = make_tables(covered([["Rossi Mario"], ["Rossi Mario"]]))
+    assert [i for i in issues(tables) if i[0] == ERROR and i[1] == "Doppia assegnazione"] == []
+
+
+def test_long_day():
+    tables = make_tables(covered([["Rossi Mario"], ["Rossi Mario"]]))
+    assert (ERROR, "Giornata troppo lunga", "lunedì 6", "Rossi Mario") in issues(tables, max_day_hours=11)
+    assert issues(tables, max_day_hours=12) == []
+
+
+def test_uncovered_rows_are_warnings():
+    tables = make_tables([["Rossi Mario"] * 7, ["Verdi Anna"] * 6, ["Neri Ugo"] * 7, ["Gialli Eva"] * 7])
+    assert issues(tables) == [(WARNING, "Riga scoperta", "domenica 12", "")]
@@ -0,0 +1,47 @@
+from diff import diff_rosters
+
+from conftest import DAYS, STRUCTURE, make_tables
+
+
+def test_identical_rosters_have_no_changes():
+    tables = make_tables([["Rossi Mario"], ["Verdi Anna"]])
+    result = diff_rosters(tables, tables, STRUCTURE)
+    assert result.comparable and result.changes == {}
+    assert result.summary() == "Nessuna modifica."
+
+
+def test_moved_gained_and_lost():
+    old = make_tables([["Rossi Mario", "Bianchi Luca"], ["Verdi Anna"]])
+    new = make_tables([["Verdi Anna"], ["Rossi Mario"], ["", "", "Neri Ugo"]])
+    result = diff_rosters(old, new, STRUCTURE)
+
+    rossi = result.for_person("rossi")
+    assert [(a.label(), b.label()) for a, b in rossi.moved] == [
+        ("lunedì 6: Museo 08:00-14:00", "lunedì 6: Museo 14:00-20:00")]
+    assert [s.label() for s in result.for_person("bianchi").lost] == ["martedì 7: Museo 08:00-14:00"]
+    assert [s.label() for s in result.for_person("neri").gained] == ["mercoledì 8: Notte 22:00-06:00"]
+    assert result.people == ["Bianchi Luca", "Neri Ugo", "Rossi Mario", "Verdi Anna"]
+
+
+def test_affects_matches_surname_substring():
+    old = make_tables([["Rossi Mario"]])
+    new = make_tables([["", "Rossi Mario"]])
+    result = diff_rosters(old, new, STRUCTURE)
+    assert result.affects("Rossi")
+    assert not result.affects("Verdi")
+
+
+def test_time_written_in_cell_overrides_structure():
+    old = make_tables([["Rossi Mario"]])
+    new = make_tables([["Rossi Mario 09:00-13:00"]])
+    change = diff_rosters(old, new, STRUCTURE).for_person("rossi")
+    assert [(a.label(), b.label()) for a, b in change.moved] == [
+        ("lunedì 6: Museo 08:00-14:00", "lunedì 6: Museo 09:00-13:00")]
+
+
+def test_different_header_days_are_not_comparable():
+    old = make_tables([["Rossi Mario"]])
+    new = make_tables([["Rossi Mario"]], days=[(name, str(int(n) + 7)) for name, n in DAYS])
+    result = diff_rosters(old, new, STRUCTURE)
+    assert not result.comparable
+    assert result.affects("chiunque")
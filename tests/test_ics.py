@@ -0,0 +1,67 @@
+import datetime
+
+from ics import render_calendar, roster_period, shift_dates, shift_events
+from shifts import ShiftTable
+
+from conftest import DAYS
+
+TODAY = datetime.date(2026, 10, 19)
+
+
+def test_period_with_year_in_name():
+    assert roster_period("servizio DAL 06-10-25 AL 12-10-25.pdf", TODAY) == (
+        datetime.date(2025, 10, 6), datetime.date(2025, 10, 12))
+
+
+def test_period_without_year_nearest_to_today():
+    assert roster_period("servizio DAL 05-10 AL 11-10.pdf", TODAY) == (
+        datetime.date(2026, 10, 5), datetime.date(2026, 10, 11))
+
+
+def test_period_year_from_header_weekdays():
+    # lunedì 6 ottobre è nel 2025, non nell'anno più vicino a oggi
+    assert roster_period("servizio DAL 06-10 AL 12-10.pdf", TODAY, header_days=DAYS) == (
+        datetime.date(2025, 10, 6), datetime.date(2025, 10, 12))
+
+
+def test_period_across_new_year():
+    days = [("lunedì", "29"), ("martedì", "30"), ("domenica", "4")]
+    assert roster_period("DAL 29-12 AL 04-01.pdf", TODAY, header_days=days) == (
+        datetime.date(2025, 12, 29), datetime.date(2026, 1, 4))
+
+
+def test_period_none_when_header_matches_no_year():
+    days = [("martedì", "6"), ("martedì", "7")]
+    assert roster_period("servizio DAL 06-10 AL 12-10.pdf", TODAY, header_days=days) is None
+
+
+def test_period_none_without_dal_al():
+    assert roster_period("servizio custodia.pdf", TODAY) is None
+
+
+def week_shifts():
+    shifts = ShiftTable()
+    shifts.append(0, "6", "Museo", 480, 840)
+    shifts.append(0, "6", "Notte", 1320, 1800)
+    shifts.append(2, "8", "Riposo")
+    return shifts
+
+
+def test_shift_dates_follow_day_numbers():
+    period = (datetime.date(2025, 10, 6), datetime.date(2025, 10, 12))
+    assert shift_dates(week_shifts(), period) == [
+        datetime.date(2025, 10, 6), datetime.date(2025, 10, 6), datetime.date(2025, 10, 8)]
+
+
+def test_shift_events_and_calendar():
+    period = (datetime.date(2025, 10, 6), datetime.date(2025, 10, 12))
+    events = shift_events(week_shifts(), "Rossi Mario", period)
+    assert [e["uid"] for e in events] == [
+        "20251006-1-rossi-mario@turnizio", "20251006-2-rossi-mario@turnizio", "20251008-1-rossi-mario@turnizio"]
+
+    text = render_calendar("Rossi Mario", events, stamp="20251001T000000Z")
+    assert text.count("BEGIN:VEVENT") == 3
+    assert "DTSTART;TZID=Europe/Rome:20251006T220000\r\n" in text
+    assert "DTEND;TZID=Europe/Rome:20251007T060000\r\n" in text  # la notte finisce il giorno dopo
+    assert "DTSTART;VALUE=DATE:20251008\r\n" in text
+    assert all(len(line.encode()) <= 75 for line in text.split("\r\n"))
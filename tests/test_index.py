@@ -0,0 +1,38 @@
+import json
+
+from batch import INDEX_NAME, RosterResult, index_key, update_index
+
+
+def read_index(tmp_path):
+    return json.loads((tmp_path / INDEX_NAME).read_text(encoding="utf-8"))
+
+
+def test_index_key_is_the_period():
+    assert index_key("/x/servizio custodia DAL 06-10 AL 12-10.pdf") == "dal 06-10 al 12-10"
+    assert index_key("servizio custodia dal 06-10  al 12-10 rev2.pdf") == "dal 06-10 al 12-10"
+    assert index_key("turni.pdf") == "turni.pdf"
+
+
+def test_revision_keeps_unchanged_people_and_drops_removed(tmp_path):
+    for name in ("rossi.pdf", "verdi.pdf", "bianchi.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF")
+    first = RosterResult("servizio DAL 06-10 AL 12-10.pdf", written={
+        "Rossi Mario": str(tmp_path / "rossi.pdf"),
+        "Verdi Anna": str(tmp_path / "verdi.pdf"),
+        "Bianchi Luca": str(tmp_path / "bianchi.pdf"),
+    })
+    update_index(str(tmp_path), first)
+
+    revision = RosterResult("servizio DAL 06-10 AL 12-10 rev2.pdf",
+                            written={"Rossi Mario": str(tmp_path / "rossi2.pdf")}, removed=["Bianchi Luca"])
+    update_index(str(tmp_path), revision)
+
+    assert read_index(tmp_path) == {"dal 06-10 al 12-10": {"Rossi Mario": "rossi2.pdf", "Verdi Anna": "verdi.pdf"}}
+    assert not (tmp_path / "bianchi.pdf").exists()
+    assert (tmp_path / "verdi.pdf").exists()
+
+
+def test_old_index_keyed_by_file_name_is_migrated(tmp_path):
+    (tmp_path / INDEX_NAME).write_text(json.dumps({"servizio DAL 06-10 AL 12-10.pdf": {"Verdi Anna": "verdi.pdf"}}))
+    update_index(str(tmp_path), RosterResult("servizio DAL 06-10 AL 12-10.pdf", written={"Rossi Mario": "rossi.pdf"}))
+    assert read_index(tmp_path) == {"dal 06-10 al 12-10": {"Rossi Mario": "rossi.pdf", "Verdi Anna": "verdi.pdf"}}
@@ -0,0 +1,23 @@
+from pagecache import PageFingerprint, PageTableCache
+
+TABLES = [[["Luogo", "lunedì 6"], ["Museo", "Rossi Mario"]]]
+
+
+def test_same_fingerprint_and_text_is_reused(tmp_path):
+    cache = PageTableCache(str(tmp_path))
+    cache.put(PageFingerprint("abc", "testo"), TABLES)
+    cache.clear()  # dal disco
+    assert cache.get(PageFingerprint("abc", "testo")) == TABLES
+
+
+def test_same_fingerprint_with_different_text_is_not_reused(tmp_path):
+    for directory in (None, str(tmp_path)):
+        cache = PageTableCache(directory)
+        cache.put(PageFingerprint("abc", "testo"), TABLES)
+        assert cache.get(PageFingerprint("abc", "altro testo")) is None
+        cache.clear()
+        assert cache.get(PageFingerprint("abc", "altro testo")) is None
+
+
+def test_unknown_fingerprint():
+    assert PageTableCache().get(PageFingerprint("nuova", "testo")) is None
@@ -0,0 +1,16 @@
+from resources import ResourceManager
+
+
+def test_put_if_open_skips_expired_sessions(tmp_path):
+    resources = ResourceManager(budget_bytes=2**20, session_ttl=60, temp_dir=str(tmp_path))
+    resources.put("s1", "anteprima", b"x" * 10)
+    resources.expire(now=10**9)  # ben oltre il ttl
+    assert not resources.put_if_open("s1", "anteprima", b"y" * 10)
+    assert all(row["Sessione"] != "s1" for row in resources.usage())
+
+
+def test_put_if_open_stores_for_open_sessions(tmp_path):
+    resources = ResourceManager(budget_bytes=2**20, session_ttl=60, temp_dir=str(tmp_path))
+    resources.get("s1", "anteprima")
+    assert resources.put_if_open("s1", "anteprima", b"y")
+    assert resources.get("s1", "anteprima") == b"y"
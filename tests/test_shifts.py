@@ -0,0 +1,68 @@
+import pytest
+
+from shifts import MINUTES_PER_DAY, NO_TIME, format_time_range, parse_time_range
+from structure import ShiftKind, compile_structure
+
+from conftest import STRUCTURE, make_tables
+
+
+def test_parse_time_range():
+    assert parse_time_range("08:00-14:00") == (480, 840)
+    assert parse_time_range(" 8,30 / 14:15 ") == (510, 855)
+    assert parse_time_range("") == (NO_TIME, NO_TIME)
+
+
+def test_parse_time_range_overnight_ends_next_day():
+    assert parse_time_range("22:00-06:00") == (1320, MINUTES_PER_DAY + 360)
+    assert parse_time_range("14:00-24:00") == (840, MINUTES_PER_DAY)
+
+
+@pytest.mark.parametrize("text", ["99:99-25:70", "08:60-14:00", "25:00-26:00", "8-14", "mattina"])
+def test_parse_time_range_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_time_range(text)
+
+
+@pytest.mark.parametrize("text", ["08:00-14:00", "22:00-06:00", "14:00-24:00"])
+def test_format_time_range_roundtrip(text):
+    assert format_time_range(*parse_time_range(text)) == text
+
+
+def test_format_time_range_without_time():
+    assert format_time_range(NO_TIME, NO_TIME) == ""
+
+
+def test_compile_structure():
+    compiled = compile_structure(STRUCTURE)
+    assert compiled.location[0] == "Museo"
+    assert (compiled.start[2], compiled.end[2]) == (1320, MINUTES_PER_DAY + 360)
+    assert compiled.kind[4] == ShiftKind.REST
+    assert compiled.kind[5] == ShiftKind.LEAVE
+    assert compiled.start[4] == NO_TIME
+    assert compiled.errors == ()
+
+
+def test_compile_structure_fallback_and_gaps():
+    compiled = compile_structure({0: ("Museo", "08:00-14:00", ""), 2: ("Chiuso", "", "")})
+    assert compiled.row(1) == 1 and not compiled.mapped[1]
+    assert compiled.row(99) == compiled.fallback
+    assert compiled.location[compiled.fallback] == "Riposo"
+    assert compiled.kind[2] == ShiftKind.CLOSED
+    assert compiled.location[2] == "Riposo - Chiuso"
+
+
+def test_compile_structure_reports_invalid_times():
+    compiled = compile_structure({0: ("Museo", "08:00-99:00", "")})
+    assert compiled.start[0] == NO_TIME
+    assert len(compiled.errors) == 1
+
+
+def test_extraction_uses_structure_rows():
+    from main import extract_shifts_for_person_hardcoded
+
+    tables = make_tables([["Rossi Mario"], [], ["", "Rossi Mario"], [], ["", "", "Rossi Mario"]])
+    shifts = extract_shifts_for_person_hardcoded(tables, "Rossi", STRUCTURE)
+    timed = [(int(d), n, loc, s, e) for d, n, loc, s, e in
+             zip(shifts.day, shifts.day_number, shifts.location, shifts.start, shifts.end) if s != NO_TIME]
+    assert timed == [(0, "6", "Museo", 480, 840), (1, "7", "Notte", 1320, MINUTES_PER_DAY + 360)]
+    assert "Riposo" in [loc for d, loc in zip(shifts.day, shifts.location) if d == 2]
@@ -0,0 +1,119 @@
+"""
+Immagine della tabella dei turni di una persona, da condividere in chat.
+
+Disegnata con Pillow direttamente dai turni, con le regole e le misure del
+PDF personale (main.timetable_layout), senza generare prima il PDF. La
+larghezza in pixel è quella dello schermo di un telefono; l'altezza segue
+il numero di righe. L'immagine è in scala di grigi: PNG (il più rapido,
+accettato da tutte le chat) o WebP senza perdita (circa metà dei byte)
+restano di poche decine di KB.
+"""
+import io
+
+from main import sort_days, timetable_layout
+from profiling import span
+
+IMAGE_FORMATS = ("png", "webp")
+DEFAULT_WIDTH = 1080       # px, la larghezza più comune delle immagini inoltrate in chat
+WIDTHS = (720, 1080, 1440)
+
+MARGIN = 5                 # mm attorno alla tabella
+ROW_HEIGHT = 10            # mm, come nel PDF
+CELL_PADDING = 1           # mm, il margine interno delle celle di fpdf
+FONT_SIZE = 12             # pt
+TITLE_SIZE = 17            # pt
+MM_PER_PT = 25.4 / 72
+
+HEADER_FILL = 200
+FONT_NAMES = ("arial.ttf", "Arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf")
+BOLD_FONT_NAMES = ("arialbd.ttf", "Arial Bold.ttf", "DejaVuSans-Bold.ttf", "LiberationSans-Bold.ttf")
+
+_fonts = {}
+
+
+def _font(size, bold=False):
+    """Arial o un carattere equivalente del sistema, altrimenti quello incluso in Pillow."""
+    from PIL import ImageFont
+
+    key = (size, bold)
+    if key not in _fonts:
+        for name in (BOLD_FONT_NAMES if bold else ()) + FONT_NAMES:
+            try:
+                _fonts[key] = ImageFont.truetype(name, size)
+                break
+            except OSError:
+                continue
+        else:
+            _fonts[key] = ImageFont.load_default(size)
+    return _fonts[key]
+
+
+def _text(draw, box, text, font, align):
+    """
+    Testo nella cella box=(x0, y0, x1, y1), allineato a sinistra ("L"), destra
+    ("R") o al centro ("C"); in verticale a metà tra ascendenti e discendenti
+    del carattere, così la linea di base è la stessa in tutta la riga.
+    """
+    x0, y0, x1, y1 = box
+    x, anchor = {"L": (x0, "lm"), "R": (x1, "rm")}.get(align, ((x0 + x1) / 2, "mm"))
+    draw.text((x, (y0 + y1) / 2), text, font=font, fill=0, anchor=anchor)
+
+
+def render_shifts_image(shifts, surname, width=DEFAULT_WIDTH, fmt="png"):
+    """Tabella dei turni come immagine (bytes) larga width pixel, in formato fmt (vedi IMAGE_FORMATS)."""
+    from PIL import Image, ImageDraw
+
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"formato immagine non supportato: {fmt}")
+    with span("image.write", items=len(shifts)):
+        shifts, _, widths, max_location = timetable_layout(sort_days(shifts))
+        scale = width / (sum(widths) + 2 * MARGIN)  # px per mm
+        row = round(ROW_HEIGHT * scale)
+        margin = round(MARGIN * scale)
+        padding = round(CELL_PADDING * scale)
+        line = max(1, round(0.2 * scale))
+        font = _font(round(FONT_SIZE * MM_PER_PT * scale))
+        title_font = _font(round(TITLE_SIZE * MM_PER_PT * scale), bold=True)
+
+        rows = list(shifts.display_rows())
+        # titolo + riga vuota + intestazione + turni, come _timetable_height
+        height = 2 * margin + row * (len(rows) + 3)
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        _text(draw, (0, margin, width, margin + row), f"Turni di lavoro {surname}", title_font, "C")
+
+        edges = [margin]
+        for w in widths:
+            edges.append(edges[-1] + round(w * scale))
+        table_top = margin + 2 * row
+        table_bottom = table_top + row * (len(rows) + 1)
+        draw.rectangle((edges[0], table_top, edges[-1], table_top + row), fill=HEADER_FILL)
+
+        header = ("Giorno", "", "Luogo", "Orario", "Pulizia bagni")
+        aligns = ("R", "L", "C", "C", "C")
+        for r, values in enumerate([header] + [(d, n, loc[:max_location], t, p) for d, n, loc, t, p in rows]):
+            top = table_top + r * row
+            for c in range(len(widths)):
+                box = (edges[c] + padding, top, edges[c + 1] - padding, top + row)
+                _text(draw, box, values[c], font, aligns[c])
+
+        # bordi: orizzontali su tutta la tabella, verticali tranne tra giorno e numero ('LTB' + 'RTB' nel PDF)
+        for r in range(len(rows) + 2):
+            y = table_top + r * row
+            draw.line((edges[0], y, edges[-1], y), fill=0, width=line)
+        for c, x in enumerate(edges):
+            if c != 1:
+                draw.line((x, table_top, x, table_bottom), fill=0, width=line)
+
+        buffer = io.BytesIO()
+        if fmt == "webp":
+            image.save(buffer, "WEBP", lossless=True, method=2)
+        else:
+            image.save(buffer, "PNG")
+        return buffer.getvalue()
+
+
+def image_filename(pdf_filename, fmt):
+    """Nome dell'immagine dal nome del PDF personale: "Turni Rossi dal ... al ....webp"."""
+    base = pdf_filename[:-4] if pdf_filename.lower().endswith(".pdf") else pdf_filename
+    return f"{base}.{fmt}"
@@ -0,0 +1,321 @@
+"""
+Servizio che sorveglia una cartella e pubblica i turni dei nuovi PDF.
+
+Ogni "servizio custodia*.pdf" nuovo o modificato viene atteso finché la
+scrittura non è terminata (dimensione e data stabili), letto una volta ed
+elaborato per tutte le persone; i calendari .ics in <uscita>/ics vengono
+riscritti solo per chi ha turni cambiati. Gli hash dei file già elaborati
+sono salvati nella cartella di uscita, così un riavvio non rifà il lavoro.
+Le tabelle lette vengono conservate per periodo (DAL … AL …): una revisione
+corretta dello stesso periodo viene confrontata con la precedente e
+rigenera solo le persone i cui turni sono cambiati.
+
+Uso:
+    python watcher.py /percorso/condiviso -o /var/www/turni -w 2
+"""
+import argparse
+import ctypes
+import ctypes.util
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import logs
+from ics import PERIOD_RE
+from batch import ALL_PEOPLE, FORMATS, ROSTER_GLOB, process_roster, update_feeds, update_index, write_atomic
+
+log = logs.get_logger("batch")
+
+STATE_NAME = ".turnizio_processati.json"
+VERSIONS_DIR = ".versioni"
+
+# Costanti inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def period_key(name):
+    """Chiave del periodo ("DAL 06-10 AL 12-10") dal nome del file, oppure None."""
+    match = PERIOD_RE.search(name)
+    return " ".join(match.group(0).upper().split()) if match else None
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ProcessedState:
+    """Registro persistente {sha256: {"file", "persone", "ts"}} dei PDF già elaborati."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logs.event(log, logging.WARNING, "stato illeggibile, riparto da zero", path=path, error=str(e))
+
+    def __contains__(self, digest):
+        return digest in self.entries
+
+    def add(self, digest, filename, people):
+        self.entries[digest] = {"file": filename, "persone": people, "ts": int(time.time())}
+        write_atomic(self.path, json.dumps(self.entries, ensure_ascii=False, indent=2))
+
+
+class InotifyWatch:
+    """Sorveglianza con inotify tramite ctypes (solo Linux)."""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch")
+        self.directory = directory
+
+    def changes(self, timeout):
+        """Nomi dei file modificati entro timeout secondi."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        names = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatch:
+    """Fallback senza inotify: confronta (mtime, dimensione) a ogni intervallo."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.seen = {}
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        names = set()
+        with os.scandir(self.directory) as entries:
+            current = {e.name: (e.stat().st_mtime_ns, e.stat().st_size) for e in entries if e.is_file()}
+        for name, signature in current.items():
+            if self.seen.get(name) != signature:
+                names.add(name)
+        self.seen = current
+        return names
+
+    def close(self):
+        pass
+
+
+def open_watch(directory, force_polling=False):
+    if not force_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatch(directory)
+        except (OSError, AttributeError) as e:
+            logs.event(log, logging.WARNING, "inotify non disponibile, uso il polling", error=str(e))
+    return PollingWatch(directory)
+
+
+class RosterWatcher:
+    def __init__(self, directory, output_dir, fmt="pdf", structure_path=None,
+                 workers=1, debounce=3.0, interval=2.0, force_polling=False, feeds=True):
+        self.directory = directory
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.structure_path = structure_path
+        self.workers = workers
+        self.debounce = debounce
+        self.interval = interval
+        self.force_polling = force_polling
+        self.feeds = feeds
+        os.makedirs(output_dir, exist_ok=True)
+        self.state = ProcessedState(os.path.join(output_dir, STATE_NAME))
+        self.pending = {}    # nome -> (ultima modifica vista, firma (mtime, size))
+        self.running = {}    # future -> (nome, hash)
+
+    def _tables_path(self, name):
+        key = period_key(name)
+        if key is None:
+            return None
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.output_dir, VERSIONS_DIR, f"{digest}.json")
+
+    def previous_tables(self, name):
+        """Tabelle dell'ultima revisione elaborata per lo stesso periodo, oppure None."""
+        path = self._tables_path(name)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logs.event(log, logging.WARNING, "revisione precedente illeggibile", path=path, error=str(e))
+            return None
+
+    def save_tables(self, name, tables):
+        path = self._tables_path(name)
+        if path and tables:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, json.dumps(tables, ensure_ascii=False))
+
+    def is_roster(self, name):
+        return fnmatch.fnmatch(name.lower(), ROSTER_GLOB)
+
+    def _signature(self, path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def note_changes(self, names, now):
+        for name in names:
+            if not self.is_roster(name):
+                continue
+            try:
+                signature = self._signature(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                self.pending.pop(name, None)
+                continue
+            previous = self.pending.get(name)
+            if previous is None or previous[1] != signature:
+                self.pending[name] = (now, signature)
+
+    def ready_files(self, now):
+        """File la cui firma non cambia da almeno `debounce` secondi."""
+        ready = []
+        for name, (seen_at, signature) in list(self.pending.items()):
+            path = os.path.join(self.directory, name)
+            try:
+                current = self._signature(path)
+            except FileNotFoundError:
+                del self.pending[name]
+                continue
+            if current != signature:
+                self.pending[name] = (now, current)
+            elif now - seen_at >= self.debounce:
+                ready.append(name)
+        return ready
+
+    def submit_ready(self, pool, now):
+        busy = {name for name, _ in self.running.values()}
+        for name in self.ready_files(now):
+            if len(self.running) >= self.workers:
+                break  # coda limitata: il resto resta in attesa al prossimo giro
+            if name in busy:
+                continue
+            del self.pending[name]
+            path = os.path.join(self.directory, name)
+            digest = file_hash(path)
+            if digest in self.state:
+                logs.event(log, logging.DEBUG, "già elaborato", file=name, sha256=digest[:12])
+                continue
+            logs.event(log, logging.INFO, "nuovo PDF", file=name, sha256=digest[:12])
+            future = pool.submit(process_roster, path, [ALL_PEOPLE], self.output_dir, self.fmt,
+                                 self.structure_path, self.feeds, 1, self.previous_tables(name))
+            self.running[future] = (name, digest)
+
+    def collect_finished(self):
+        for future in [f for f in self.running if f.done()]:
+            name, digest = self.running.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logs.event(log, logging.ERROR, "worker fallito", file=name, error=str(e))
+                continue
+            if result.error:
+                logs.event(log, logging.ERROR, "elaborazione fallita", file=name, error=result.error)
+                continue
+            self.save_tables(name, result.tables)
+            if result.written or result.removed:
+                update_index(self.output_dir, result)
+            if self.feeds:
+                update_feeds(self.output_dir, [result])
+            self.state.add(digest, name, len(result.written))
+            logs.event(log, logging.INFO, "pubblicato", file=name, people=len(result.written))
+
+    def run(self, stop_after=None):
+        """Ciclo principale; stop_after (secondi) serve per esecuzioni limitate."""
+        watch = open_watch(self.directory, self.force_polling)
+        started = time.monotonic()
+        # All'avvio consideriamo tutti i file presenti: quelli già elaborati vengono saltati via hash
+        self.note_changes(os.listdir(self.directory), time.monotonic() - self.debounce)
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                while stop_after is None or time.monotonic() - started < stop_after:
+                    timeout = self.interval if not self.pending and not self.running else min(self.interval, 0.5)
+                    self.note_changes(watch.changes(timeout), time.monotonic())
+                    self.collect_finished()
+                    self.submit_ready(pool, time.monotonic())
+                for future in list(self.running):
+                    future.result()
+                self.collect_finished()
+        finally:
+            watch.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sorveglia una cartella e pubblica i turni dei nuovi PDF.")
+    parser.add_argument("directory", help="cartella in cui arrivano i PDF dei turni")
+    parser.add_argument("-o", "--output-dir", required=True, help="cartella pubblicata con i file personali e l'indice")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="pdf")
+    parser.add_argument("--structure", help="file structure.json da usare al posto del registro/predefinito")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="processi di elaborazione (default: 1)")
+    parser.add_argument("--debounce", type=float, default=3.0, help="secondi di stabilità prima di leggere un file")
+    parser.add_argument("--interval", type=float, default=2.0, help="intervallo di polling in secondi")
+    parser.add_argument("--poll", action="store_true", help="forza il polling anche dove c'è inotify")
+    parser.add_argument("--no-ics", action="store_true", help="non aggiornare i calendari .ics per persona")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"cartella inesistente: {args.directory}")
+    if args.workers < 1:
+        parser.error("--workers deve essere almeno 1")
+    logs.configure(debug=args.debug, spec=os.environ.get("TURNIZIO_LOG") or "INFO")
+    # Cache delle tabelle per pagina su disco, condivisa dai worker: le revisioni rileggono solo le pagine cambiate
+    os.environ.setdefault("TURNIZIO_PAGE_CACHE", os.path.join(args.output_dir, ".pagine"))
+
+    watcher = RosterWatcher(args.directory, args.output_dir, args.format, args.structure,
+                            args.workers, args.debounce, args.interval, args.poll, not args.no_ics)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())